@@ -1,7 +1,14 @@
+import asyncio
+import contextlib
 import os
 import json
+import re
 import ollama
 from dotenv import load_dotenv
+from llm_client import get_async_client, OLLAMA_KEEP_ALIVE
+from result_summarizer import summarize_result
+from result_digest import compact_result, token_budget_for
+from metrics import record_llm
 
 load_dotenv()
 
@@ -9,13 +16,10 @@ load_dotenv()
 # Default to llama3.2:1b for maximum speed on insights
 MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3.2:1b")
 
-def generate_analysis(question: str, data: list) -> str:
+def _analysis_request(question: str, data: list):
     """
-    Generates a natural language analysis of the provided AGGREGATED data based on the question.
-    
-    IMPORTANT: This function ONLY receives aggregated data (from SQL queries with COUNT, SUM, AVG, etc.),
-    NEVER raw records. The LLM only sees aggregated results, not individual customer records.
-    This ensures privacy and follows the workflow requirement.
+    Decides how to answer. Returns (answer, None, False) when no LLM call is needed,
+    otherwise (None, request, is_empty_result) for the Ollama chat call.
     """
     if not data:
         # Generate a context-aware friendly response based on the question
@@ -23,53 +27,42 @@ def generate_analysis(question: str, data: list) -> str:
         
         # Base message for "no records"
         base_fallback = "Answer not found for this specific query."
-        suggestion_suffix = " You might want to ask about overall revenue trends, top services, or low stock alerts."
 
         # Provide intelligent responses based on question type
         keywords_low_stock = ['low stock', 'stock low', 'out of stock', 'inventory low', 'low on stock', 'running low']
         keywords_never_sold = ['unpopular', 'least popular', 'worst selling', 'never sold', 'not sold', 'zero sales']
         
         if any(keyword in question_lower for keyword in keywords_low_stock):
-            return "No low stock items found. All products are currently adequately stocked."
+            return "No low stock items found. All products are currently adequately stocked.", None, False
         elif any(keyword in question_lower for keyword in keywords_never_sold):
-            return "No unsold products found. All items in your inventory have at least one sale record."
+            return "No unsold products found. All items in your inventory have at least one sale record.", None, False
         elif 'revenue' in question_lower or 'sales' in question_lower:
-            return f"{base_fallback} No revenue data was found for the requested criteria. Try asking for 'Total Revenue' or 'Monthly Sales' instead."
+            return f"{base_fallback} No revenue data was found for the requested criteria. Try asking for 'Total Revenue' or 'Monthly Sales' instead.", None, False
         elif 'customer' in question_lower:
-            return f"{base_fallback} No customer records found matching that criteria. You can ask for 'Total Customers' or 'Recent Visits'."
+            return f"{base_fallback} No customer records found matching that criteria. You can ask for 'Total Customers' or 'Recent Visits'.", None, False
         else:
             # Try to use LLM for more nuanced responses
-            try:
-                response = ollama.chat(
-                    model=MODEL_NAME,
-                    messages=[{
-                        'role': 'user', 
-                        'content': f"User asked: '{question}' but the database returned no results. In 1-2 friendly sentences, explain that the answer wasn't found and suggest 2 related salon metrics they could ask about. Reply with JSON: {{\"summary\": \"your response here\"}}"
-                    }],
-                    options={'num_predict': 60, 'temperature': 0.3}
-                )
-                content = response['message']['content'].strip()
-                # Clean markdown
-                if "```" in content:
-                    content = content.replace("```json", "").replace("```", "").strip()
-                
-                if '{' in content and '}' in content:
-                    json_str = content[content.find("{"):content.rfind("}")+1]
-                    res = json.loads(json_str)
-                    return res.get("summary", f"{base_fallback}{suggestion_suffix}")
-            except:
-                pass
-            
-            return f"{base_fallback}{suggestion_suffix}"
-
-    # Convert aggregated data to string representation
-    # Data is already aggregated from SQL queries (COUNT, SUM, AVG, GROUP BY, etc.)
-    # Limit to 50 rows to avoid token limits with 1B models
-    data_sample = data[:50] if len(data) > 50 else data
-    data_str = str(data_sample)
-    if len(data) > 50:
-        data_str += f"\n... (and {len(data) - 50} more aggregated records)"
+            return None, {
+                "model": MODEL_NAME,
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                "messages": [{
+                    'role': 'user', 
+                    'content': f"User asked: '{question}' but the database returned no results. In 1-2 friendly sentences, explain that the answer wasn't found and suggest 2 related salon metrics they could ask about. Reply with JSON: {{\"summary\": \"your response here\"}}"
+                }],
+                "options": {'num_predict': 60, 'temperature': 0.3}
+            }, True
+
+    # Common result shapes (totals, top-N, trends, comparisons) are summarized without the LLM
+    summary = summarize_result(question, data)
+    if summary:
+        return summary, None, False
+
+    # Compact digest of the aggregated data: header once, plain values, and
+    # aggregates instead of raw rows when the result exceeds the model's token budget
+    return None, analysis_request(question, compact_result(data, token_budget_for(MODEL_NAME))), False
 
+def analysis_request(question: str, data_str: str) -> dict:
+    """Builds the Ollama chat request that summarizes a digested result (`data_str`)."""
     system_prompt = f"""
     You are a Business Analyst. Summary for: {question}.
     Respond ONLY with JSON: {{"summary": "..."}}.
@@ -82,33 +75,139 @@ def generate_analysis(question: str, data: list) -> str:
     JSON Output:
     """
 
+    return {
+        "model": MODEL_NAME,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "messages": [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': user_prompt},
+        ],
+        "options": {
+            'num_predict': 50,
+            'temperature': 0,
+            'stop': ["}", "\n"]
+        }
+    }
+
+def _parse_analysis_response(response_text: str, empty_result: bool) -> str:
+    """Extracts the summary from the model's JSON reply."""
+    no_data_fallback = "Answer not found for this specific query. You might want to ask about overall revenue trends, top services, or low stock alerts."
     try:
-        response = ollama.chat(
-            model=MODEL_NAME, 
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt},
-            ],
-            options={
-                'num_predict': 50,
-                'temperature': 0,
-                'stop': ["}", "\n"]
-            }
-        )
-        response_text = response['message']['content'].strip()
-        
-        # Parse JSON and extract summary
-        try:
-            # Clean markdown
-            if "```" in response_text:
-                response_text = response_text.replace("```json", "").replace("```", "").strip()
-
-            if "{" in response_text:
-                json_str = response_text[response_text.find("{"):response_text.rfind("}")+1]
-                data_json = json.loads(json_str)
-                return data_json.get("summary", response_text)
-            return response_text
-        except:
-            return response_text
+        # Clean markdown
+        if "```" in response_text:
+            response_text = response_text.replace("```json", "").replace("```", "").strip()
+
+        if "{" in response_text:
+            json_str = response_text[response_text.find("{"):response_text.rfind("}")+1]
+            data_json = json.loads(json_str)
+            return data_json.get("summary", no_data_fallback if empty_result else response_text)
+    except:
+        pass
+    return no_data_fallback if empty_result else response_text
+
+def _analysis_error(e: Exception, empty_result: bool) -> str:
+    if empty_result:
+        return _parse_analysis_response("", True)
+    return f"Analysis unavailable due to processing error: {str(e)}"
+
+def generate_analysis(question: str, data: list) -> str:
+    """
+    Generates a natural language analysis of the provided AGGREGATED data based on the question.
+    
+    IMPORTANT: This function ONLY receives aggregated data (from SQL queries with COUNT, SUM, AVG, etc.),
+    NEVER raw records. The LLM only sees aggregated results, not individual customer records.
+    This ensures privacy and follows the workflow requirement.
+    """
+    answer, request, empty_result = _analysis_request(question, data)
+    if request is None:
+        return answer
+
+    try:
+        response = ollama.chat(**request)
+        record_llm(request["model"], response)
+        return _parse_analysis_response(response['message']['content'].strip(), empty_result)
+    except Exception as e:
+        return _analysis_error(e, empty_result)
+
+async def agenerate_analysis(question: str, data: list, llm_limit: asyncio.Semaphore = None) -> str:
+    """
+    Async generate_analysis; cancelling the task aborts the Ollama generation.
+    `llm_limit` is only acquired when the answer actually needs Ollama.
+    """
+    answer, request, empty_result = _analysis_request(question, data)
+    if request is None:
+        return answer
+
+    try:
+        async with (llm_limit or contextlib.nullcontext()):
+            response = await get_async_client().chat(**request)
+        record_llm(request["model"], response)
+        return _parse_analysis_response(response['message']['content'].strip(), empty_result)
     except Exception as e:
-        return f"Analysis unavailable due to processing error: {str(e)}"
+        return _analysis_error(e, empty_result)
+
+class _SummaryExtractor:
+    """
+    Incrementally pulls the value of "summary" out of a streamed {"summary": "..."}
+    reply, so the text can be forwarded while the JSON is still being generated.
+    """
+    _START = re.compile(r'"summary"\s*:\s*"')
+    _ESCAPES = {'n': ' ', 't': ' ', 'r': '', '"': '"', '\\': '\\', '/': '/'}
+
+    def __init__(self):
+        self.buffer = ""
+        self.started = False
+        self.finished = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> str:
+        if self.finished:
+            return ""
+        if not self.started:
+            self.buffer += chunk
+            m = self._START.search(self.buffer)
+            if not m:
+                return ""
+            self.started = True
+            chunk = self.buffer[m.end():]
+        out = []
+        for ch in chunk:
+            if self._escape:
+                out.append(self._ESCAPES.get(ch, ch))
+                self._escape = False
+            elif ch == '\\':
+                self._escape = True
+            elif ch == '"':
+                self.finished = True
+                break
+            else:
+                out.append(ch)
+        return "".join(out)
+
+async def astream_analysis(question: str, data: list, llm_limit: asyncio.Semaphore = None):
+    """Yields the summary in chunks as Ollama generates it (same answer as generate_analysis)."""
+    answer, request, empty_result = _analysis_request(question, data)
+    if request is None:
+        yield answer
+        return
+
+    extractor = _SummaryExtractor()
+    raw = []
+    try:
+        async with (llm_limit or contextlib.nullcontext()):
+            async for part in await get_async_client().chat(**request, stream=True):
+                chunk = part['message']['content']
+                raw.append(chunk)
+                if part.get('done'):
+                    record_llm(request["model"], part)
+                text = extractor.feed(chunk)
+                if text:
+                    yield text
+    except Exception as e:
+        if not extractor.started:
+            yield _analysis_error(e, empty_result)
+        return
+
+    if not extractor.started:
+        # The model didn't answer in the expected JSON shape; fall back to the regular parse
+        yield _parse_analysis_response("".join(raw).strip(), empty_result)
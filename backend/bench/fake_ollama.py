@@ -0,0 +1,195 @@
+# Local stand-in for the Ollama HTTP API used by the benchmark suite.
+# Answers /api/chat with the golden SQL for known questions and a canned summary
+# otherwise, paced like a real model: prompt evaluation proportional to prompt
+# length, then generated tokens at a fixed rate. Honors "stop" and "stream".
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PIECE = re.compile(r"\S+\s*|\s+")
+_QUESTION = re.compile(r"(?:User )?Question:\s*(.+)")
+
+
+class ModelProfile:
+    """Latency model of one Ollama model (all times in ms)."""
+
+    def __init__(self, load_ms=20.0, prompt_tokens_per_second=1500.0, tokens_per_second=60.0, answer_tokens=18):
+        self.load_ms = load_ms
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+
+    def prompt_delay(self, prompt: str) -> float:
+        # ~4 characters per token is close enough for llama tokenizers on English/SQL
+        tokens = len(prompt) / 4
+        return (self.load_ms + tokens / self.prompt_tokens_per_second * 1000) / 1000
+
+    def token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+def _words(text: str) -> set:
+    return set(_WORD.findall(text.lower()))
+
+
+def apply_stop(text: str, stop) -> str:
+    """Cuts the text at the first stop sequence, which Ollama leaves out of the reply."""
+    cut = len(text)
+    for sequence in stop or []:
+        position = text.find(sequence)
+        if position != -1:
+            cut = min(cut, position)
+    return text[:cut]
+
+
+class FakeModel:
+    """Picks the reply for a chat request. Golden questions are matched by the share of their words present."""
+
+    def __init__(self, golden: list, profile: ModelProfile = None, fallback_sql: str = "SELECT COUNT(*) as total_customers FROM master_customer"):
+        self.golden = [(_words(item["question"]), item["sql"]) for item in golden]
+        self.profile = profile or ModelProfile()
+        self.fallback_sql = fallback_sql
+
+    def golden_sql(self, question: str) -> str:
+        words = _words(question)
+        best, best_score = self.fallback_sql, 0.6
+        for golden_words, sql in self.golden:
+            score = len(words & golden_words) / max(1, len(golden_words))
+            if score > best_score:
+                best, best_score = sql, score
+        return best
+
+    def reply(self, messages: list, options: dict) -> str:
+        if not messages:
+            return ""
+        prompt = "\n".join(m.get("content", "") for m in messages)
+        match = _QUESTION.search(messages[-1].get("content", ""))
+        question = match.group(1).strip() if match else messages[-1].get("content", "")
+        if '"sql"' in prompt:
+            text = json.dumps({"sql": self.golden_sql(question)})
+        elif '"summary"' in prompt:
+            text = json.dumps({"summary": self._filler()})
+        else:
+            text = self._filler()
+        return apply_stop(text, (options or {}).get("stop"))
+
+    def _filler(self) -> str:
+        words = ("Revenue", "looks", "steady", "with", "most", "bookings", "from", "regular", "customers")
+        return " ".join(words[i % len(words)] for i in range(self.profile.answer_tokens)) + "."
+
+
+class _Handler(BaseHTTPRequestHandler):
+    model: FakeModel = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body: dict, status: int = 200):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path in ("/api/tags", "/api/ps"):
+            self._send_json({"models": [{"name": "fake", "model": "fake"}]})
+        elif self.path == "/":
+            self._send_json({"status": "Ollama is running"})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/chat":
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        messages = request.get("messages") or []
+        options = request.get("options") or {}
+        profile = self.model.profile
+        started = time.perf_counter()
+        text = self.model.reply(messages, options)
+        pieces = _PIECE.findall(text)
+        limit = options.get("num_predict")
+        if limit and limit > 0:
+            pieces = pieces[:limit]
+
+        if messages:
+            time.sleep(profile.prompt_delay("\n".join(m.get("content", "") for m in messages)))
+
+        def chunk(content, done):
+            body = {
+                "model": request.get("model", "fake"),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+            if done:
+                body.update({
+                    "done_reason": "stop",
+                    "total_duration": int((time.perf_counter() - started) * 1e9),
+                    "eval_count": len(pieces),
+                })
+            return body
+
+        if not request.get("stream", True):
+            time.sleep(profile.token_delay() * len(pieces))
+            self._send_json(chunk("".join(pieces), True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for piece in pieces:
+                time.sleep(profile.token_delay())
+                self._write_chunk(chunk(piece, False))
+            self._write_chunk(chunk("", True))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the generation
+            pass
+
+    def _write_chunk(self, body: dict):
+        line = (json.dumps(body) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllama:
+    """Runs the stand-in on a background thread: with FakeOllama(model) as url: ..."""
+
+    def __init__(self, model: FakeModel, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (_Handler,), {"model": model})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
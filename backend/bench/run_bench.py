@@ -0,0 +1,180 @@
+# Offline benchmark for the /query pipeline.
+#
+#   python -m bench.seed_db                      # once: seeded salonpos_bench database
+#   python -m bench.run_bench --iterations 20 --output bench_report.json
+#   python -m bench.run_bench --baseline bench_report.json --max-regression 0.2
+#   python -m bench.run_bench --real-model       # real Ollama at OLLAMA_HOST instead of the stand-in
+#
+# Runs every golden question through query_pipeline against the bench database
+# and the Ollama stand-in (fake_ollama), then reports p50/p95/p99 per stage
+# (sql_generation, validate, db, analysis, total). Exits 1 when a threshold or the
+# allowed regression against a baseline report is exceeded.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+from bench.fake_ollama import FakeModel, FakeOllama, ModelProfile
+from bench.stats import summarize_stages, check_thresholds, check_regression
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_PATH = os.path.join(BENCH_DIR, "golden_questions.json")
+THRESHOLDS_PATH = os.path.join(BENCH_DIR, "thresholds.json")
+
+# Shortcuts that would hide the stages being measured; --fast-paths leaves them on
+_COLD_ENV = {
+    "SQL_TEMPLATES_ENABLED": "0",
+    "SQL_CACHE_ENABLED": "0",
+    "RESULT_CACHE_ENABLED": "0",
+    "SUMMARIZER_ENABLED": "0",
+}
+
+
+def _load_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _configure_env(args, ollama_url: str):
+    # Must run before the backend modules are imported: they read their settings at import time
+    os.environ["DB_NAME"] = args.database
+    os.environ["SCHEMA_REFRESH_INTERVAL"] = "0"
+    if ollama_url:
+        os.environ["OLLAMA_HOST"] = ollama_url
+    if args.fast_paths:
+        os.environ.setdefault("SQL_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_"), "sql_cache.db"))
+    else:
+        os.environ.update(_COLD_ENV)
+
+
+async def _run(golden: list, iterations: int, warmup: int, concurrency: int):
+    from query_pipeline import run_query_pipeline
+    from result_cache import normalize_sql
+    from nl_sql import load_schema_if_needed
+
+    await asyncio.to_thread(load_schema_if_needed)
+    limit = asyncio.Semaphore(max(1, concurrency))
+    samples = []
+
+    async def one(item, record: bool):
+        async with limit:
+            timings = {}
+            started = time.perf_counter()
+            result = await run_query_pipeline(item["question"], timings=timings)
+            timings["total"] = (time.perf_counter() - started) * 1000
+        if record:
+            samples.append({
+                "id": item["id"],
+                "status": result.get("status"),
+                "sql_match": normalize_sql(result.get("sql") or "") == normalize_sql(item["sql"]),
+                "timings": timings,
+            })
+
+    for _ in range(warmup):
+        await asyncio.gather(*(one(item, False) for item in golden))
+    for _ in range(iterations):
+        await asyncio.gather(*(one(item, True) for item in golden))
+    return samples
+
+
+def build_report(samples: list, config: dict) -> dict:
+    questions = {}
+    for sample in samples:
+        entry = questions.setdefault(sample["id"], {"runs": [], "statuses": {}, "sql_matches": 0})
+        entry["runs"].append(sample["timings"])
+        entry["statuses"][sample["status"]] = entry["statuses"].get(sample["status"], 0) + 1
+        entry["sql_matches"] += sample["sql_match"]
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        "stages": summarize_stages([s["timings"] for s in samples]),
+        "questions": {
+            qid: {
+                "statuses": entry["statuses"],
+                "sql_match_rate": round(entry["sql_matches"] / len(entry["runs"]), 3),
+                "stages": summarize_stages(entry["runs"]),
+            }
+            for qid, entry in questions.items()
+        },
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{'stage':<16}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<16}{s['count']:>7}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}{s['max']:>10.1f}")
+    print(f"\n{'question':<24}{'total p95':>11}  statuses")
+    for qid, q in report["questions"].items():
+        total = q["stages"].get("total", {})
+        print(f"{qid:<24}{total.get('p95', 0):>11.1f}  {q['statuses']}  sql match {q['sql_match_rate']:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the query pipeline offline.")
+    parser.add_argument("--iterations", type=int, default=10, help="measured passes over the golden set")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured passes first")
+    parser.add_argument("--concurrency", type=int, default=1, help="questions in flight at once")
+    parser.add_argument("--database", default=os.getenv("BENCH_DB_NAME", "salonpos_bench"))
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--only", nargs="*", help="golden question ids to run")
+    parser.add_argument("--fast-paths", action="store_true",
+                        help="keep templates, SQL/result caches and the summarizer on (measures the warm path)")
+    parser.add_argument("--real-model", action="store_true", help="use the real Ollama at OLLAMA_HOST")
+    parser.add_argument("--load-ms", type=float, default=20.0, help="stand-in: fixed latency per call")
+    parser.add_argument("--prompt-tps", type=float, default=1500.0, help="stand-in: prompt tokens evaluated per second")
+    parser.add_argument("--tps", type=float, default=60.0, help="stand-in: tokens generated per second")
+    parser.add_argument("--answer-tokens", type=int, default=18, help="stand-in: words in a summary reply")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH, help="JSON of absolute per-stage limits ('' = none)")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    golden = _load_json(args.golden)
+    if args.only:
+        golden = [item for item in golden if item["id"] in args.only]
+
+    profile = ModelProfile(args.load_ms, args.prompt_tps, args.tps, args.answer_tokens)
+    stub = None if args.real_model else FakeOllama(FakeModel(golden, profile))
+    _configure_env(args, stub.start() if stub else None)
+    config = {
+        "iterations": args.iterations, "warmup": args.warmup, "concurrency": args.concurrency,
+        "database": args.database, "fast_paths": args.fast_paths, "questions": len(golden),
+        "ollama": "real" if args.real_model else vars(profile), "python": platform.python_version(),
+    }
+
+    try:
+        samples = asyncio.run(_run(golden, args.iterations, args.warmup, args.concurrency))
+    finally:
+        if stub:
+            stub.stop()
+        from database import get_pool
+        get_pool().close_all()
+
+    report = build_report(samples, config)
+    violations = []
+    if args.thresholds and not args.real_model:
+        violations += check_thresholds(report["stages"], _load_json(args.thresholds))
+    if args.baseline:
+        violations += check_regression(report["stages"], _load_json(args.baseline)["stages"], args.max_regression)
+    report["violations"] = violations
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    if violations:
+        print("\n[FAIL] Performance regression:")
+        for violation in violations:
+            print(f"  - {violation}")
+        raise SystemExit(1)
+    print("\n[OK] Within thresholds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# Creates and fills the benchmark database: the salon tables the golden questions
+# touch, with deterministic data (same --seed, same rows) at a configurable scale.
+#
+#   python -m bench.seed_db --customers 2000 --bills 20000
+#
+# Connection settings come from DB_HOST/DB_USER/DB_PASSWORD (database.DB_CONFIG); the database is
+# BENCH_DB_NAME (default salonpos_bench). Existing bench tables are dropped first.
+# Tables with a production dump (schema_check.txt, schema_debug.txt) use its column names
+# and types, e.g. billing_transactions.customerr_name and a varchar customer_id.
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from database import DB_CONFIG
+
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "salonpos_bench")
+
+TABLES = {
+    "master_customer": """
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        customer_name VARCHAR(120) NOT NULL,
+        gender VARCHAR(10),
+        customer_mobile BIGINT,
+        membership VARCHAR(20),
+        visitcnt INT NOT NULL DEFAULT 0,
+        birthday DATE,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        KEY idx_customer_name (customer_name)
+    """,
+    "master_employee": """
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        employee_name VARCHAR(120) NOT NULL,
+        designation VARCHAR(50),
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    """,
+    "master_service": """
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        service_name VARCHAR(120) NOT NULL,
+        category VARCHAR(50),
+        price DECIMAL(10,3) NOT NULL
+    """,
+    "master_inventory": """
+        id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        product_id VARCHAR(10) NOT NULL,
+        product_name VARCHAR(100) NOT NULL,
+        volume VARCHAR(15),
+        min_stock_level DECIMAL(10,2) NOT NULL DEFAULT 0,
+        KEY idx_product_id (product_id)
+    """,
+    "billing_transactions": """
+        id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        invoice_id VARCHAR(50) NOT NULL,
+        customer_id VARCHAR(50) DEFAULT '0',
+        customerr_name VARCHAR(120),
+        employee_id VARCHAR(20),
+        subtotal DECIMAL(10,3) NOT NULL DEFAULT 0,
+        discount_amount DECIMAL(10,3) NOT NULL DEFAULT 0,
+        tax_amount DECIMAL(10,3) NOT NULL DEFAULT 0,
+        grand_total DECIMAL(10,3),
+        billstatus CHAR(1) DEFAULT 'Y',
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        KEY idx_bt_customer (customer_id),
+        KEY idx_bt_created (created_at)
+    """,
+    "billing_trans_summary": """
+        id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        invoice_id VARCHAR(50) NOT NULL,
+        service_id INT,
+        service_name VARCHAR(120),
+        qty INT NOT NULL DEFAULT 1,
+        grand_total DECIMAL(10,3),
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        KEY idx_bts_service (service_id)
+    """,
+    "billing_trans_inventory": """
+        id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        invoice_id VARCHAR(40) NOT NULL,
+        product_id VARCHAR(50),
+        qty INT NOT NULL DEFAULT 1,
+        grand_total DECIMAL(10,3),
+        created_at DATETIME,
+        KEY idx_bti_product (product_id)
+    """,
+    "appointment_transactions": """
+        id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        customer_id INT,
+        customer_name VARCHAR(120),
+        employee_id INT,
+        appointment_date DATE,
+        slot_time TIME,
+        status VARCHAR(20),
+        payment_mode VARCHAR(20),
+        balance_due DECIMAL(10,3) NOT NULL DEFAULT 0,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    """,
+    "appointment_trans_summary": """
+        id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        appointment_id BIGINT,
+        service_id INT,
+        service_name VARCHAR(120),
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    """,
+}
+
+FIRST_NAMES = ["Priya", "Arjun", "Divya", "Karthik", "Meena", "Rahul", "Anitha", "Suresh", "Lakshmi", "Vijay",
+               "Deepa", "Ravi", "Kavya", "Manoj", "Sneha", "Ajay", "Revathi", "Gokul", "Nisha", "Hari"]
+LAST_NAMES = ["Sharma", "Kumar", "Iyer", "Reddy", "Nair", "Prakash", "Menon", "Rao", "Pillai", "Das"]
+SERVICES = [("Haircut", "Hair", 350), ("Hair Spa", "Hair", 1200), ("Hair Colour", "Hair", 2500),
+            ("Facial", "Skin", 1500), ("Cleanup", "Skin", 800), ("Manicure", "Nails", 600),
+            ("Pedicure", "Nails", 700), ("Threading", "Beauty", 80), ("Waxing", "Beauty", 900),
+            ("Bridal Makeup", "Makeup", 15000), ("Head Massage", "Wellness", 500), ("Beard Trim", "Hair", 150)]
+PRODUCTS = ["Shampoo", "Conditioner", "Hair Serum", "Face Wash", "Moisturiser", "Sunscreen", "Nail Polish",
+            "Hair Oil", "Face Mask", "Body Lotion", "Hair Gel", "Lip Balm", "Toner", "Scrub", "Hair Spray"]
+PAYMENT_MODES = ["Cash", "UPI", "Card", "Wallet"]
+APPOINTMENT_STATUSES = ["Pending", "Confirmed", "Completed", "Cancelled"]
+DESIGNATIONS = ["Stylist", "Senior Stylist", "Therapist", "Beautician", "Manager"]
+
+
+def _insert(cursor, table: str, columns: tuple, rows: list, batch: int = 1000):
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    for start in range(0, len(rows), batch):
+        cursor.executemany(sql, rows[start:start + batch])
+
+
+def seed(cursor, customers: int = 2000, bills: int = 20000, appointments: int = 5000,
+         employees: int = 15, seed_value: int = 42, now: datetime = None):
+    """Drops and recreates the bench tables, then fills them."""
+    rng = random.Random(seed_value)
+    now = now or datetime.now().replace(microsecond=0)
+
+    for table in TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    for table, columns in TABLES.items():
+        cursor.execute(f"CREATE TABLE {table} ({columns})")
+
+    def moment(days_back: int) -> datetime:
+        return now - timedelta(days=rng.randint(0, days_back), minutes=rng.randint(0, 12 * 60))
+
+    names = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(customers)]
+    # The golden questions ask about these two by name
+    names[:2] = ["Priya Sharma", "Arjun Kumar"]
+    _insert(cursor, "master_customer",
+            ("customer_name", "gender", "customer_mobile", "membership", "visitcnt", "birthday", "created_at"),
+            [(name, rng.choice(["Female", "Male"]), 9000000000 + i, rng.choice([None, "Silver", "Gold"]),
+              0, (now - timedelta(days=rng.randint(18 * 365, 60 * 365))).date(), moment(900))
+             for i, name in enumerate(names)])
+    _insert(cursor, "master_employee", ("employee_name", "designation", "created_at"),
+            [(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", rng.choice(DESIGNATIONS), moment(1500))
+             for _ in range(employees)])
+    _insert(cursor, "master_service", ("service_name", "category", "price"), SERVICES)
+    _insert(cursor, "master_inventory", ("product_id", "product_name", "volume", "min_stock_level"),
+            [(f"P{i + 1:04d}", f"{product} {size}ml", str(rng.randint(0, 60)) if rng.random() > 0.05 else "",
+              rng.choice([5, 10, 15, 20]))
+             for i, (product, size) in enumerate((p, s) for p in PRODUCTS for s in (100, 250, 500))])
+
+    visits = [0] * customers
+    bill_rows, summary_rows, inventory_rows = [], [], []
+    product_count = len(PRODUCTS) * 3
+    for i in range(bills):
+        customer = rng.randrange(customers)
+        visits[customer] += 1
+        created = moment(720)
+        invoice = f"INV{i + 1:07d}"
+        total = 0.0
+        for _ in range(rng.choice([1, 1, 1, 2, 2, 3])):
+            service_id = rng.randrange(len(SERVICES))
+            name, _, price = SERVICES[service_id]
+            qty = 1
+            summary_rows.append((invoice, service_id + 1, name, qty, price * qty, created))
+            total += price * qty
+        if rng.random() < 0.25:
+            # Leave the last few products unsold so "never sold" has answers
+            product = rng.randrange(product_count - 5)
+            amount = rng.randint(150, 900)
+            inventory_rows.append((invoice, f"P{product + 1:04d}", 1, amount, created))
+            total += amount
+        discount = round(total * rng.choice([0, 0, 0.05, 0.1]), 3)
+        tax = round((total - discount) * 0.18, 3)
+        # customer_id and employee_id are varchar columns in production, so they are stored as text
+        bill_rows.append((invoice, str(customer + 1), names[customer], str(rng.randint(1, employees)), total,
+                          discount, tax, total - discount + tax, created, created))
+    _insert(cursor, "billing_transactions",
+            ("invoice_id", "customer_id", "customerr_name", "employee_id", "subtotal", "discount_amount",
+             "tax_amount", "grand_total", "created_at", "updated_at"), bill_rows)
+    _insert(cursor, "billing_trans_summary",
+            ("invoice_id", "service_id", "service_name", "qty", "grand_total", "created_at"), summary_rows)
+    _insert(cursor, "billing_trans_inventory",
+            ("invoice_id", "product_id", "qty", "grand_total", "created_at"), inventory_rows)
+    cursor.executemany("UPDATE master_customer SET visitcnt = %s WHERE id = %s",
+                       [(count, i + 1) for i, count in enumerate(visits) if count])
+
+    appointment_rows, appointment_services = [], []
+    for i in range(appointments):
+        customer = rng.randrange(customers)
+        day = (now + timedelta(days=rng.randint(-180, 30))).date()
+        service_id = rng.randrange(len(SERVICES))
+        appointment_rows.append((customer + 1, names[customer], rng.randint(1, employees), day,
+                                 f"{rng.randint(9, 20):02d}:{rng.choice(['00', '30'])}:00",
+                                 rng.choice(APPOINTMENT_STATUSES), rng.choice(PAYMENT_MODES),
+                                 rng.choice([0, 0, 0, 250, 500]), moment(200)))
+        appointment_services.append((i + 1, service_id + 1, SERVICES[service_id][0], moment(200)))
+    _insert(cursor, "appointment_transactions",
+            ("customer_id", "customer_name", "employee_id", "appointment_date", "slot_time", "status",
+             "payment_mode", "balance_due", "created_at"), appointment_rows)
+    _insert(cursor, "appointment_trans_summary",
+            ("appointment_id", "service_id", "service_name", "created_at"), appointment_services)
+
+    return {
+        "customers": customers, "bills": len(bill_rows), "bill_services": len(summary_rows),
+        "bill_products": len(inventory_rows), "appointments": len(appointment_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create and seed the benchmark database.")
+    parser.add_argument("--database", default=BENCH_DB_NAME)
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--bills", type=int, default=20000)
+    parser.add_argument("--appointments", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="allow a database name without the _bench suffix")
+    args = parser.parse_args()
+
+    if not args.database.endswith("_bench") and not args.force:
+        parser.error(f"refusing to drop tables in {args.database!r}; use a *_bench database or --force")
+
+    conn = mysql.connector.connect(**{k: v for k, v in DB_CONFIG.items() if k != "database"})
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}`")
+        cursor.execute(f"USE `{args.database}`")
+        counts = seed(cursor, args.customers, args.bills, args.appointments, seed_value=args.seed)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    print(f"[OK] Seeded {args.database}: {counts}")
+
+
+if __name__ == "__main__":
+    main()
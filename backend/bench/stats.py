@@ -0,0 +1,66 @@
+# Percentile summaries and regression checks for benchmark reports.
+import math
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile (p in 0..100) of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: list) -> dict:
+    """{"count", "mean", "p50", "p95", "p99", "max"} in ms for one stage."""
+    if not samples:
+        return {"count": 0}
+    summary = {"count": len(samples), "mean": round(sum(samples) / len(samples), 2)}
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(percentile(samples, p), 2)
+    summary["max"] = round(max(samples), 2)
+    return summary
+
+
+def summarize_stages(runs: list) -> dict:
+    """Per-stage summaries from a list of {stage: ms} timing dicts."""
+    samples = {}
+    for timings in runs:
+        for stage, ms in timings.items():
+            samples.setdefault(stage, []).append(ms)
+    return {stage: summarize(values) for stage, values in sorted(samples.items())}
+
+
+def check_thresholds(stages: dict, thresholds: dict) -> list:
+    """
+    Violations of absolute limits, e.g. {"total": {"p95": 2500}}. Returns a list of
+    human-readable messages; empty means the run is within budget.
+    """
+    violations = []
+    for stage, limits in thresholds.items():
+        summary = stages.get(stage)
+        if not summary or not summary.get("count"):
+            continue
+        for metric, limit in limits.items():
+            value = summary.get(metric)
+            if value is not None and value > limit:
+                violations.append(f"{stage} {metric} {value:.1f} ms > limit {limit:.1f} ms")
+    return violations
+
+
+def check_regression(stages: dict, baseline: dict, max_ratio: float, metric: str = "p95", min_ms: float = 5.0) -> list:
+    """
+    Stages whose `metric` grew by more than max_ratio (0.2 = 20%) over the baseline
+    report's stages. Stages faster than min_ms in the baseline are ignored as noise.
+    """
+    violations = []
+    for stage, summary in stages.items():
+        before = (baseline.get(stage) or {}).get(metric)
+        after = summary.get(metric)
+        if before is None or after is None or before < min_ms:
+            continue
+        if after > before * (1 + max_ratio):
+            violations.append(
+                f"{stage} {metric} {after:.1f} ms vs baseline {before:.1f} ms (+{(after / before - 1) * 100:.0f}%)"
+            )
+    return violations
@@ -0,0 +1,255 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_db_connection
+from result_cache import sql_fingerprint
+from logging_config import get_logger
+
+log = get_logger("cost_guard")
+
+# Configuration
+COST_GUARD_ENABLED = os.getenv("COST_GUARD_ENABLED", "1") == "1"
+# Estimated rows examined above which an unbounded query gets a LIMIT appended
+COST_GUARD_ROW_BUDGET = int(os.getenv("COST_GUARD_ROW_BUDGET", "1000000"))
+# Estimated rows examined above which the query is rejected outright
+COST_GUARD_MAX_ROWS = int(os.getenv("COST_GUARD_MAX_ROWS", "50000000"))
+COST_GUARD_LIMIT = int(os.getenv("COST_GUARD_LIMIT", "1000"))
+# Per-statement execution time limit in milliseconds
+SQL_MAX_EXECUTION_MS = int(os.getenv("SQL_MAX_EXECUTION_MS", "15000"))
+# Seconds a memoized EXPLAIN verdict is trusted; row estimates drift as tables grow
+COST_GUARD_MEMO_TTL = float(os.getenv("COST_GUARD_MEMO_TTL", "600"))
+
+_PLAN_CACHE_SIZE = 512
+
+_WORD = re.compile(r"[A-Za-z_]+")
+
+
+class QueryCostError(Exception):
+    """Raised when a generated query is estimated to be too expensive to run."""
+
+
+def top_level_words(sql: str):
+    """Yields (position, UPPERCASE word) for keywords outside parentheses, strings and comments."""
+    depth = 0
+    i = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"', "`"):
+            i += 1
+            while i < n and sql[i] != ch:
+                i += 2 if sql[i] == "\\" else 1
+            i += 1
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif ch == "(":
+            depth += 1
+            i += 1
+        elif ch == ")":
+            depth -= 1
+            i += 1
+        elif depth == 0 and (ch.isalpha() or ch == "_"):
+            m = _WORD.match(sql, i)
+            yield i, m.group(0).upper()
+            i = m.end()
+        else:
+            i += 1
+
+
+def has_top_level_limit(sql: str) -> bool:
+    return any(word == "LIMIT" for _, word in top_level_words(sql))
+
+
+def add_limit(sql: str, limit: int) -> str:
+    return f"{sql.strip().rstrip(';').strip()} LIMIT {int(limit)}"
+
+
+def _main_select_position(sql: str):
+    """Position of the SELECT keyword of the outermost query (after any WITH clause)."""
+    for pos, word in top_level_words(sql):
+        if word == "SELECT":
+            return pos
+    return None
+
+
+_SERVER_FLAVOR = None
+_FLAVOR_LOCK = threading.Lock()
+
+
+def _server_flavor(cursor) -> str:
+    global _SERVER_FLAVOR
+    if _SERVER_FLAVOR is None:
+        with _FLAVOR_LOCK:
+            if _SERVER_FLAVOR is None:
+                cursor.execute("SELECT VERSION()")
+                version = str(cursor.fetchone()[0])
+                _SERVER_FLAVOR = "mariadb" if "mariadb" in version.lower() else "mysql"
+    return _SERVER_FLAVOR
+
+
+def apply_time_limit(sql: str, max_ms: int = None, flavor: str = "mysql") -> str:
+    """
+    Attaches a per-statement execution time limit: the MAX_EXECUTION_TIME optimizer
+    hint on MySQL, SET STATEMENT max_statement_time on MariaDB.
+    """
+    max_ms = SQL_MAX_EXECUTION_MS if max_ms is None else max_ms
+    sql = sql.strip().rstrip(";").strip()
+    if not max_ms:
+        return sql
+    if flavor == "mariadb":
+        return f"SET STATEMENT max_statement_time={max_ms / 1000:g} FOR {sql}"
+    pos = _main_select_position(sql)
+    if pos is None or "MAX_EXECUTION_TIME" in sql.upper():
+        return sql
+    pos += len("SELECT")
+    return f"{sql[:pos]} /*+ MAX_EXECUTION_TIME({int(max_ms)}) */{sql[pos:]}"
+
+
+def estimate_rows_examined(plan: list) -> int:
+    """
+    Rough rows-examined estimate from tabular EXPLAIN output: tables that share a
+    select id are nested-loop joined (rows multiply), separate select ids add up.
+    """
+    per_select = OrderedDict()
+    for row in plan:
+        rows = row.get("rows")
+        if rows is None:
+            continue
+        select_id = row.get("id")
+        per_select[select_id] = per_select.get(select_id, 1) * max(int(rows), 1)
+    return sum(per_select.values())
+
+
+class CostGuard:
+    """
+    Runs EXPLAIN before execution, rejects queries above COST_GUARD_MAX_ROWS,
+    appends a LIMIT to unbounded queries above COST_GUARD_ROW_BUDGET and always
+    attaches the execution time limit. Decisions are memoized per SQL fingerprint
+    for memo_ttl seconds, and dropped on a schema change (nl_sql._invalidate_schema_caches).
+    """
+
+    def __init__(self, row_budget=COST_GUARD_ROW_BUDGET, max_rows=COST_GUARD_MAX_ROWS,
+                 limit=COST_GUARD_LIMIT, max_execution_ms=SQL_MAX_EXECUTION_MS, memo_ttl=COST_GUARD_MEMO_TTL):
+        self.row_budget = row_budget
+        self.max_rows = max_rows
+        self.limit = limit
+        self.max_execution_ms = max_execution_ms
+        self.memo_ttl = memo_ttl
+        # fingerprint -> ((checked_sql or None, estimate, reason), expires_at on the monotonic clock)
+        self._decisions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"checked": 0, "rewritten": 0, "rejected": 0, "memo_hits": 0}
+
+    def _remember(self, key, decision):
+        with self._lock:
+            self._decisions[key] = (decision, time.monotonic() + self.memo_ttl)
+            self._decisions.move_to_end(key)
+            while len(self._decisions) > _PLAN_CACHE_SIZE:
+                self._decisions.popitem(last=False)
+
+    def check(self, sql: str) -> str:
+        """
+        EXPLAIN-based budget check. Returns the SQL (with a LIMIT appended when it
+        was over budget and unbounded) or raises QueryCostError with the reason.
+        """
+        key = sql_fingerprint(sql)
+        decision = None
+        with self._lock:
+            entry = self._decisions.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                decision = entry[0]
+                self._decisions.move_to_end(key)
+                self._stats["memo_hits"] += 1
+            elif entry is not None:
+                del self._decisions[key]
+        if decision is None:
+            decision = self._evaluate(sql)
+            self._remember(key, decision)
+
+        checked_sql, estimate, reason = decision
+        if checked_sql is None:
+            raise QueryCostError(reason)
+        return checked_sql
+
+    def limit_time(self, sql: str) -> str:
+        """Attaches the execution time limit for the connected server flavor."""
+        if _SERVER_FLAVOR is None:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor(buffered=True)
+                _server_flavor(cursor)
+                cursor.close()
+            finally:
+                conn.close()
+        return apply_time_limit(sql, self.max_execution_ms, _SERVER_FLAVOR)
+
+    def _evaluate(self, sql: str):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"EXPLAIN {sql}")
+            plan = cursor.fetchall()
+            cursor.close()
+            cursor = conn.cursor(buffered=True)
+            _server_flavor(cursor)
+            cursor.close()
+        finally:
+            conn.close()
+
+        estimate = estimate_rows_examined(plan)
+        with self._lock:
+            self._stats["checked"] += 1
+
+        if estimate > self.max_rows:
+            with self._lock:
+                self._stats["rejected"] += 1
+            reason = (f"Query rejected by cost guard: an estimated {estimate:,} rows would be examined "
+                      f"(limit {self.max_rows:,}). Try a narrower date range or a more specific question.")
+            log.warning("%s", reason)
+            return (None, estimate, reason)
+
+        reason = None
+        if estimate > self.row_budget and not has_top_level_limit(sql):
+            with self._lock:
+                self._stats["rewritten"] += 1
+            reason = f"LIMIT {self.limit} added: an estimated {estimate:,} rows would be examined"
+            log.warning("%s", reason)
+            sql = add_limit(sql, self.limit)
+
+        return (sql, estimate, reason)
+
+    def clear(self):
+        with self._lock:
+            self._decisions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": COST_GUARD_ENABLED,
+                "row_budget": self.row_budget,
+                "max_rows": self.max_rows,
+                "max_execution_ms": self.max_execution_ms,
+                "memo_ttl": self.memo_ttl,
+                "memo_size": len(self._decisions),
+                **self._stats,
+            }
+
+
+cost_guard = CostGuard()
+
+
+def check_sql_cost(sql: str) -> str:
+    """Budget check only; pair with limit_sql_time() once the final statement is built."""
+    if not COST_GUARD_ENABLED:
+        return sql
+    return cost_guard.check(sql)
+
+
+def limit_sql_time(sql: str) -> str:
+    if not COST_GUARD_ENABLED:
+        return sql
+    return cost_guard.limit_time(sql)
@@ -1,11 +1,270 @@
+import os
+import threading
+import time
+from collections import deque
+
 import mysql.connector
+from dotenv import load_dotenv
+from logging_config import get_logger
+
+log = get_logger("database")
+
+load_dotenv()
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", "dhanu1837"),
+    "database": os.getenv("DB_NAME", "salonpos"),
+}
+
+# Pool configuration
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))     # seconds before a connection is recycled
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "10"))  # seconds to wait for a free connection
+POOL_MAX_WAITERS = int(os.getenv("DB_POOL_MAX_WAITERS", "50"))           # backpressure: reject beyond this queue depth
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+
+class PoolError(Exception):
+    """Base error for connection pool failures."""
+
+
+class PoolTimeoutError(PoolError):
+    """No connection became available within the checkout timeout."""
+
+
+class PoolExhaustedError(PoolError):
+    """Too many callers are already waiting for a connection."""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a mysql.connector connection.
+    close() hands the connection back to the pool instead of disconnecting,
+    so existing callers (conn.cursor() ... conn.close()) work unchanged.
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._raw = entry[0]
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.release(entry)
+
+    def invalidate(self):
+        """Drop the underlying connection instead of returning it to the pool."""
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.release(entry, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded MySQL connection pool with validation on checkout,
+    max-lifetime recycling, checkout timeout and waiter backpressure.
+    """
+
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 max_lifetime=POOL_MAX_LIFETIME, checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+                 max_waiters=POOL_MAX_WAITERS, pre_ping=POOL_PRE_PING, **connect_kwargs):
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max(1, max_size)
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.max_waiters = max_waiters
+        self.pre_ping = pre_ping
+        self._connect_kwargs = connect_kwargs or dict(DB_CONFIG)
+
+        self._idle = deque()  # (raw_connection, created_at)
+        self._size = 0        # open connections, idle + in use
+        self._in_use = 0
+        self._waiters = 0
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "failed_pings": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _connect(self):
+        # autocommit keeps REPEATABLE READ snapshots from going stale across checkouts
+        raw = mysql.connector.connect(autocommit=True, **self._connect_kwargs)
+        with self._cond:
+            self._stats["created"] += 1
+        log.debug("Database connected")
+        return (raw, time.monotonic())
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def warm_up(self):
+        """Open connections up to min_size so the first requests skip the handshake."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._connect()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                log.error("Pool warm-up failed: %s", e)
+                return
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def acquire(self, timeout=None) -> PooledConnection:
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        entry = None
+
+        with self._cond:
+            if not self._idle and self._size >= self.max_size and self._waiters >= self.max_waiters:
+                self._stats["rejected"] += 1
+                raise PoolExhaustedError(
+                    f"Connection pool exhausted ({self._in_use} in use, {self._waiters} waiting)"
+                )
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()  # LIFO keeps the hottest connections in use
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(f"Timed out after {timeout:.1f}s waiting for a database connection")
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+            self._in_use += 1
+            waited = time.monotonic() - start
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+
+        try:
+            entry = self._connect() if entry is None else self._validate(entry)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, entry)
+
+    def _validate(self, entry):
+        raw, created_at = entry
+        if self.max_lifetime and time.monotonic() - created_at > self.max_lifetime:
+            with self._cond:
+                self._stats["recycled"] += 1
+            self._close_quietly(raw)
+            return self._connect()
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._stats["failed_pings"] += 1
+                self._close_quietly(raw)
+                return self._connect()
+        return entry
+
+    def release(self, entry, discard=False):
+        raw = entry[0]
+        if not discard:
+            try:
+                if raw.unread_result:
+                    raw.consume_results()
+                if raw.in_transaction:
+                    raw.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append(entry)
+            self._cond.notify()
+
+        if discard:
+            self._close_quietly(raw)
+
+    def stats(self) -> dict:
+        with self._cond:
+            checkouts = self._stats["checkouts"]
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiters": self._waiters,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                **self._stats,
+                "wait_time_avg": self._stats["wait_time_total"] / checkouts if checkouts else 0.0,
+            }
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ConnectionPool(**DB_CONFIG)
+    return _POOL
+
 
 def get_db_connection():
-    print("[OK] DATABASE CONNECTED")
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="dhanu1837",
-        database="salonpos"
-    )
+    """Check out a pooled connection. Call close() to return it to the pool."""
+    return get_pool().acquire()
+
 
+def get_pool_stats() -> dict:
+    return get_pool().stats()
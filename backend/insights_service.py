@@ -1,72 +1,122 @@
 from database import get_db_connection
+from metrics import stage_timer
+from rollups import insight_rollups
+from logging_config import get_logger
+
+log = get_logger("insights_service")
+
+# Dashboard sections computed from raw rows; the cost grows with billing history
+_LIVE_QUERIES = {
+    # 1. Top 5 Services by Quantity
+    "top_services": """
+        SELECT service_name, SUM(qty) as total_sold, SUM(grand_total) as total_revenue
+        FROM billing_trans_summary
+        GROUP BY service_id, service_name
+        ORDER BY total_sold DESC
+        LIMIT 5
+    """,
+    # 2. Top 5 Customers by Revenue
+    "top_customers": """
+        SELECT c.customer_name, SUM(bt.grand_total) as total_spent
+        FROM billing_transactions bt
+        JOIN master_customer c ON bt.customer_id = c.id
+        GROUP BY c.id, c.customer_name
+        ORDER BY total_spent DESC
+        LIMIT 5
+    """,
+    # 3. Customer Churn Risk (Regular customers not seen in 14 days)
+    # For demo purposes/old data, let's just show customers who haven't visited in the last 7 days regardless of how old.
+    "churn_risk": """
+        SELECT c.customer_name, MAX(bt.created_at) as last_visit
+        FROM master_customer c
+        JOIN billing_transactions bt ON bt.customer_id = c.id
+        GROUP BY c.id, c.customer_name
+        ORDER BY last_visit ASC
+        LIMIT 5
+    """,
+    # 4. Inventory Anomalies (Products with NO sales in billing_trans_inventory)
+    "anomalies": """
+        SELECT i.product_name as name, 'No Sales' as issue
+        FROM master_inventory i
+        LEFT JOIN billing_trans_inventory bti ON i.id = bti.product_id
+        WHERE bti.id IS NULL
+        LIMIT 5
+    """,
+    # 5. Daily Revenue Trend (Last 7 days of actual data)
+    "revenue_trend": """
+        SELECT DATE(created_at) as date, SUM(grand_total) as revenue
+        FROM billing_transactions
+        GROUP BY DATE(created_at)
+        ORDER BY date DESC
+        LIMIT 7
+    """,
+    # 6. Key Metrics (Revenue, Tx)
+    "metrics": """
+        SELECT 
+            SUM(grand_total) as total_revenue, 
+            COUNT(*) as total_transactions 
+        FROM billing_transactions
+    """,
+}
+
+# The same sections from the rollup tables (rollups.py); index reads of a few rows each
+_ROLLUP_QUERIES = {
+    "top_services": """
+        SELECT service_name, qty as total_sold, revenue as total_revenue
+        FROM rollup_service_sales
+        ORDER BY qty DESC
+        LIMIT 5
+    """,
+    "top_customers": """
+        SELECT c.customer_name, r.total_spent
+        FROM rollup_customer_spend r
+        JOIN master_customer c ON r.customer_id = c.id
+        ORDER BY r.total_spent DESC
+        LIMIT 5
+    """,
+    "churn_risk": """
+        SELECT c.customer_name, r.last_visit
+        FROM rollup_customer_spend r
+        JOIN master_customer c ON r.customer_id = c.id
+        ORDER BY r.last_visit ASC
+        LIMIT 5
+    """,
+    "anomalies": """
+        SELECT i.product_name as name, 'No Sales' as issue
+        FROM master_inventory i
+        LEFT JOIN rollup_product_sales p ON i.id = p.product_id
+        WHERE p.product_id IS NULL
+        LIMIT 5
+    """,
+    "revenue_trend": """
+        SELECT day as date, revenue
+        FROM rollup_daily_revenue
+        ORDER BY day DESC
+        LIMIT 7
+    """,
+    # One row per day, so this stays small however many bills there are
+    "metrics": """
+        SELECT 
+            SUM(revenue) as total_revenue, 
+            CAST(SUM(transactions) AS SIGNED) as total_transactions 
+        FROM rollup_daily_revenue
+    """,
+}
 
 def get_insights():
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        
-        # 1. Top 5 Services by Quantity
-        cursor.execute("""
-            SELECT service_name, SUM(qty) as total_sold, SUM(grand_total) as total_revenue
-            FROM billing_trans_summary
-            GROUP BY service_id, service_name
-            ORDER BY total_sold DESC
-            LIMIT 5
-        """)
-        top_services = cursor.fetchall()
-
-        # 2. Top 5 Customers by Revenue
-        cursor.execute("""
-            SELECT c.customer_name, SUM(bt.grand_total) as total_spent
-            FROM billing_transactions bt
-            JOIN master_customer c ON bt.customer_id = c.id
-            GROUP BY c.id, c.customer_name
-            ORDER BY total_spent DESC
-            LIMIT 5
-        """)
-        top_customers = cursor.fetchall()
 
-        # 3. Customer Churn Risk (Regular customers not seen in 14 days)
-        # For demo purposes/old data, let's just show customers who haven't visited in the last 7 days regardless of how old.
-        cursor.execute("""
-            SELECT c.customer_name, MAX(bt.created_at) as last_visit
-            FROM master_customer c
-            JOIN billing_transactions bt ON bt.customer_id = c.id
-            GROUP BY c.id, c.customer_name
-            ORDER BY last_visit ASC
-            LIMIT 5
-        """)
-        churn_risk = cursor.fetchall()
-
-        # 4. Inventory Anomalies (Products with NO sales in billing_trans_inventory)
-        cursor.execute("""
-            SELECT i.product_name as name, 'No Sales' as issue
-            FROM master_inventory i
-            LEFT JOIN billing_trans_inventory bti ON i.id = bti.product_id
-            WHERE bti.id IS NULL
-            LIMIT 5
-        """)
-        anomalies = cursor.fetchall()
-
-        # 5. Daily Revenue Trend (Last 7 days of actual data)
-        cursor.execute("""
-            SELECT DATE(created_at) as date, SUM(grand_total) as revenue
-            FROM billing_transactions
-            GROUP BY DATE(created_at)
-            ORDER BY date DESC
-            LIMIT 7
-        """)
-        revenue_trend = cursor.fetchall()
-        
-        # 6. Key Metrics (Revenue, Tx, Profit)
-        # Revenue & Tx
-        cursor.execute("""
-            SELECT 
-                SUM(grand_total) as total_revenue, 
-                COUNT(*) as total_transactions 
-            FROM billing_transactions
-        """)
-        summary = cursor.fetchone()
+        # Rollups until they are missing or mid-rebuild; then the raw tables
+        queries = _ROLLUP_QUERIES if insight_rollups.ready(cursor) else _LIVE_QUERIES
+        sections = {}
+        for name, sql in queries.items():
+            with stage_timer(f"insights_{name}"):
+                cursor.execute(sql)
+                sections[name] = cursor.fetchone() if name == "metrics" else cursor.fetchall()
+        summary = sections.pop("metrics")
         
         # Profit (Income - Expense)
         # Try to calculate from trans_income_expense if column 'amount' exists, else 0
@@ -80,15 +130,9 @@ def get_insights():
             profit = profit_data['profit'] if profit_data else 0
         except:
             profit = 0
-
-        conn.close()
         
         return {
-            "top_services": top_services,
-            "top_customers": top_customers,
-            "churn_risk": churn_risk,
-            "anomalies": anomalies,
-            "revenue_trend": revenue_trend,
+            **sections,
             "metrics": {
                 "revenue": summary['total_revenue'] or 0,
                 "transactions": summary['total_transactions'] or 0,
@@ -96,8 +140,11 @@ def get_insights():
             }
         }
     except Exception as e:
-        print(f"Error in get_insights: {e}")
+        log.error("Error in get_insights: %s", e)
         return {"error": str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
 
 if __name__ == "__main__":
     import json
@@ -0,0 +1,25 @@
+import os
+
+import ollama
+
+
+def _keep_alive(value: str):
+    # Ollama takes a duration string ("30m") or seconds; a negative value keeps the model loaded forever
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+# How long Ollama keeps the model in memory after each request
+OLLAMA_KEEP_ALIVE = _keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+
+_ASYNC_CLIENT = None
+
+
+def get_async_client() -> ollama.AsyncClient:
+    """Shared async Ollama client so in-flight requests reuse one HTTP connection pool."""
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        _ASYNC_CLIENT = ollama.AsyncClient(host=os.getenv("OLLAMA_HOST"))
+    return _ASYNC_CLIENT
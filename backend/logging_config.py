@@ -0,0 +1,138 @@
+# Structured, non-blocking logging for the backend.
+#
+# Loggers hand records to a QueueHandler, so the request thread (or the event
+# loop) only pays for an in-memory enqueue; a QueueListener thread formats them
+# as JSON lines (LOG_FORMAT=json, the default) or readable text and writes them
+# out. Every record carries the request_id of the request that produced it,
+# including records from worker threads (contextvars follow asyncio.to_thread).
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+
+# Configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")      # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+ROOT_LOGGER = "salonbrain"
+
+_REQUEST_ID = contextvars.ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def set_request_id(request_id: str):
+    """Tags every record logged in this context (and tasks/threads started from it)."""
+    return _REQUEST_ID.set(request_id)
+
+
+def get_request_id():
+    return _REQUEST_ID.get()
+
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        # Runs on the logging thread's side of the queue too, so keep a value captured earlier
+        if not hasattr(record, "request_id"):
+            record.request_id = _REQUEST_ID.get()
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the queue is full the record is dropped and counted."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            type(self).dropped += 1
+
+    def prepare(self, record):
+        # Keep the record's own attributes (extras, exc_info text) for the JSON formatter
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        extras = {k: v for k, v in vars(record).items() if k not in _RESERVED}
+        line = f"{self.formatTime(record)} {record.levelname:<7} [{getattr(record, 'request_id', None) or '-'}] {record.name}: {record.getMessage()}"
+        if extras:
+            line += " " + json.dumps(extras, default=str)
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+_LISTENER = None
+
+
+def setup_logging(stream=None):
+    """Installs the queue handler on the "salonbrain" logger (once) and starts the writer thread."""
+    global _LISTENER
+    if _LISTENER is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(_RequestIdFilter())
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(handler)
+    root.propagate = False
+
+    _LISTENER = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _LISTENER.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the "salonbrain" hierarchy, e.g. get_logger("nl_sql")."""
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
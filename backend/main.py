@@ -1,11 +1,62 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hmac
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 
-from nl_sql import generate_sql
-from sql_runner import run_sql_query
+from database import get_pool, get_pool_stats
+from result_cache import result_cache
+from cost_guard import cost_guard
+from pagination import decode_cursor, CursorError
+from query_pipeline import run_query_pipeline, run_cancellable, stream_query_pipeline, run_batch, QUERY_BATCH_MAX
+from serialization import dumps_bytes
+from sql_cache import sql_cache
+from nl_sql import normalize_question, explain_schema_relevance
+from sql_templates import template_stats
+from result_summarizer import summarizer_stats
+from model_router import router_stats
+from sql_repair import repair_stats
+from single_flight import query_flights
+from warmup import readiness, run_warmup
+from schema_registry import schema_registry, run_schema_refresh
+from rollups import insight_rollups, run_rollup_refresh
+from profiling import RequestThreadExecutor, SamplingProfiler, profile_store, slow_requests
+from metrics import observe_request, observe_stage, record_status, render as render_metrics, server_timing, track_timings
+from logging_config import get_logger, new_request_id, set_request_id, shutdown_logging
+from sql_parser import sql_shape
+
+log = get_logger("api")
+
+# Admin endpoints require this token in the X-Admin-Token header; without it they are disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # asyncio.to_thread work goes through this, so ?profile=1 samples only its own request's workers
+    asyncio.get_running_loop().set_default_executor(RequestThreadExecutor())
+    sql_cache.load()
+    # Pool, schema and model warm up in the background; /ready stays 503 until they are done
+    warmup_task = asyncio.create_task(run_warmup())
+    # Picks up migrations without a restart; downstream caches are invalidated on a version change
+    schema_task = asyncio.create_task(run_schema_refresh())
+    # Keeps the /insights rollup tables current; /insights reads raw tables until they are built
+    rollup_task = asyncio.create_task(run_rollup_refresh())
+    yield
+    warmup_task.cancel()
+    schema_task.cancel()
+    rollup_task.cancel()
+    sql_cache.close()
+    get_pool().close_all()
+    shutdown_logging()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 # Reload trigger
 
 app.add_middleware(
@@ -22,116 +73,356 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    # Every log line written while handling the request (pipeline, threads, LLM and DB calls) carries this id
+    request_id = request.headers.get("X-Request-ID") or new_request_id()
+    set_request_id(request_id)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    # Fail closed: with no token configured the admin endpoints do not exist
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
 class Query(BaseModel):
     question: str
+    page_size: Optional[int] = None
+    cursor: Optional[str] = None
+    # Identifies the browser tab; a newer question from the same client cancels the older one
+    client_id: Optional[str] = None
+    # "columnar" returns data as {"columns", "types", "rows"} instead of a list of row objects
+    format: Literal["rows", "columnar"] = "rows"
+
+class BatchQuery(BaseModel):
+    questions: List[str]
+    page_size: Optional[int] = None
+    format: Literal["rows", "columnar"] = "rows"
 
 @app.get("/")
 def root():
     return {"status": "Backend running"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe for the load balancer: 200 once the DB pool, schema cache and model are warm."""
+    state = readiness.snapshot()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+async def _timed_pipeline(question: str, page_size, page_state, response_format: str):
+    # Runs as the flight's own task, so stage_timer() calls deeper down (schema) add to these timings
+    timings = {}
+    track_timings(timings)
+    result = await run_query_pipeline(question, page_size, page_state, response_format, timings=timings)
+    return result, timings
+
+async def _not_coalesced(coro):
+    return await coro, False
+
+def _timed_response(endpoint: str, body, timings: dict, started: float, columnar: bool = False):
+    """
+    Encodes the body (timed as the serialization stage) and adds a Server-Timing
+    header. Returns (response, timings including serialization and total).
+    """
+    encode_started = time.perf_counter()
+    if columnar:
+        # Encode directly; Decimal/datetime are handled by the encoder instead of jsonable_encoder
+        response = Response(content=dumps_bytes(body), media_type="application/json")
+    else:
+        response = JSONResponse(jsonable_encoder(body))
+    serialization_ms = (time.perf_counter() - encode_started) * 1000
+    observe_stage("serialization", serialization_ms)
+    total_ms = (time.perf_counter() - started) * 1000
+    observe_request(endpoint, total_ms)
+    timings = {**timings, "serialization": serialization_ms, "total": total_ms}
+    response.headers["Server-Timing"] = server_timing(timings)
+    return response, timings
+
 @app.post("/query")
-def query_data(q: Query):
+async def query_data(q: Query, request: Request, profile: bool = False,
+                     x_profile: Optional[str] = Header(default=None),
+                     x_admin_token: Optional[str] = Header(default=None)):
     """
-    Workflow:
-    1. User Question → LLaMA (with schema only) → SQL
-    2. SQL Validator (SELECT only)
-    3. Database → Returns Aggregated Result
-    4. Visualization Engine → Charts
-    5. LLaMA (Optional) → Insight Summary from aggregated data
+    Runs the question through query_pipeline.run_query_pipeline.
+
+    Results are paged: `page.next_cursor` fetches the next page of the same SQL
+    without going back to the LLM. The pipeline is cancelled (Ollama generation
+    aborted, MySQL statement killed) when the client disconnects or when the same
+    `client_id` sends a newer question. Identical questions already in flight are
+    coalesced: the request waits for the running pipeline instead of starting one.
+    Stage durations are returned in a Server-Timing header.
+
+    `?profile=1` or `X-Profile: 1` (admin only) runs the question on its own under
+    the sampling profiler and adds the hottest functions to the response; the
+    folded stacks stay available at /admin/profiles/{id}. Requests slower than
+    SLOW_REQUEST_MS are kept for /admin/slow-requests.
     """
+    started = time.perf_counter()
+    profiling = profile or x_profile == "1"
+    if profiling:
+        require_admin(x_admin_token)
+    page_state = None
+    if q.cursor:
+        try:
+            page_state = decode_cursor(q.cursor)
+        except CursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Terminals asking the same question at the same time share one pipeline run
+    flight_key = (normalize_question(q.question), q.page_size, q.format, q.cursor)
+    if profiling:
+        # A profile of somebody else's coalesced run would show nothing
+        work = _not_coalesced(_timed_pipeline(q.question, q.page_size, page_state, q.format))
+    else:
+        work = query_flights.do(flight_key, lambda: _timed_pipeline(q.question, q.page_size, page_state, q.format))
+    profiler = SamplingProfiler().start() if profiling else None
     try:
-        from nl_sql import validate_sql_safety, generate_conversational_response
-        from sql_runner import run_sql_query
-        from analysis_service import generate_analysis
-        import json
-        
-        # Step 1: Generate SQL using LLaMA with schema only
-        sql_response = generate_sql(q.question)
-        
-        # Step 2: Validate SQL safety
-        if validate_sql_safety(sql_response):
-            try:
-                # Step 3: Execute SQL and get aggregated results
-                data = run_sql_query(sql_response)
-                
-                # Step 4 & 5: Generate insights from aggregated data
-                insights_text = generate_analysis(q.question, data)
-                
-                return {
-                    "question": q.question,
-                    "sql": sql_response,
-                    "data": data,
-                    "answer": insights_text,
-                    "status": "success"
-                }
-            except Exception as db_error:
-                print(f"[ERROR] Database execution error: {db_error}")
-                # If SQL execution fails, provide conversational response
-                conversational_response = generate_conversational_response(
-                    q.question, 
-                    f"Query execution failed: {str(db_error)}"
-                )
-                return {
-                    "question": q.question,
-                    "sql": sql_response,
-                    "data": [],
-                    "answer": conversational_response,
-                    "error": str(db_error),
-                    "status": "sql_error"
-                }
-        else:
-            # Step 1 (fallback): SQL generation failed or returned empty string
-            # Just get a friendly natural language response based on the question
-            conversational_response = generate_conversational_response(q.question)
-            
-            return {
-                "question": q.question,
-                "sql": None,
-                "data": [],
-                "answer": conversational_response,
-                "status": "conversational"
-            }
-            
-    except Exception as e:
-        print(f"[ERROR] Unexpected Error: {e}")
-        import traceback
-        traceback.print_exc()
-        
-        # Always provide a response, even on error
+        flight = await run_cancellable(work, is_disconnected=request.is_disconnected, client_id=q.client_id)
+    finally:
+        profile_result = profiler.stop() if profiler else None
+    if flight is None:
+        record_status("cancelled")
+        return {
+            "question": q.question,
+            "sql": None,
+            "data": [],
+            "answer": "This question was cancelled because a newer one replaced it.",
+            "status": "cancelled"
+        }
+    (result, timings), shared = flight
+    if shared:
+        result = {**result, "question": q.question, "coalesced": True}
+    profile_summary = None
+    if profile_result is not None:
+        profile_summary = {"id": profile_store.put(profile_result, {"question": q.question}), **profile_result.summary()}
+        result = {**result, "profile": profile_summary}
+    response, timings = _timed_response("/query", result, timings, started, columnar=q.format == "columnar")
+    slow_requests.record("/query", timings, q.question, result.get("sql"), result.get("status"), profile_summary)
+    log.info("query completed", extra={
+        "endpoint": "/query", "status": result.get("status"), "sql": result.get("sql"),
+        "sql_shape": sql_shape(result["sql"]) if result.get("sql") else None,
+        "coalesced": shared, "timings": {stage: round(ms, 1) for stage, ms in timings.items()},
+    })
+    return response
+
+@app.post("/query/batch")
+async def query_batch(q: BatchQuery, request: Request):
+    """
+    Answers a list of questions in one request (see query_pipeline.run_batch).
+    Duplicate questions run once; results come back in request order with
+    per-question stage timings. Disconnecting cancels the whole batch.
+    """
+    if not q.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(q.questions) > QUERY_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX} questions per batch")
+
+    result = await run_cancellable(
+        run_batch(q.questions, q.page_size, q.format),
+        is_disconnected=request.is_disconnected
+    )
+    if result is None:
+        return {"results": [], "status": "cancelled"}
+    # Reports can be large; encode directly instead of through jsonable_encoder
+    return Response(content=dumps_bytes(result), media_type="application/json")
+
+@app.get("/query/events")
+async def query_events(question: str, page_size: Optional[int] = None,
+                       format: Literal["rows", "columnar"] = "rows"):
+    """
+    Server-Sent Events version of /query for EventSource clients. Emits `sql` once
+    it is generated, `data` as soon as MySQL returns, the summary as `token`
+    events while Ollama writes it, then `answer` (with status) and `done`.
+    Closing the EventSource cancels the pipeline.
+    """
+    async def events():
+        yield _sse_event("start", {"question": question})
+        async for event, payload in stream_query_pipeline(question, page_size, None, format, stream_answer=True):
+            if event == "answer":
+                record_status(payload.get("status"))
+            yield _sse_event(event, payload)
+        yield _sse_event("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse_event(event: str, payload) -> bytes:
+    return b"event: " + event.encode("ascii") + b"\ndata: " + dumps_bytes(payload) + b"\n\n"
+
+def _ndjson_line(obj) -> bytes:
+    return dumps_bytes(obj) + b"\n"
+
+@app.post("/query/stream")
+async def query_data_stream(q: Query):
+    """
+    NDJSON variant of /query on the same pipeline as /query/events: a `meta` line
+    with the SQL (another one, marked "repaired", if the repair loop rewrote it),
+    one `row` line per row of the page, `token` lines while the summary is written,
+    then an `end` trailer with the answer, status, page info and stage timings.
+    Row lines are written as the cursor is read, so the first row does not wait for
+    the page; the row and byte caps end the page early (`truncated` in the trailer).
+    Pass the trailer's page.next_cursor as `cursor` to stream the next page.
+    Disconnecting cancels the pipeline.
+    """
+    page_state = None
+    if q.cursor:
         try:
-            from nl_sql import generate_conversational_response
-            error_response = generate_conversational_response(
-                q.question, 
-                f"An error occurred while processing your question: {str(e)}"
-            )
-            return {
-                "question": q.question,
-                "sql": None,
-                "data": [],
-                "answer": error_response,
-                "error": str(e),
-                "status": "error"
-            }
-        except:
-            # Final fallback if even conversational generation fails
-            return {
-                "question": q.question,
-                "sql": None,
-                "data": [],
-                "answer": "I apologize, but I encountered an error processing your question. Please try rephrasing it.",
-                "error": str(e),
-                "status": "error"
-            }
+            page_state = decode_cursor(q.cursor)
+        except CursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        started = time.perf_counter()
+        timings = {}
+        track_timings(timings)
+        sql, meta_sent, row_count, page_info = None, False, 0, {}
+        async for event, payload in stream_query_pipeline(q.question, q.page_size, page_state, "rows",
+                                                          stream_answer=True, timings=timings, stream_rows=True):
+            if event == "sql":
+                sql, meta_sent = payload["sql"], True
+                yield _ndjson_line({"type": "meta", "question": q.question, **payload})
+            elif event == "row":
+                row_count += 1
+                yield _ndjson_line({"type": "row", "data": payload["row"]})
+            elif event == "data":
+                page_info = {"truncated": payload["truncated"], "cached": payload["cached"], "page": payload["page"]}
+            elif event == "token":
+                yield _ndjson_line({"type": "token", **payload})
+            elif event == "answer":
+                if not meta_sent:
+                    yield _ndjson_line({"type": "meta", "question": q.question, "sql": None})
+                timings["total"] = (time.perf_counter() - started) * 1000
+                status = payload.get("status")
+                record_status(status)
+                observe_request("/query/stream", timings["total"])
+                slow_requests.record("/query/stream", timings, q.question, sql, status)
+                log.info("query completed", extra={
+                    "endpoint": "/query/stream", "status": status, "sql": sql,
+                    "sql_shape": sql_shape(sql) if sql else None,
+                    "timings": {stage: round(ms, 1) for stage, ms in timings.items()},
+                })
+                yield _ndjson_line({
+                    "type": "end", **payload, "row_count": row_count, **page_info,
+                    "timings": {stage: round(ms, 1) for stage, ms in timings.items()},
+                })
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.get("/metrics")
+def metrics():
+    """Stage histograms, outcome counters and LLM token stats in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/pool/stats")
+def pool_stats():
+    return get_pool_stats()
+
+@app.get("/cache/stats")
+def cache_stats():
+    return result_cache.stats()
+
+@app.post("/cache/clear", dependencies=[Depends(require_admin)])
+def cache_clear():
+    result_cache.clear()
+    return {"status": "cleared"}
+
+@app.get("/guard/stats")
+def guard_stats():
+    return cost_guard.stats()
+
+@app.get("/templates/stats")
+def templates_stats():
+    return template_stats()
+
+@app.get("/router/stats")
+def router_stats_endpoint():
+    return router_stats()
+
+@app.get("/schema/relevance")
+def schema_relevance(question: str):
+    """Which tables the schema index would send to the model for this question, with scores."""
+    return explain_schema_relevance(question)
+
+@app.get("/schema/stats")
+def schema_stats():
+    return schema_registry.stats()
+
+@app.post("/admin/schema/refresh", dependencies=[Depends(require_admin)])
+def schema_refresh():
+    """Reloads the schema now instead of waiting for the next background refresh."""
+    changed = schema_registry.refresh()
+    return {"changed": changed, **schema_registry.stats()}
+
+@app.get("/rollups/stats")
+def rollup_stats():
+    return insight_rollups.stats()
+
+@app.post("/admin/rollups/refresh", dependencies=[Depends(require_admin)])
+def rollup_refresh(rebuild: bool = False):
+    """Folds new billing rows into the insights rollups now; `?rebuild=1` recomputes them from scratch."""
+    ok = insight_rollups.refresh(rebuild=rebuild)
+    return {"ok": ok, **insight_rollups.stats()}
+
+@app.get("/coalescing/stats")
+def coalescing_stats():
+    return query_flights.stats()
+
+@app.get("/repair/stats")
+def repair_stats_endpoint():
+    return repair_stats()
+
+@app.get("/summarizer/stats")
+def summarizer_stats_endpoint():
+    return summarizer_stats()
+
+@app.get("/admin/sql-cache", dependencies=[Depends(require_admin)])
+def sql_cache_entries(limit: int = 100):
+    sql_cache.flush()
+    return {"stats": sql_cache.stats(), "entries": sql_cache.entries(limit)}
+
+@app.delete("/admin/sql-cache", dependencies=[Depends(require_admin)])
+def sql_cache_purge(question: Optional[str] = None):
+    """Purges the whole question→SQL cache, or just the entries for one question."""
+    removed = sql_cache.purge(normalize_question(question) if question else None)
+    return {"status": "purged", "removed": removed}
+
+@app.get("/admin/slow-requests", dependencies=[Depends(require_admin)])
+def slow_request_log(limit: int = 20):
+    """Recent requests slower than SLOW_REQUEST_MS, slowest first, with SQL and stage timings."""
+    return {"threshold_ms": slow_requests.threshold_ms, "requests": slow_requests.slowest(limit)}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def profile_download(profile_id: str, format: Literal["summary", "folded"] = "summary"):
+    """A stored request profile; format=folded returns flamegraph.pl / speedscope input."""
+    entry = profile_store.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found (only the most recent ones are kept)")
+    result, meta, created_at = entry
+    if format == "folded":
+        return PlainTextResponse(result.folded())
+    return {"id": profile_id, "created_at": created_at, **meta, **result.summary(limit=50)}
 
 @app.get("/insights")
 def get_dashboard_insights():
-    print("[INFO] Received /insights request")
+    started = time.perf_counter()
+    timings = {}
+    track_timings(timings)
     try:
         from insights_service import get_insights
-        print("[INFO] Fetching insights data...")
         data = get_insights()
-        print("[OK] Insights data fetched successfully")
-        return data
+        response, timings = _timed_response("/insights", data, timings, started)
+        slow_requests.record("/insights", timings)
+        log.info("insights completed", extra={
+            "endpoint": "/insights", "timings": {stage: round(ms, 1) for stage, ms in timings.items()},
+        })
+        return response
     except Exception as e:
-        print(f"[ERROR] Error in /insights: {e}")
+        log.exception("Error in /insights: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
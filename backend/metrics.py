@@ -0,0 +1,199 @@
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+# Configuration
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Seconds; from a template hit (~ms) up to a cold 3B model (~30s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # label values -> [per-bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *labels) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return series[-1] if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = 'le="' + _number(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "salonbrain_stage_duration_seconds",
+    "Time spent in each pipeline stage (schema, sql_generation, validate, db, analysis, serialization, ...).",
+    ("stage",)
+)
+REQUEST_SECONDS = Histogram(
+    "salonbrain_request_duration_seconds", "End-to-end handler time per endpoint.", ("endpoint",)
+)
+QUERY_OUTCOMES = Counter(
+    "salonbrain_queries_total", "Answered questions by status (success, sql_error, conversational, error, cancelled).",
+    ("status",)
+)
+LLM_TOKENS = Counter(
+    "salonbrain_llm_tokens_total", "Tokens reported by Ollama, by model and kind (prompt or completion).",
+    ("model", "kind")
+)
+LLM_TOKEN_RATE = Histogram(
+    "salonbrain_llm_tokens_per_second", "Ollama generation speed per call (eval_count / eval_duration).",
+    ("model",), buckets=TOKEN_RATE_BUCKETS
+)
+SQL_TABLE_QUERIES = Counter(
+    "salonbrain_sql_table_queries_total", "Validated generated queries by table they read (sql_parser).", ("table",)
+)
+_ALL = (STAGE_SECONDS, REQUEST_SECONDS, QUERY_OUTCOMES, LLM_TOKENS, LLM_TOKEN_RATE, SQL_TABLE_QUERIES)
+
+# Stage timings of the request being handled; stage_timer() adds to it so that
+# code far from the handler (schema selection, insights queries) shows up in Server-Timing
+_REQUEST_TIMINGS = contextvars.ContextVar("request_timings", default=None)
+
+
+def track_timings(timings: dict):
+    """Makes stage_timer() in this context (and threads started from it) add to `timings`."""
+    return _REQUEST_TIMINGS.set(timings)
+
+
+def observe_stage(stage: str, ms: float):
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(ms / 1000, stage)
+
+
+@contextlib.contextmanager
+def stage_timer(stage: str):
+    """Times the block into the stage histogram and the current request's timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        observe_stage(stage, ms)
+        timings = _REQUEST_TIMINGS.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + ms
+
+
+def observe_request(endpoint: str, ms: float):
+    if METRICS_ENABLED:
+        REQUEST_SECONDS.observe(ms / 1000, endpoint)
+
+
+def record_status(status: str):
+    if METRICS_ENABLED and status:
+        QUERY_OUTCOMES.inc(status)
+
+
+def record_tables(tables):
+    if METRICS_ENABLED:
+        for table in tables:
+            SQL_TABLE_QUERIES.inc(table)
+
+
+def _field(response, name):
+    # ollama returns pydantic responses (subscriptable) in newer clients and dicts in older ones
+    try:
+        return response[name]
+    except (KeyError, TypeError, IndexError, AttributeError):
+        return getattr(response, name, None)
+
+
+def record_llm(model: str, response):
+    """Token counts and generation speed from a final (done) Ollama chat response."""
+    if not METRICS_ENABLED or response is None:
+        return
+    prompt_tokens = _field(response, "prompt_eval_count") or 0
+    completion_tokens = _field(response, "eval_count") or 0
+    eval_ns = _field(response, "eval_duration") or 0
+    if prompt_tokens:
+        LLM_TOKENS.inc(model, "prompt", amount=prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.inc(model, "completion", amount=completion_tokens)
+        if eval_ns:
+            LLM_TOKEN_RATE.observe(completion_tokens / (eval_ns / 1e9), model)
+
+
+def server_timing(timings: dict) -> str:
+    """Server-Timing header value: "sql_generation;dur=812.4, db;dur=12.9, ..." """
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _ALL:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,142 @@
+# Routes SQL generation between a fast small model and a slower, stronger one.
+# Questions are scored for complexity (implied joins, several entities, period
+# comparisons, ...); easy ones go to OLLAMA_MODEL, hard ones to OLLAMA_MODEL_LARGE.
+# nl_sql escalates a small-model answer to the large model when it cannot be used.
+import os
+import re
+import threading
+from collections import deque
+
+from logging_config import get_logger
+
+log = get_logger("model_router")
+
+# Configuration
+SMALL_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:1b")
+LARGE_MODEL = os.getenv("OLLAMA_MODEL_LARGE", "llama3.2:3b")
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "1") == "1" and LARGE_MODEL != SMALL_MODEL
+ROUTER_COMPLEXITY_THRESHOLD = int(os.getenv("ROUTER_COMPLEXITY_THRESHOLD", "3"))  # score at which the large model is used
+ROUTER_ESCALATION = os.getenv("ROUTER_ESCALATION", "1") == "1"
+
+# Words that point at distinct tables; each entity beyond the first implies a join
+_ENTITIES = {
+    "customer": r"\b(customers?|clients?|people|person|members?)\b",
+    "service": r"\b(services?|treatments?|haircuts?|facials?)\b",
+    "product": r"\b(products?|inventory|stock|items?)\b",
+    "staff": r"\b(staff|employees?|stylists?|therapists?|beauticians?)\b",
+    "appointment": r"\b(appointments?|bookings?|visits?)\b",
+    "payment": r"\b(payments?|payment mode|cash|card|upi)\b",
+    "expense": r"\b(expenses?|income|profit)\b",
+}
+_FEATURES = [
+    # (name, pattern, weight)
+    ("comparison", r"\b(compare|comparison|vs|versus|growth|grew|change|difference|between)\b", 2),
+    ("per_group", r"\b(per|each|every|by (?:each|every)|for each|breakdown|wise)\b", 1),
+    ("relational", r"\b(who|whose|along with|with their|together with|including)\b", 1),
+    ("ratio", r"\b(average|avg|percent(?:age)?|ratio|share|proportion|rate|median)\b", 1),
+    ("threshold", r"\b(more than|less than|at least|at most|above|below|greater|fewer)\b", 1),
+    ("negation", r"\b(never|not|without|no longer|haven'?t|didn'?t|hasn'?t|inactive)\b", 1),
+    ("ranking_within", r"\b(top|best|worst|highest|lowest)\b.*\b(per|each|in every|for every)\b", 2),
+]
+_PERIOD_PHRASES = r"\b((?:this|last|previous|current|next)\s+(?:week|month|quarter|year)|today|yesterday|(?:19|20)\d{2})\b"
+
+_LOCK = threading.Lock()
+_ROUTES = ("small", "large", "escalated")
+_STATS = {
+    "routed": {"small": 0, "large": 0},
+    "escalations": 0,
+    "calls": {route: {"count": 0, "failures": 0, "latency_total": 0.0, "latency_max": 0.0} for route in _ROUTES},
+}
+_LATENCIES = {route: deque(maxlen=500) for route in _ROUTES}
+
+
+def score_complexity(question: str):
+    """Returns (score, reasons) for a question; higher means harder for a 1B model."""
+    q = question.lower()
+    reasons = []
+    score = 0
+
+    entities = [name for name, pattern in _ENTITIES.items() if re.search(pattern, q)]
+    if len(entities) > 1:
+        score += len(entities) - 1
+        reasons.append(f"entities:{'+'.join(entities)}")
+
+    for name, pattern, weight in _FEATURES:
+        if re.search(pattern, q):
+            score += weight
+            reasons.append(name)
+
+    if len(set(re.findall(_PERIOD_PHRASES, q))) > 1:
+        score += 1
+        reasons.append("several_periods")
+
+    if len(q.split()) > 15:
+        score += 1
+        reasons.append("long")
+
+    return score, reasons
+
+
+def route_model(question: str):
+    """Returns (route, model) for a question: ("small", SMALL_MODEL) or ("large", LARGE_MODEL)."""
+    if not MODEL_ROUTING_ENABLED:
+        return "small", SMALL_MODEL
+    score, reasons = score_complexity(question)
+    route = "large" if score >= ROUTER_COMPLEXITY_THRESHOLD else "small"
+    with _LOCK:
+        _STATS["routed"][route] += 1
+    if route == "large":
+        log.info("Routing to %s (complexity %s: %s)", LARGE_MODEL, score, ', '.join(reasons))
+    return route, (LARGE_MODEL if route == "large" else SMALL_MODEL)
+
+
+def cache_model_key() -> str:
+    """Model component of the SQL cache key; routed answers may come from either model."""
+    return f"{SMALL_MODEL}|{LARGE_MODEL}" if MODEL_ROUTING_ENABLED else SMALL_MODEL
+
+
+def record_call(route: str, seconds: float, ok: bool):
+    """Records one SQL generation call; ok=False when its output could not be used."""
+    with _LOCK:
+        calls = _STATS["calls"][route]
+        calls["count"] += 1
+        calls["latency_total"] += seconds
+        calls["latency_max"] = max(calls["latency_max"], seconds)
+        if not ok:
+            calls["failures"] += 1
+        if route == "escalated":
+            _STATS["escalations"] += 1
+        _LATENCIES[route].append(seconds)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def router_stats() -> dict:
+    with _LOCK:
+        calls = {}
+        for route, c in _STATS["calls"].items():
+            latencies = list(_LATENCIES[route])
+            calls[route] = {
+                **c,
+                "latency_avg": c["latency_total"] / c["count"] if c["count"] else 0.0,
+                "latency_p50": _percentile(latencies, 50),
+                "latency_p95": _percentile(latencies, 95),
+                "failure_rate": c["failures"] / c["count"] if c["count"] else 0.0,
+            }
+        small = _STATS["routed"]["small"]
+        return {
+            "enabled": MODEL_ROUTING_ENABLED,
+            "small_model": SMALL_MODEL,
+            "large_model": LARGE_MODEL,
+            "threshold": ROUTER_COMPLEXITY_THRESHOLD,
+            "escalation": ROUTER_ESCALATION,
+            "routed": dict(_STATS["routed"]),
+            "escalations": _STATS["escalations"],
+            "escalation_rate": _STATS["escalations"] / small if small else 0.0,
+            "calls": calls,
+        }
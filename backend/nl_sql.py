@@ -1,7 +1,25 @@
+import asyncio
+import contextlib
+import json
 import os
+import re
+import time
 import ollama
 from database import get_db_connection
+from llm_client import get_async_client, OLLAMA_KEEP_ALIVE
+from sql_cache import sql_cache, SQL_CACHE_ENABLED
+from sql_templates import match_template
+from model_router import route_model, record_call, cache_model_key, LARGE_MODEL, MODEL_ROUTING_ENABLED, ROUTER_ESCALATION
+from cost_guard import cost_guard, QueryCostError
+from schema_index import get_schema_index, sample_values
+from schema_registry import schema_registry
+from metrics import stage_timer, record_llm
+from result_cache import result_cache, referenced_tables
+from sql_parser import parse_sql
 from dotenv import load_dotenv
+from logging_config import get_logger
+
+log = get_logger("nl_sql")
 
 load_dotenv()
 
@@ -10,126 +28,134 @@ load_dotenv()
 # Default to llama3.2:1b for maximum speed
 MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3.2:1b")
 
-_SCHEMA_CACHE = {} # table_name -> column_list_str
-_TABLE_LIST = []
+# Reply parsing (compiled once; every model reply goes through them)
+_SQL_START = re.compile(r'\b(SELECT|WITH)\b', re.IGNORECASE)
+_SQL_STATEMENT = re.compile(r'\b(SELECT|WITH)\b[\s\S]+?(?:;|$)', re.IGNORECASE)
+_SCHEMA_PREFIX = re.compile(r'salonpos\.', re.IGNORECASE)
+_JSON_SQL_KEY = re.compile(r'"sql"\s*:\s*')
+_JSON_DECODER = json.JSONDecoder()
 
 def load_schema_if_needed():
-    global _SCHEMA_CACHE, _TABLE_LIST
-    if _TABLE_LIST:
+    """Loads the schema on first use (schema_registry); later reloads happen in the background."""
+    return schema_registry.get()
+
+def get_table_columns(table_name: str) -> list:
+    """Real column names of a table (case-insensitive lookup), or [] if it doesn't exist."""
+    schema = schema_registry.get()
+    return schema.columns.get(table_name.lower(), []) if schema else []
+
+def schema_loaded() -> bool:
+    return schema_registry.get() is not None
+
+def get_schema_version() -> str:
+    """Short hash of the loaded schema; caches keyed on it go stale after a migration."""
+    schema = schema_registry.get()
+    return schema.version if schema else "unknown"
+
+@schema_registry.on_change
+def _invalidate_schema_caches(old_version, new_version):
+    # SQL cache entries and repairs are keyed on the version, so old ones can never
+    # hit again; drop them. Plans and results were computed against the old tables.
+    if old_version is None:
         return
-    
+    dropped = sql_cache.purge_versions(keep=new_version)
+    cost_guard.clear()
+    result_cache.clear()
+    log.info("Schema caches invalidated (%s cached questions dropped)", dropped)
+
+def _sample_schema_values(tables: dict) -> dict:
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SHOW TABLES")
-        tables = cursor.fetchall()
-        _TABLE_LIST = [t[0] for t in tables]
-        
-        for table_name in _TABLE_LIST:
-            cursor.execute(f"DESCRIBE {table_name}")
-            columns = cursor.fetchall()
-            # Format: table_name.column_name to avoid ambiguity in JOINs
-            col_names = [f'{table_name}.{col[0]}' for col in columns]
-            _SCHEMA_CACHE[table_name] = f"Table {table_name}: {', '.join(col_names)}"
-            
+        values = sample_values(cursor, tables)
         cursor.close()
+        return values
+    finally:
         conn.close()
-    except Exception as e:
-        print(f"Error loading schema: {e}")
+
+def _schema_index(schema):
+    # BM25 over table/column names, synonyms and sampled values (schema_index),
+    # built once per schema version
+    tables = schema.table_columns()
+    return get_schema_index(tables, schema.version, lambda: _sample_schema_values(tables))
 
 def get_relevant_schema(question: str) -> str:
-    load_schema_if_needed()
-    
-    question_lower = question.lower()
-    meta_map = {
-        "master_customer": ["customer", "client", "people", "person", "birthday", "anniversary", "membership", "balance", "visit"],
-        "billing_transactions": ["bill", "billing", "sale", "revenue", "income", "money", "spent", "transaction", "discount", "tax"],
-        "billing_trans_summary": ["service", "top service", "popular", "qty", "spending"],
-        "appointment_transactions": ["appointment", "booking", "slot", "pending", "confirmed", "cancelled", "completed", "balance_due", "payment mode", "peak hour", "busiest"],
-        "appointment_trans_summary": ["appointment", "booking", "service", "appointment date"],
-        "master_service": ["service", "treatment", "work"],
-        "master_employee": ["staff", "employee", "worker", "specialist"],
-        "master_inventory": ["inventory", "stock", "product", "item", "never sold", "low stock"],
-        "billing_trans_inventory": ["product", "item", "sold", "never sold"]
-    }
-    
-    selected_tables = []
-    for table, keywords in meta_map.items():
-        if any(kw in question_lower for kw in keywords):
-            if table in _TABLE_LIST:
-                selected_tables.append(table)
-    
-    # Always include billing tables for revenue/sales related queries
-    if any(kw in question_lower for kw in ["revenue", "sale", "income", "spending"]):
-        selected_tables.extend([t for t in ["billing_transactions", "billing_trans_summary"] if t in _TABLE_LIST])
-    
-    # Remove duplicates and limit to a reasonable set
-    selected_tables = list(dict.fromkeys([t for t in selected_tables if t in _TABLE_LIST]))[:6]
-    
-    # Default fallback - use first few tables from actual database
-    if not selected_tables:
-        selected_tables = _TABLE_LIST[:3] if _TABLE_LIST else []
-    
-    # Filter to only tables that exist in cache
-    selected_tables = [t for t in selected_tables if t in _SCHEMA_CACHE]
-    
-    if not selected_tables:
+    schema = schema_registry.get()
+    if schema is None:
         return "No tables available"
-            
-    schema_subset = "\n".join([_SCHEMA_CACHE[t] for t in selected_tables])
+    
+    with stage_timer("schema"):
+        index = _schema_index(schema)
+        selected_tables = index.select_tables(question)
+        
+        # Default fallback - use first few tables from actual database
+        if not selected_tables:
+            selected_tables = schema.tables[:3]
+        
+        # Format: table_name.column_name to avoid ambiguity in JOINs; wide tables keep only relevant columns
+        schema_subset = "\n".join(
+            f"Table {t}: {', '.join(f'{t}.{c}' for c in index.select_columns(t, question))}"
+            for t in selected_tables
+        )
     return schema_subset
 
+def explain_schema_relevance(question: str) -> dict:
+    """BM25 scores and selected tables for a question, for tuning the schema index."""
+    question = preprocess_question(question)
+    schema = schema_registry.get()
+    if schema is None:
+        return {"question": question, "schema_version": None, "scores": {}, "selected": []}
+    index = _schema_index(schema)
+    scores = index.score(question)
+    return {
+        "question": question,
+        "schema_version": schema.version,
+        "scores": dict(sorted(scores.items(), key=lambda kv: kv[1], reverse=True)),
+        "selected": index.select_tables(question),
+    }
+
 def validate_sql_safety(sql: str) -> bool:
     """
-    Ensures the SQL query is read-only and clean.
+    Ensures the SQL query is a single read-only SELECT (sql_parser): keywords inside
+    string literals and names don't count, INTO OUTFILE, SLEEP() and the like do.
     """
     if not sql:
         return False
-        
-    sql_upper = sql.upper().strip()
-    
-    # Check if it starts with valid keywords and NOT markdown
-    if not sql_upper.startswith("SELECT") and not sql_upper.startswith("WITH"):
-        return False
-
-    # Forbidden keywords for safety
-    forbidden = ["INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "TRUNCATE", "CREATE", "REPLACE", "GRANT", "REVOKE", "EXEC", "CALL"]
-    for word in forbidden:
-        import re
-        if re.search(r'\b' + word + r'\b', sql_upper):
-            return False
-            
-    return True
+    return parse_sql(sql).is_read_only
 
 def is_sql_query(text: str) -> bool:
     """Check if the text contains a SELECT or WITH query."""
-    import re
-    # Look for SELECT or WITH (ignoring case) followed by whitespace
-    return bool(re.search(r'\b(SELECT|WITH)\b', text, re.I))
+    return bool(_SQL_START.search(text))
+
+def _json_sql_value(text: str):
+    """
+    The "sql" string of a {"sql": ...} reply, decoded in one pass. The closing brace
+    is usually missing (it is the stop sequence), so the whole reply never parses as JSON.
+    """
+    match = _JSON_SQL_KEY.search(text)
+    if not match:
+        return None
+    try:
+        value, _ = _JSON_DECODER.raw_decode(text, match.end())
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, str) else None
 
 def extract_sql(text: str) -> str:
     """Extract clean SQL from response text, stripping markdown and filler."""
-    import re
-    import json
-    
     # 1. Clean JSON if it exists
-    try:
-        if "{" in text and "}" in text:
-            start = text.find("{")
-            end = text.rfind("}") + 1
-            data = json.loads(text[start:end])
-            if isinstance(data, dict) and "sql" in data:
-                text = data["sql"]
-    except:
-        pass
+    if "{" in text:
+        value = _json_sql_value(text)
+        if value is not None:
+            text = value
 
     # 2. Cleanup common hallucinations
-    text = re.sub(r'salonpos\.', '', text, flags=re.IGNORECASE)
+    text = _SCHEMA_PREFIX.sub('', text)
     text = text.replace('```sql', '').replace('```SQL', '').replace('```', '')
     
     # 3. Find the ACTUAL query (SELECT/WITH until end of line or semicolon)
     # This is more robust against trailing conversational rambling
-    matches = re.finditer(r'\b(SELECT|WITH)\b[\s\S]+?(?:;|$)', text, re.IGNORECASE)
+    matches = _SQL_STATEMENT.finditer(text)
     queries = [m.group(0).strip() for m in matches]
     
     if queries:
@@ -168,16 +194,45 @@ def preprocess_question(question: str) -> str:
     fixed_words = [corrections.get(w.lower(), w) for w in words]
     return " ".join(fixed_words)
 
-def generate_sql(question: str) -> str:
-    # 1. Preprocess the question to fix typos
+def normalize_question(question: str) -> str:
+    """Typo-fixed, case-folded question with punctuation and extra whitespace removed."""
+    question = preprocess_question(question).casefold()
+    return " ".join(re.sub(r"[^\w\s%]", " ", question).split())
+
+def get_cached_sql(question: str):
+    """Validated SQL previously generated for this question, schema version and model."""
+    if not SQL_CACHE_ENABLED:
+        return None
+    return sql_cache.get(normalize_question(question), get_schema_version(), cache_model_key())
+
+def remember_sql(question: str, sql: str):
+    if SQL_CACHE_ENABLED and validate_sql_safety(sql):
+        sql_cache.put(normalize_question(question), get_schema_version(), cache_model_key(), sql)
+
+def forget_sql(question: str):
+    """Drops a cached answer, e.g. because its SQL failed against the database."""
+    if SQL_CACHE_ENABLED:
+        sql_cache.discard(normalize_question(question), get_schema_version(), cache_model_key())
+
+def _fast_path_sql(question: str):
+    """SQL from the intent templates (sql_templates), or None if the question needs the LLM."""
+    match = match_template(preprocess_question(question))
+    if match is None:
+        return None
+    # Templates are written against the schema at deploy time; after a migration that
+    # drops one of their tables the question goes to the LLM instead
+    schema = schema_registry.get()
+    if schema is not None and not all(schema.has_table(t) for t in referenced_tables(match.sql)):
+        log.warning("Template %s skipped: a table it uses is missing from the schema", match.name)
+        return None
+    log.info("Template hit: %s %s", match.name, match.slots)
+    return match.sql
+
+def sql_generation_request(question: str, model: str = MODEL_NAME) -> dict:
+    """Builds the Ollama chat request for SQL generation."""
+    # Preprocess the question to fix typos
     question = preprocess_question(question)
     
-    # 2. DETERMINISTIC RULES (Fast Path for complex common queries)
-    # Revenue Comparison: "Compare this month revenue with last month"
-    # Uses 'created_at' and robust UNION ALL structure
-    if "compare" in question.lower() and "revenue" in question.lower() and "month" in question.lower():
-        return "SELECT 'This Month' as period, COALESCE(SUM(grand_total), 0) as revenue FROM billing_transactions WHERE MONTH(created_at) = MONTH(CURDATE()) AND YEAR(created_at) = YEAR(CURDATE()) UNION ALL SELECT 'Last Month', COALESCE(SUM(grand_total), 0) FROM billing_transactions WHERE MONTH(created_at) = MONTH(DATE_SUB(CURDATE(), INTERVAL 1 MONTH)) AND YEAR(created_at) = YEAR(DATE_SUB(CURDATE(), INTERVAL 1 MONTH)) UNION ALL SELECT 'Last Year', COALESCE(SUM(grand_total), 0) FROM billing_transactions WHERE YEAR(created_at) = YEAR(CURDATE()) - 1 UNION ALL SELECT 'Total', COALESCE(SUM(grand_total), 0) FROM billing_transactions"
-    
     schema = get_relevant_schema(question)
     
     system_prompt = f"""
@@ -191,7 +246,7 @@ def generate_sql(question: str) -> str:
     
     GOLDEN PATTERNS (STRICT):
     - CUSTOMER PROFILE: SELECT * FROM master_customer WHERE customer_name LIKE '%Customer Name%'
-    - CUSTOMER SPENDING: SELECT SUM(grand_total) as spending FROM billing_transactions WHERE customer_name LIKE '%Customer Name%'
+    - CUSTOMER SPENDING: SELECT SUM(grand_total) as spending FROM billing_transactions WHERE customerr_name LIKE '%Customer Name%'
     - CUSTOMER VISITS: SELECT visitcnt FROM master_customer WHERE customer_name LIKE '%Customer Name%'
     - LOW STOCK: SELECT product_name, volume, min_stock_level FROM master_inventory WHERE CAST(NULLIF(volume, '') AS DECIMAL(10,2)) < min_stock_level
     - NEVER SOLD: SELECT i.product_name FROM master_inventory i LEFT JOIN billing_trans_inventory ti ON i.product_id = ti.product_id WHERE ti.id IS NULL
@@ -212,75 +267,162 @@ def generate_sql(question: str) -> str:
     """
     user_prompt = f"Question: {question}\nRespond with the SQL JSON:"
     
-    try:
-        print(f"Attempting with Ollama Model: {MODEL_NAME}")
-        
-        response = ollama.chat(
-            model=MODEL_NAME, 
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt},
-            ],
-            options={
-                'num_predict': 400,  # Limit output to avoid rambling
-                'temperature': 0,    # Maximize precision for SQL
-                'stop': ["}"]        # Force JSON completion
-            }
-        )
-        
-        response_text = response['message']['content'].strip()
+    return {
+        "model": model,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "messages": [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': user_prompt},
+        ],
+        "options": {
+            'num_predict': 400,  # Limit output to avoid rambling
+            'temperature': 0,    # Maximize precision for SQL
+            'stop': ["}"]        # Force JSON completion
+        }
+    }
+
+def parse_sql_response(response_text: str) -> str:
+    """Pulls a safe SQL statement out of the model's reply, or returns "" if there is none."""
+    # 1. Try to handle case where model returns raw SQL wrapped in markdown instead of JSON
+    if "```" in response_text and is_sql_query(response_text):
+        potential_sql = extract_sql(response_text)
+        if validate_sql_safety(potential_sql):
+            return potential_sql
+
+    # 2. Try JSON path ({"sql": "..."}, with or without the closing brace)
+    sql = _json_sql_value(response_text)
+    if sql is not None:
+        sql = sql.strip()
+        # If SQL in JSON is wrapped in markdown, clean it
+        if "```" in sql:
+            sql = extract_sql(sql)
         
-        # 1. Try to handle case where model returns raw SQL wrapped in markdown instead of JSON
-        if "```" in response_text and is_sql_query(response_text):
-            potential_sql = extract_sql(response_text)
-            if validate_sql_safety(potential_sql):
-                return potential_sql
-
-        # 2. Try JSON path
-        import json
-        try:
-            # Flexible JSON extraction
-            json_str = response_text
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[-1].split("```")[0].strip()
-            elif "{" in response_text:
-                json_str = response_text[response_text.find("{"):response_text.rfind("}")+1]
-            
-            data = json.loads(json_str)
-            sql = data.get("sql", "").strip()
-            
-            # If SQL in JSON is wrapped in markdown, clean it
-            if "```" in sql:
-                sql = extract_sql(sql)
-            
-            if sql and validate_sql_safety(sql):
-                return sql
-            
-            # If the model rambled and stop sequence didn't catch it, try to clean
-            if "sql" in data and isinstance(data["sql"], str):
-                 return extract_sql(data["sql"])
-        except json.JSONDecodeError:
-            pass
-
-        # 3. Final Fallback: Is there any SQL in here at all?
-        if is_sql_query(response_text):
-            final_sql = extract_sql(response_text)
-            if validate_sql_safety(final_sql):
-                return final_sql
+        if sql and validate_sql_safety(sql):
+            return sql
         
-        return "" # Return empty string if no valid SQL found
+        # If the model rambled and stop sequence didn't catch it, try to clean
+        return extract_sql(sql)
+
+    # 3. Final Fallback: Is there any SQL in here at all?
+    if is_sql_query(response_text):
+        final_sql = extract_sql(response_text)
+        if validate_sql_safety(final_sql):
+            return final_sql
+    
+    return "" # Return empty string if no valid SQL found
+
+def sql_is_usable(sql: str) -> bool:
+    """
+    True when generated SQL passed extraction and validate_sql_safety and MySQL can
+    EXPLAIN it. A query that is merely over the cost budget still counts as usable.
+    """
+    if not sql or not validate_sql_safety(sql):
+        return False
+    try:
+        cost_guard.check(sql)
+    except QueryCostError:
+        return True
+    except Exception as e:
+        log.warning("EXPLAIN failed for generated SQL: %s", e)
+        return False
+    return True
+
+def _generate_with_model(question: str, model: str) -> str:
+    log.debug("Attempting with Ollama Model: %s", model)
+    response = ollama.chat(**sql_generation_request(question, model))
+    record_llm(model, response)
+    return parse_sql_response(response['message']['content'].strip())
 
+async def _agenerate_with_model(question: str, model: str, llm_limit=None) -> str:
+    log.debug("Attempting with Ollama Model: %s", model)
+    # Schema lookup may hit the database on first use
+    request = await asyncio.to_thread(sql_generation_request, question, model)
+    async with (llm_limit or contextlib.nullcontext()):
+        response = await get_async_client().chat(**request)
+    record_llm(model, response)
+    return parse_sql_response(response['message']['content'].strip())
+
+def _generate_sql_steps(question: str):
+    """
+    Deterministic templates first, then previously generated SQL, then the LLM:
+    easy questions go to the small model, hard ones to the large one (model_router),
+    and unusable small-model SQL is retried on the large model.
+
+    Shared by generate_sql and agenerate_sql as a plain generator: it yields the name
+    of each model it needs SQL from, receives that model's reply (or has the call's
+    exception thrown in) and returns the final SQL. Schema, cache and EXPLAIN work
+    happens between yields, so agenerate_sql resumes it on a worker thread.
+    """
+    template_sql = _fast_path_sql(question)
+    if template_sql:
+        return template_sql
+
+    cached_sql = get_cached_sql(question)
+    if cached_sql:
+        return cached_sql
+
+    route, model = route_model(question)
+    started = time.perf_counter()
+    try:
+        sql = yield model
     except Exception as e:
-        print(f"Error with Ollama: {e}")
+        record_call(route, time.perf_counter() - started, False)
+        log.error("Error with Ollama: %s", e)
         return f"Error generating SQL: {str(e)}"
+    elapsed = time.perf_counter() - started
+    usable = sql_is_usable(sql) if MODEL_ROUTING_ENABLED else bool(sql)
+    record_call(route, elapsed, usable)
 
-def generate_conversational_response(question: str, context: str = None) -> str:
+    # Retry on the large model when the small model's SQL can't be used
+    if not usable and route == "small" and MODEL_ROUTING_ENABLED and ROUTER_ESCALATION:
+        log.info("Escalating to %s", LARGE_MODEL)
+        started = time.perf_counter()
+        try:
+            escalated_sql = yield LARGE_MODEL
+            record_call("escalated", time.perf_counter() - started, bool(escalated_sql))
+            sql = escalated_sql or sql
+        except Exception as e:
+            record_call("escalated", time.perf_counter() - started, False)
+            log.error("Error with Ollama (%s): %s", LARGE_MODEL, e)
+
+    remember_sql(question, sql)
+    return sql
+
+def _advance(steps, reply=None, error: Exception = None):
+    """Resumes the flow: (model, None) while it needs a model call, (None, sql) once it is done."""
+    try:
+        return (steps.throw(error) if error is not None else steps.send(reply)), None
+    except StopIteration as done:
+        return None, done.value
+
+def generate_sql(question: str) -> str:
+    steps = _generate_sql_steps(question)
+    model, sql = _advance(steps)
+    while model is not None:
+        try:
+            reply, error = _generate_with_model(question, model), None
+        except Exception as e:
+            reply, error = None, e
+        model, sql = _advance(steps, reply, error)
+    return sql
+
+async def agenerate_sql(question: str, llm_limit: asyncio.Semaphore = None) -> str:
     """
-    Generates a conversational response when SQL generation fails or isn't needed.
-    This ensures the bot always answers questions, even non-SQL ones.
-    
-    Workflow: User Question → LLaMA (with schema context) → Natural Language Answer
+    Async generate_sql. Cancelling the awaiting task closes the HTTP request,
+    which makes Ollama abort the generation. `llm_limit` is held only around
+    Ollama calls, so template and cache hits never wait for a slot.
     """
+    steps = _generate_sql_steps(question)
+    model, sql = await asyncio.to_thread(_advance, steps)
+    while model is not None:
+        try:
+            reply, error = await _agenerate_with_model(question, model, llm_limit), None
+        except Exception as e:
+            reply, error = None, e
+        model, sql = await asyncio.to_thread(_advance, steps, reply, error)
+    return sql
+
+def _conversational_request(question: str, context: str = None) -> dict:
     schema = get_relevant_schema(question)
     
     system_prompt = f"""
@@ -304,24 +446,47 @@ def generate_conversational_response(question: str, context: str = None) -> str:
     if context:
         user_prompt += f"\n\nContext: {context}"
     
+    return {
+        "model": MODEL_NAME,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "messages": [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': user_prompt},
+        ],
+        "options": {
+            'num_predict': 80,  # Limit for 2 sentences
+            'temperature': 0,    # No creativity for conversational either
+            'stop': ["\n"]       # Force cut-off
+        }
+    }
+
+def _conversational_fallback(question: str) -> str:
+    return f"I understand you're asking: '{question}'. I'm here to help with salon analytics queries. Please try asking about specific metrics, trends, or data summaries that I can query from the database."
+
+def generate_conversational_response(question: str, context: str = None) -> str:
+    """
+    Generates a conversational response when SQL generation fails or isn't needed.
+    This ensures the bot always answers questions, even non-SQL ones.
+    
+    Workflow: User Question → LLaMA (with schema context) → Natural Language Answer
+    """
     try:
-        response = ollama.chat(
-            model=MODEL_NAME,
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt},
-            ],
-            options={
-                'num_predict': 80,  # Limit for 2 sentences
-                'temperature': 0,    # No creativity for conversational either
-                'stop': ["\n"]       # Force cut-off
-            }
-        )
-        
-        response_text = response['message']['content'].strip()
-        return response_text
-        
+        request = _conversational_request(question, context)
+        response = ollama.chat(**request)
+        record_llm(request["model"], response)
+        return response['message']['content'].strip()
     except Exception as e:
-        print(f"Error generating conversational response: {e}")
+        log.error("Error generating conversational response: %s", e)
         # Final fallback
-        return f"I understand you're asking: '{question}'. I'm here to help with salon analytics queries. Please try asking about specific metrics, trends, or data summaries that I can query from the database."
\ No newline at end of file
+        return _conversational_fallback(question)
+
+async def agenerate_conversational_response(question: str, context: str = None) -> str:
+    """Async generate_conversational_response."""
+    try:
+        request = await asyncio.to_thread(_conversational_request, question, context)
+        response = await get_async_client().chat(**request)
+        record_llm(request["model"], response)
+        return response['message']['content'].strip()
+    except Exception as e:
+        log.error("Error generating conversational response: %s", e)
+        return _conversational_fallback(question)
@@ -0,0 +1,228 @@
+import base64
+import datetime
+import decimal
+import functools
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+
+from cost_guard import top_level_words, has_top_level_limit, limit_sql_time
+from sql_runner import run_sql_query
+from sql_parser import parse_sql
+from schema_registry import schema_registry
+from logging_config import get_logger
+
+log = get_logger("pagination")
+
+# Configuration
+QUERY_PAGE_SIZE = int(os.getenv("QUERY_PAGE_SIZE", "500"))
+QUERY_PAGE_SIZE_MAX = int(os.getenv("QUERY_PAGE_SIZE_MAX", "5000"))
+# Cursors carry the generated SQL, so they are signed. Set PAGINATION_SECRET when running
+# several workers so a cursor issued by one worker is accepted by the others.
+_CURSOR_SECRET = (os.getenv("PAGINATION_SECRET") or secrets.token_hex(32)).encode("utf-8")
+
+_ORDER_ITEM = re.compile(
+    r"^(?:`?[A-Za-z0-9_$]+`?\s*\.\s*)?`?([A-Za-z0-9_$]+)`?(?:\s+(ASC|DESC))?$", re.IGNORECASE
+)
+
+
+class CursorError(ValueError):
+    """Raised for a malformed, tampered or incompatible continuation cursor."""
+
+
+def _split_top_level(text: str, sep: str = ","):
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"', "`"):
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts]
+
+
+def _is_unique_key(columns, sql: str, snapshot) -> bool:
+    """
+    True when `columns` identify a row of `sql`'s result: the query reads a single
+    table once (a join can repeat any key) and the columns include a UNIQUE column
+    or the whole primary key of that table, per COLUMN_KEY in the schema snapshot.
+    """
+    if snapshot is None:
+        return False
+    parsed = parse_sql(sql)
+    if parsed.table_refs != 1 or len(parsed.tables) != 1:
+        return False
+    details = snapshot.details.get(parsed.tables[0], [])
+    columns = {c.lower() for c in columns}
+    primary = {d["name"].lower() for d in details if d["key"] == "PRI"}
+    unique = {d["name"].lower() for d in details if d["key"] == "UNI"}
+    return bool(columns & unique) or bool(primary and primary <= columns)
+
+
+def ordering_key(sql: str, snapshot=None):
+    """
+    Returns [(column, direction), ...] when the outermost ORDER BY can drive keyset
+    pagination: plain columns, one direction, and a key the schema says is unique
+    (see _is_unique_key) so ties cannot hide rows. Otherwise None, and the caller
+    pages with LIMIT/OFFSET.
+    """
+    words = list(top_level_words(sql))
+    order_at = None
+    end_at = len(sql)
+    for i, (pos, word) in enumerate(words):
+        if word == "ORDER" and i + 1 < len(words) and words[i + 1][1] == "BY":
+            order_at = words[i + 1][0] + len("BY")
+            end_at = len(sql)
+        elif word == "LIMIT" and order_at is not None:
+            end_at = pos
+    if order_at is None:
+        return None
+
+    keys = []
+    for item in _split_top_level(sql[order_at:end_at].strip().rstrip(";")):
+        m = _ORDER_ITEM.match(item)
+        if not m:
+            return None
+        keys.append((m.group(1), (m.group(2) or "ASC").upper()))
+    if len({direction for _, direction in keys}) != 1 or not _is_unique_key([c for c, _ in keys], sql, snapshot):
+        return None
+    return keys
+
+
+def _cursor_value(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    if isinstance(value, (datetime.date, datetime.time, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _sign(payload: bytes) -> str:
+    return hmac.new(_CURSOR_SECRET, payload, hashlib.sha256).hexdigest()[:32]
+
+
+def encode_cursor(state: dict) -> str:
+    payload = base64.urlsafe_b64encode(
+        json.dumps(state, default=_cursor_value, separators=(",", ":")).encode("utf-8")
+    ).rstrip(b"=")
+    return f"{payload.decode('ascii')}.{_sign(payload)}"
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        payload, signature = cursor.rsplit(".", 1)
+        if not hmac.compare_digest(signature, _sign(payload.encode("ascii"))):
+            raise CursorError("Invalid or expired cursor")
+        state = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except CursorError:
+        raise
+    except Exception:
+        raise CursorError("Malformed cursor")
+    if not isinstance(state, dict) or "sql" not in state or state.get("mode") not in ("keyset", "offset"):
+        raise CursorError("Malformed cursor")
+    return state
+
+
+def clamp_page_size(page_size) -> int:
+    if not page_size:
+        return QUERY_PAGE_SIZE
+    return max(1, min(int(page_size), QUERY_PAGE_SIZE_MAX))
+
+
+def _keyset_query(sql: str, keys, after, limit: int):
+    columns = ", ".join(f"`{c}`" for c, _ in keys)
+    direction = keys[0][1]
+    where, params = "", None
+    if after is not None:
+        op = ">" if direction == "ASC" else "<"
+        placeholders = ", ".join(["%s"] * len(keys))
+        where = f" WHERE ({columns}) {op} ({placeholders})" if len(keys) > 1 else f" WHERE {columns} {op} %s"
+        params = tuple(after)
+        # With params the driver %-formats the whole statement: LIKE '%x%' must not read as a placeholder
+        sql = sql.replace("%", "%%")
+    order = ", ".join(f"`{c}` {d}" for c, d in keys)
+    return f"SELECT * FROM ({sql}) AS _page{where} ORDER BY {order} LIMIT {limit}", params
+
+
+def _offset_query(sql: str, offset: int, limit: int) -> str:
+    if has_top_level_limit(sql):
+        return f"SELECT * FROM ({sql}) AS _page LIMIT {limit} OFFSET {int(offset)}"
+    return f"{sql.strip().rstrip(';').strip()} LIMIT {limit} OFFSET {int(offset)}"
+
+
+def fetch_page(sql: str, checked_sql: str, page_size=None, state: dict = None, run=run_sql_query, schema=None,
+               on_row=None):
+    """
+    Runs one page of `checked_sql` (the cost-checked form of the generated `sql`).
+    Uses keyset pagination when an ordering key is available, LIMIT/OFFSET otherwise,
+    and returns (rows, page_info) where page_info carries the continuation cursor.
+    `schema` defaults to the registry's current snapshot. on_row(row) receives the
+    page's rows as they are fetched (not the extra look-ahead row).
+    """
+    page_size = clamp_page_size(state.get("size") if state else page_size)
+    forwarded = 0
+
+    def forward(row):
+        nonlocal forwarded
+        if forwarded < page_size:
+            forwarded += 1
+            on_row(row)
+
+    if on_row:
+        run = functools.partial(run, on_row=forward)
+    seen = state.get("seen", 0) if state else 0
+    keys = ordering_key(checked_sql, schema if schema is not None else schema_registry.get())
+    mode = state["mode"] if state else ("keyset" if keys else "offset")
+
+    rows = None
+    if mode == "keyset" and keys:
+        after = state.get("after") if state else None
+        page_sql, params = _keyset_query(checked_sql, keys, after, page_size + 1)
+        try:
+            rows = run(limit_sql_time(page_sql), params=params)
+        except Exception as e:
+            # Rows already forwarded cannot be taken back, so there is no retry then
+            if state or forwarded:
+                raise
+            # e.g. the ORDER BY column is not part of the select list
+            log.warning("Keyset pagination failed, using LIMIT/OFFSET: %s", e)
+    if rows is None:
+        mode = "offset"
+        rows = run(limit_sql_time(_offset_query(checked_sql, seen, page_size + 1)))
+
+    has_more = len(rows) > page_size
+    page = rows.derive(rows[:page_size])
+
+    next_cursor = None
+    if has_more:
+        next_state = {"sql": sql, "size": page_size, "mode": mode, "seen": seen + len(page)}
+        if mode == "keyset":
+            after = [page.value(page[-1], c) for c, _ in keys]
+            if any(v is None for v in after):
+                next_state["mode"] = "offset"  # NULL keys cannot be compared; continue by position
+            else:
+                next_state["after"] = after
+        next_cursor = encode_cursor(next_state)
+
+    return page, {
+        "size": page_size,
+        "mode": mode,
+        "offset": seen,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,218 @@
+# On-demand request profiling and the slow-request log.
+#
+# SamplingProfiler is a small stdlib sampler: a background thread reads the
+# stacks (sys._current_frames) of the profiled request's threads at a fixed
+# interval. Those are the event-loop thread that started it, plus worker threads
+# while they run a call submitted from the request (asyncio.to_thread goes through
+# RequestThreadExecutor, installed as the loop's default executor). Other requests'
+# worker threads are not sampled; their coroutine steps on the shared event loop
+# still are. Idle stacks (event loop waiting in select) are skipped, so samples
+# land where the request spends CPU or blocks on MySQL/Ollama I/O.
+#
+# Results come as a top-functions summary and as folded stacks ("a;b;c 12" lines)
+# that flamegraph.pl and speedscope read directly.
+import collections
+import contextvars
+import itertools
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Configuration
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "64"))
+PROFILE_STORE_SIZE = int(os.getenv("PROFILE_STORE_SIZE", "20"))      # full profiles kept for download
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "3000"))         # requests slower than this are logged
+SLOW_REQUEST_LOG_SIZE = int(os.getenv("SLOW_REQUEST_LOG_SIZE", "50"))
+
+# Leaf frames of threads that are waiting for work rather than doing any
+_IDLE_LEAVES = {
+    ("selectors.py", "select"), ("selectors.py", "poll"),
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("thread.py", "_worker"),
+}
+
+# Profiler of the request running in the current context (copied into worker threads)
+_active_profiler = contextvars.ContextVar("active_profiler", default=None)
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class ProfileResult:
+    def __init__(self, stacks: collections.Counter, samples: int, duration_ms: float, interval_ms: float):
+        self.stacks = stacks            # (root label, ..., leaf label) -> samples
+        self.samples = samples          # sampling rounds, busy or not
+        self.duration_ms = duration_ms
+        self.interval_ms = interval_ms
+
+    def top(self, limit: int = 15) -> list:
+        """Functions by inclusive samples, with self samples; estimated ms assume one busy thread."""
+        inclusive, own = collections.Counter(), collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                inclusive[label] += count
+        return [
+            {"function": label, "samples": count, "self": own[label],
+             "est_ms": round(count * self.interval_ms, 1)}
+            for label, count in inclusive.most_common(limit)
+        ]
+
+    def folded(self) -> str:
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit: int = 15) -> dict:
+        return {
+            "duration_ms": round(self.duration_ms, 1),
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "busy_samples": sum(self.stacks.values()),
+            "top": self.top(limit),
+        }
+
+
+class SamplingProfiler:
+    """with SamplingProfiler() as profiler: ...; then profiler.result."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, max_depth: int = PROFILE_MAX_DEPTH):
+        self.interval_ms = interval_ms
+        self.max_depth = max_depth
+        self.result = None
+        self._stacks = collections.Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self._context_token = None
+        self._threads = collections.Counter()     # thread id -> tracked calls running on it
+        self._threads_lock = threading.Lock()
+
+    def track(self, func, *args, **kwargs):
+        """Runs func(*args) on the current thread with that thread sampled meanwhile."""
+        thread_id = threading.get_ident()
+        with self._threads_lock:
+            self._threads[thread_id] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._threads_lock:
+                self._threads[thread_id] -= 1
+                if not self._threads[thread_id]:
+                    del self._threads[thread_id]
+
+    def _sample(self):
+        with self._threads_lock:
+            threads = set(self._threads)
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id not in threads:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            self._stacks[tuple(reversed(stack))] += 1
+
+    def _run(self):
+        interval = self.interval_ms / 1000
+        while not self._stop.wait(interval):
+            self._samples += 1
+            self._sample()
+
+    def start(self):
+        """Starts sampling the calling thread and the worker threads the calling context submits to."""
+        self._started = time.perf_counter()
+        self._threads[threading.get_ident()] += 1
+        self._context_token = _active_profiler.set(self)
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> ProfileResult:
+        self._stop.set()
+        self._thread.join()
+        _active_profiler.reset(self._context_token)
+        duration_ms = (time.perf_counter() - self._started) * 1000
+        self.result = ProfileResult(self._stacks, self._samples, duration_ms, self.interval_ms)
+        return self.result
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class RequestThreadExecutor(ThreadPoolExecutor):
+    """Default executor that lets a running SamplingProfiler follow its request into worker threads."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        profiler = _active_profiler.get()
+        if profiler is None:
+            return super().submit(fn, *args, **kwargs)
+        return super().submit(profiler.track, fn, *args, **kwargs)
+
+
+class ProfileStore:
+    """Most recent full profiles by id, so the folded stacks can be downloaded after the response."""
+
+    def __init__(self, size: int = PROFILE_STORE_SIZE):
+        self._profiles = collections.OrderedDict()
+        self._ids = itertools.count(1)
+        self._size = size
+        self._lock = threading.Lock()
+
+    def put(self, result: ProfileResult, meta: dict = None) -> str:
+        with self._lock:
+            profile_id = f"p{next(self._ids)}"
+            self._profiles[profile_id] = (result, meta or {}, time.time())
+            while len(self._profiles) > self._size:
+                self._profiles.popitem(last=False)
+            return profile_id
+
+    def get(self, profile_id: str):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+class SlowRequestLog:
+    """Ring buffer of recent requests slower than SLOW_REQUEST_MS; listed slowest first."""
+
+    def __init__(self, threshold_ms: float = SLOW_REQUEST_MS, size: int = SLOW_REQUEST_LOG_SIZE):
+        self.threshold_ms = threshold_ms
+        self._entries = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, timings: dict, question: str = None, sql: str = None,
+               status: str = None, profile: dict = None) -> bool:
+        total = timings.get("total", 0.0)
+        if total < self.threshold_ms:
+            return False
+        entry = {
+            "at": time.time(),
+            "endpoint": endpoint,
+            "question": question,
+            "sql": sql,
+            "status": status,
+            "total_ms": round(total, 1),
+            "timings": {stage: round(ms, 1) for stage, ms in timings.items()},
+            "profile": profile,
+        }
+        with self._lock:
+            self._entries.append(entry)
+        return True
+
+    def slowest(self, limit: int = None) -> list:
+        with self._lock:
+            entries = sorted(self._entries, key=lambda e: e["total_ms"], reverse=True)
+        return entries[:limit] if limit else entries
+
+
+profile_store = ProfileStore()
+slow_requests = SlowRequestLog()
@@ -0,0 +1,325 @@
+import asyncio
+import contextlib
+import functools
+import os
+import time
+
+from nl_sql import (
+    agenerate_sql, validate_sql_safety, agenerate_conversational_response, forget_sql,
+    load_schema_if_needed, normalize_question,
+)
+from analysis_service import agenerate_analysis, astream_analysis
+from sql_runner import run_sql_query, QueryTracker
+from cost_guard import check_sql_cost
+from pagination import fetch_page
+from serialization import to_columnar
+from sql_repair import is_repairable, arepair_and_run
+from database import POOL_MAX_SIZE
+from metrics import observe_stage, record_status, record_tables, track_timings
+from sql_parser import parse_sql
+from logging_config import get_logger
+
+log = get_logger("query_pipeline")
+
+# Batch configuration
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "100"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "2"))  # match OLLAMA_NUM_PARALLEL
+# At most half the pool by default, so a large batch leaves connections for live /query traffic
+BATCH_DB_CONCURRENCY = int(os.getenv("BATCH_DB_CONCURRENCY", str(max(1, POOL_MAX_SIZE // 2))))
+
+
+@contextlib.asynccontextmanager
+async def _stage(timings: dict, name: str, limit: asyncio.Semaphore = None):
+    """
+    Adds the stage's wall time (ms) to timings[name] and the stage histogram
+    (metrics), and logs it at DEBUG; waits for `limit` first if given.
+    """
+    waited = time.perf_counter()
+    async with (limit or contextlib.nullcontext()):
+        started = time.perf_counter()
+        if timings is not None and limit is not None:
+            timings["queued"] = timings.get("queued", 0.0) + (started - waited) * 1000
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            observe_stage(name, ms)
+            log.debug("stage %s done", name, extra={"stage": name, "ms": round(ms, 1)})
+            if timings is not None:
+                timings[name] = timings.get(name, 0.0) + ms
+
+
+def _execute_page(sql: str, page_size, page_state, tracker: QueryTracker, columnar: bool = False, on_row=None):
+    # Cost guard (EXPLAIN budget), then one page with the time limit attached
+    checked_sql = check_sql_cost(sql)
+    return fetch_page(sql, checked_sql, page_size, page_state,
+                      run=functools.partial(run_sql_query, tracker=tracker, columnar=columnar), on_row=on_row)
+
+
+async def _rows_until_done(task: asyncio.Future, rows: asyncio.Queue):
+    """Yields the rows the worker thread puts in `rows` while `task` runs, then any left over."""
+    try:
+        while True:
+            while not rows.empty():
+                yield rows.get_nowait()
+            if task.done():
+                return
+            getter = asyncio.ensure_future(rows.get())
+            await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+    finally:
+        task.cancel()
+
+
+async def stream_query_pipeline(question: str, page_size=None, page_state: dict = None,
+                                response_format: str = "rows", stream_answer: bool = False,
+                                timings: dict = None, llm_limit: asyncio.Semaphore = None,
+                                db_limit: asyncio.Semaphore = None, stream_rows: bool = False):
+    """
+    Workflow:
+    1. User Question → LLaMA (with schema only) → SQL
+    2. SQL Validator (SELECT only)
+    3. Database → Returns Aggregated Result
+       (MySQL errors such as an unknown column go through a bounded repair loop, sql_repair)
+    4. Visualization Engine → Charts
+    5. LLaMA (Optional) → Insight Summary from aggregated data
+
+    Yields (event, payload) as each stage finishes: "sql", then "data", then the
+    summary as "token" chunks (stream_answer=True) and finally "answer" with the status.
+    With stream_rows=True each row of the page is also yielded as a "row" event while
+    the cursor is still being read, before "data" (rows of a repaired query follow the
+    repaired "sql" event).
+
+    LLM calls are awaited on the async Ollama client and database work runs on a
+    worker thread, so cancelling the consumer aborts the pending generation and
+    KILLs the running MySQL statement.
+
+    response_format="columnar" returns data as {"columns", "types", "rows"} built
+    straight from the cursor tuples instead of one dict per row.
+
+    Stage durations in ms are added to `timings` when a dict is passed; `llm_limit`
+    and `db_limit` bound how many pipelines use Ollama / MySQL at once (batch runs).
+    """
+    tracker = QueryTracker()
+    try:
+        # Step 1: Generate SQL using LLaMA with schema only (continuation pages reuse the cursor's SQL)
+        if page_state:
+            sql_response = page_state["sql"]
+        else:
+            async with _stage(timings, "sql_generation"):
+                sql_response = await agenerate_sql(question, llm_limit)
+
+        # Step 2: Validate SQL safety
+        async with _stage(timings, "validate"):
+            safe = validate_sql_safety(sql_response)
+        if safe:
+            if not page_state:
+                record_tables(parse_sql(sql_response).tables)
+            yield "sql", {"sql": sql_response}
+            columnar = response_format == "columnar"
+            # Rows cross from the database thread to this task through the queue
+            streamed = asyncio.Queue() if stream_rows else None
+            loop = asyncio.get_running_loop()
+            on_row = (lambda row: loop.call_soon_threadsafe(streamed.put_nowait, row)) if stream_rows else None
+            rows_sent = 0
+
+            async def execute(sql):
+                async with _stage(timings, "db", db_limit):
+                    return await asyncio.to_thread(_execute_page, sql, page_size, page_state, tracker, columnar, on_row)
+
+            try:
+                # Step 3: Execute SQL and get aggregated results
+                try:
+                    if stream_rows:
+                        running = asyncio.ensure_future(execute(sql_response))
+                        async for row in _rows_until_done(running, streamed):
+                            rows_sent += 1
+                            yield "row", {"row": row}
+                        data, page = running.result()
+                    else:
+                        data, page = await execute(sql_response)
+                except Exception as db_error:
+                    if page_state or rows_sent or not is_repairable(db_error):
+                        raise
+                    log.warning("Database rejected generated SQL, attempting repair: %s", db_error)
+                    # Step 3b: Feed the MySQL error and real columns back to the model (bounded)
+                    async with _stage(timings, "repair"):
+                        sql_response, (data, page) = await arepair_and_run(
+                            question, sql_response, db_error, execute, llm_limit
+                        )
+                    yield "sql", {"sql": sql_response, "repaired": True}
+                    while stream_rows and not streamed.empty():
+                        yield "row", {"row": streamed.get_nowait()}
+            except Exception as db_error:
+                log.error("Database execution error: %s", db_error)
+                # Don't keep serving SQL that the database rejected
+                if not page_state:
+                    await asyncio.to_thread(forget_sql, question)
+                # If SQL execution fails, provide conversational response
+                async with _stage(timings, "conversational", llm_limit):
+                    conversational_response = await agenerate_conversational_response(
+                        question,
+                        f"Query execution failed: {str(db_error)}"
+                    )
+                yield "answer", {"answer": conversational_response, "error": str(db_error), "status": "sql_error"}
+                return
+
+            yield "data", {
+                "data": to_columnar(data) if columnar else data,
+                "truncated": data.truncated,
+                "cached": data.cached,
+                "page": page
+            }
+
+            # Step 4 & 5: Generate insights from aggregated data (first page only)
+            if page_state:
+                insights_text = None
+            elif stream_answer:
+                parts = []
+                async with _stage(timings, "analysis"):
+                    async for chunk in astream_analysis(question, data.to_dicts(), llm_limit):
+                        parts.append(chunk)
+                        yield "token", {"text": chunk}
+                insights_text = "".join(parts)
+            else:
+                async with _stage(timings, "analysis"):
+                    insights_text = await agenerate_analysis(question, data.to_dicts(), llm_limit)
+            yield "answer", {"answer": insights_text, "status": "success"}
+        else:
+            # Step 1 (fallback): SQL generation failed or returned empty string
+            # Just get a friendly natural language response based on the question
+            async with _stage(timings, "conversational", llm_limit):
+                conversational_response = await agenerate_conversational_response(question)
+            yield "answer", {"answer": conversational_response, "status": "conversational"}
+
+    except asyncio.CancelledError:
+        log.info("Query cancelled: %s", question)
+        # The DB thread keeps running after the await is cancelled; stop its statement
+        await asyncio.shield(asyncio.to_thread(tracker.kill_all))
+        raise
+
+    except Exception as e:
+        log.exception("Unexpected Error: %s", e)
+
+        # Always provide a response, even on error
+        try:
+            error_response = await agenerate_conversational_response(
+                question,
+                f"An error occurred while processing your question: {str(e)}"
+            )
+        except Exception:
+            # Final fallback if even conversational generation fails
+            error_response = "I apologize, but I encountered an error processing your question. Please try rephrasing it."
+        yield "answer", {"answer": error_response, "error": str(e), "status": "error"}
+
+
+async def run_query_pipeline(question: str, page_size=None, page_state: dict = None,
+                             response_format: str = "rows", **limits) -> dict:
+    """Runs stream_query_pipeline to completion and returns the /query response body."""
+    result = {"question": question, "sql": None, "data": []}
+    async for event, payload in stream_query_pipeline(question, page_size, page_state, response_format, **limits):
+        if event != "token":
+            result.update(payload)
+    record_status(result.get("status"))
+    return result
+
+
+async def run_batch(questions: list, page_size=None, response_format: str = "rows") -> dict:
+    """
+    Answers many questions at once (nightly reports). Questions that normalize to the
+    same text run once; the schema is loaded once up front; SQL generation and
+    summaries share BATCH_LLM_CONCURRENCY Ollama slots while database work runs in
+    parallel on up to BATCH_DB_CONCURRENCY pooled connections (half the pool by
+    default, so interactive requests are not starved). Every result carries its
+    own per-stage timings; the batch adds overall timings.
+    """
+    started = time.perf_counter()
+    await asyncio.to_thread(load_schema_if_needed)
+    schema_ms = (time.perf_counter() - started) * 1000
+
+    keys = [normalize_question(q) for q in questions]
+    first_index = {}
+    for i, key in enumerate(keys):
+        first_index.setdefault(key, i)
+
+    llm_limit = asyncio.Semaphore(max(1, BATCH_LLM_CONCURRENCY))
+    db_limit = asyncio.Semaphore(max(1, BATCH_DB_CONCURRENCY))
+
+    async def answer(question):
+        timings = {}
+        # Each answer runs as its own task, so stages timed deeper down (schema) land in this question's timings
+        track_timings(timings)
+        question_started = time.perf_counter()
+        result = await run_query_pipeline(question, page_size, None, response_format,
+                                          timings=timings, llm_limit=llm_limit, db_limit=db_limit)
+        timings["total"] = (time.perf_counter() - question_started) * 1000
+        result["timings"] = {stage: round(ms, 2) for stage, ms in timings.items()}
+        return result
+
+    unique = list(first_index.items())
+    answers = await asyncio.gather(*(answer(questions[i]) for _, i in unique))
+    by_key = {key: result for (key, _), result in zip(unique, answers)}
+
+    results = []
+    for i, (question, key) in enumerate(zip(questions, keys)):
+        if first_index[key] == i:
+            results.append(by_key[key])
+        else:
+            results.append({**by_key[key], "question": question, "duplicate_of": first_index[key]})
+
+    return {
+        "results": results,
+        "questions": len(questions),
+        "unique": len(unique),
+        "timings": {
+            "schema": round(schema_ms, 2),
+            "total": round((time.perf_counter() - started) * 1000, 2),
+        },
+    }
+
+
+# client_id -> task of that client's most recent question
+_ACTIVE_BY_CLIENT = {}
+
+
+async def run_cancellable(coro, is_disconnected=None, client_id: str = None, poll_interval: float = 0.25):
+    """
+    Runs a pipeline coroutine as a task that is cancelled when `is_disconnected()`
+    reports the client went away, or when the same client_id submits a newer question.
+    Returns the pipeline result, or None if the request was cancelled.
+    """
+    task = asyncio.ensure_future(coro)
+    if client_id:
+        previous = _ACTIVE_BY_CLIENT.get(client_id)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        _ACTIVE_BY_CLIENT[client_id] = task
+
+    async def _watch():
+        while not await is_disconnected():
+            await asyncio.sleep(poll_interval)
+
+    watcher = asyncio.ensure_future(_watch()) if is_disconnected else None
+    try:
+        waiting = {task, watcher} if watcher else {task}
+        done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+        if task not in done:
+            log.info("Client disconnected, cancelling query")
+            task.cancel()
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            return None
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        if watcher:
+            watcher.cancel()
+        if client_id and _ACTIVE_BY_CLIENT.get(client_id) is task:
+            del _ACTIVE_BY_CLIENT[client_id]
@@ -0,0 +1,233 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_db_connection
+from sql_parser import parse_sql
+from logging_config import get_logger
+
+log = get_logger("result_cache")
+
+# Configuration
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))                  # seconds
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# How long a table watermark is trusted before it is read again
+WATERMARK_CHECK_INTERVAL = float(os.getenv("RESULT_CACHE_WATERMARK_INTERVAL", "5"))
+
+# Columns that move when rows are inserted or edited, in order of preference
+_WATERMARK_COLUMNS = ("updated_at", "created_at")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical form of a query (sql_parser): whitespace, case, backquotes and table
+    aliases don't matter; string and number literals are kept verbatim.
+    """
+    return parse_sql(sql).canonical()
+
+
+def sql_fingerprint(sql: str, params=None, variant: str = "") -> str:
+    text = normalize_sql(sql)
+    if params:
+        text += "\x00" + repr(tuple(params))
+    if variant:
+        text += "\x00" + variant
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def referenced_tables(sql: str) -> list:
+    """Tables the query reads (subqueries included), schema prefixes and CTE names dropped."""
+    return list(parse_sql(sql).tables)
+
+
+def _estimate_rows_bytes(rows) -> int:
+    return sum(
+        sum(len(k) + len(str(v)) + 6 for k, v in row.items()) if isinstance(row, dict)
+        else sum(len(str(v)) + 2 for v in row)
+        for row in rows
+    )
+
+
+class TableWatermarks:
+    """
+    Cheap per-table change markers: COUNT(*) plus MAX() of an updated_at/created_at
+    column when the table has one. Values are re-read at most every WATERMARK_CHECK_INTERVAL.
+    """
+
+    def __init__(self, check_interval=WATERMARK_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._columns = {}     # table -> watermark column or None; missing key = unknown table
+        self._values = {}      # table -> (watermark, read_at)
+        self._lock = threading.Lock()
+
+    def _load_columns(self, cursor, tables):
+        unknown = [t for t in tables if t not in self._columns]
+        if not unknown:
+            return
+        placeholders = ", ".join(["%s"] * len(unknown))
+        cursor.execute(
+            "SELECT LOWER(TABLE_NAME), LOWER(COLUMN_NAME) FROM information_schema.COLUMNS "
+            f"WHERE TABLE_SCHEMA = DATABASE() AND LOWER(TABLE_NAME) IN ({placeholders})",
+            tuple(unknown)
+        )
+        found = {}
+        for table, column in cursor.fetchall():
+            found.setdefault(table, set()).add(column)
+        with self._lock:
+            for table, columns in found.items():
+                self._columns[table] = next((c for c in _WATERMARK_COLUMNS if c in columns), None)
+
+    def get(self, tables) -> dict:
+        """
+        Returns {table: watermark} for the given tables. Names that are not real
+        tables (CTE aliases, derived tables) are skipped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            fresh = {t: v for t, (v, read_at) in self._values.items()
+                     if t in tables and now - read_at < self.check_interval}
+        stale = [t for t in tables if t not in fresh]
+        if not stale:
+            return fresh
+
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            self._load_columns(cursor, stale)
+            stale = [t for t in stale if t in self._columns]
+            if stale:
+                selects = []
+                for table in stale:
+                    column = self._columns[table]
+                    max_expr = f"MAX(`{column}`)" if column else "NULL"
+                    selects.append(f"(SELECT CONCAT(COUNT(*), '@', COALESCE({max_expr}, '')) FROM `{table}`)")
+                cursor.execute("SELECT " + ", ".join(selects))
+                values = cursor.fetchone()
+                read_at = time.monotonic()
+                with self._lock:
+                    for table, value in zip(stale, values):
+                        self._values[table] = (value, read_at)
+                        fresh[table] = value
+            cursor.close()
+        finally:
+            conn.close()
+        return fresh
+
+    def clear(self):
+        with self._lock:
+            self._columns.clear()
+            self._values.clear()
+
+
+class ResultCache:
+    """
+    LRU cache of query results keyed by SQL fingerprint, bounded by entry count
+    and estimated bytes, expired by TTL and invalidated when any referenced
+    table's watermark moves.
+    """
+
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES,
+                 max_bytes=RESULT_CACHE_MAX_BYTES, watermarks=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.watermarks = watermarks or TableWatermarks()
+        self._entries = OrderedDict()  # fingerprint -> (rows, meta, watermarks, stored_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "invalidated": 0, "evictions": 0, "stores": 0}
+
+    def _drop(self, key):
+        *_, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, sql: str, params=None, variant: str = ""):
+        """Returns (rows, meta) or None."""
+        key = sql_fingerprint(sql, params, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            rows, meta, marks, stored_at, _ = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self._drop(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+
+        if marks:
+            try:
+                current = self.watermarks.get(list(marks))
+            except Exception as e:
+                log.warning("Watermark check failed, bypassing cache: %s", e)
+                current = None
+            if current != marks:
+                with self._lock:
+                    if key in self._entries:
+                        self._drop(key)
+                    self._stats["invalidated"] += 1
+                    self._stats["misses"] += 1
+                return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        return rows, meta
+
+    def snapshot(self, sql: str):
+        """
+        Reads watermarks for the query's tables before it runs, so a write that
+        lands during execution invalidates the entry instead of being masked by it.
+        """
+        try:
+            return self.watermarks.get(referenced_tables(sql))
+        except Exception as e:
+            log.warning("Could not read table watermarks: %s", e)
+            return None
+
+    def put(self, sql: str, rows, marks, params=None, variant: str = "", meta: dict = None):
+        # Without a table watermark nothing could ever invalidate the entry
+        if not marks:
+            return
+        size = _estimate_rows_bytes(rows)
+        if size > self.max_bytes:
+            return
+        key = sql_fingerprint(sql, params, variant)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (list(rows), meta or {}, marks, time.monotonic(), size)
+            self._bytes += size
+            self._stats["stores"] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        self.watermarks.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "enabled": RESULT_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache()
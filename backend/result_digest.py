@@ -0,0 +1,151 @@
+# Compact, token-budgeted text form of a query result for the analysis prompt.
+# Small results are sent as a table (header once, plain typed values); larger ones
+# as aggregates (count, sum, min/max, top-k, trend slope) plus as many sample rows
+# as the remaining budget allows. Shorter prompts mean faster prefill on CPU Ollama.
+import datetime
+import decimal
+import os
+
+from result_shape import is_time_column, numeric_columns
+
+# Configuration
+ANALYSIS_TOKEN_BUDGET = int(os.getenv("ANALYSIS_TOKEN_BUDGET", "300"))
+# Per-model overrides, e.g. "llama3.2:1b=300,llama3.2:3b=800"
+_MODEL_BUDGETS = {
+    name.strip(): int(budget)
+    for name, _, budget in (item.partition("=") for item in os.getenv("ANALYSIS_TOKEN_BUDGETS", "").split(","))
+    if name.strip() and budget.strip().isdigit()
+}
+DIGEST_TOP_K = int(os.getenv("DIGEST_TOP_K", "5"))
+_MAX_TEXT = 40            # longest string value shown
+_CHARS_PER_TOKEN = 4      # rough size of a llama token in English/ASCII text
+
+
+def token_budget_for(model: str) -> int:
+    return _MODEL_BUDGETS.get(model, ANALYSIS_TOKEN_BUDGET)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def format_value(value) -> str:
+    """Plain, compact rendering: no Decimal(...) / datetime(...) wrappers."""
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, (int, decimal.Decimal, float)):
+        number = float(value)
+        if number.is_integer() and abs(number) < 1e15:
+            return str(int(number))
+        return f"{number:.2f}".rstrip("0").rstrip(".")
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M") if (value.hour or value.minute) else value.strftime("%Y-%m-%d")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    text = value.decode("utf-8", errors="replace") if isinstance(value, (bytes, bytearray)) else str(value)
+    text = " ".join(text.split())
+    return text if len(text) <= _MAX_TEXT else text[: _MAX_TEXT - 1] + "…"
+
+
+def _table_lines(columns, rows):
+    yield "columns: " + " | ".join(columns)
+    for row in rows:
+        yield " | ".join(format_value(row.get(c)) for c in columns)
+
+
+def _slope(values):
+    """Least-squares change per step of a series."""
+    n = len(values)
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    spread = sum((x - mean_x) ** 2 for x in range(n))
+    return sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values)) / spread if spread else 0.0
+
+
+def _aggregate_lines(columns, rows):
+    numeric = numeric_columns(columns, rows)
+    labels = [c for c in columns if c not in numeric]
+    label = labels[0] if labels else None
+    yield f"rows: {len(rows)}; columns: " + " | ".join(columns)
+
+    for c in numeric:
+        pairs = [(float(row[c]), row) for row in rows if row.get(c) is not None]
+        if not pairs:
+            continue
+        values = [v for v, _ in pairs]
+        low_value, low_row = min(pairs, key=lambda p: p[0])
+        high_value, high_row = max(pairs, key=lambda p: p[0])
+        where = (lambda row: f" ({format_value(row.get(label))})") if label else (lambda row: "")
+        yield (
+            f"{c}: sum={format_value(sum(values))} avg={format_value(sum(values) / len(values))} "
+            f"min={format_value(low_value)}{where(low_row)} max={format_value(high_value)}{where(high_row)}"
+        )
+
+    time_cols = [c for c in columns if is_time_column(c, rows)]
+    metrics = [c for c in numeric if c not in time_cols]
+    if time_cols and metrics:
+        t = time_cols[0]
+        series = sorted((row[t], float(row[metrics[0]] or 0)) for row in rows if row.get(t) is not None)
+        if len(series) > 1:
+            yield (
+                f"trend of {metrics[0]} by {t}: {format_value(_slope([v for _, v in series]))} per step "
+                f"(first {format_value(series[0][0])}={format_value(series[0][1])}, "
+                f"last {format_value(series[-1][0])}={format_value(series[-1][1])})"
+            )
+
+    for c in labels:
+        if c in time_cols:
+            continue
+        if metrics:
+            totals = {}
+            for row in rows:
+                key = format_value(row.get(c))
+                totals[key] = totals.get(key, 0.0) + float(row.get(metrics[0]) or 0)
+            top = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:DIGEST_TOP_K]
+            shown = ", ".join(f"{k}={format_value(v)}" for k, v in top)
+            yield f"{c}: {len(totals)} distinct; top by {metrics[0]}: {shown}"
+        else:
+            counts = {}
+            for row in rows:
+                key = format_value(row.get(c))
+                counts[key] = counts.get(key, 0) + 1
+            top = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:DIGEST_TOP_K]
+            yield f"{c}: {len(counts)} distinct; most common: " + ", ".join(f"{k} ({n})" for k, n in top)
+
+
+def compact_result(data: list, token_budget: int = ANALYSIS_TOKEN_BUDGET) -> str:
+    """
+    Text digest of a result that fits in `token_budget` (estimated) tokens. Returns the
+    full table when it fits, otherwise aggregates followed by sample rows.
+    """
+    rows = [row for row in data if isinstance(row, dict)]
+    if not rows:
+        return "(no rows)"
+    columns = list(rows[0].keys())
+    char_budget = token_budget * _CHARS_PER_TOKEN
+
+    table = "\n".join(_table_lines(columns, rows))
+    if len(table) <= char_budget:
+        return table
+
+    lines = []
+    used = 0
+    for line in _aggregate_lines(columns, rows):
+        if used + len(line) + 1 > char_budget:
+            break
+        lines.append(line)
+        used += len(line) + 1
+
+    # Spend what is left on the first rows, without repeating the header
+    sample = []
+    for line in list(_table_lines(columns, rows))[1:]:
+        if used + len(line) + 1 > char_budget - 24:
+            break
+        sample.append(line)
+        used += len(line) + 1
+    if sample:
+        lines.append(f"first {len(sample)} rows:")
+        lines.extend(sample)
+    return "\n".join(lines)
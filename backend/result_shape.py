@@ -0,0 +1,48 @@
+# Column naming and classification shared by the result readers: result_summarizer
+# uses it to recognise result shapes, result_digest to pick the columns it aggregates
+# and the time axis it reports a trend on.
+import datetime
+import decimal
+import re
+
+DATE_LABEL = re.compile(r"^\d{4}(-\d{2}){0,2}$")
+TIME_COLUMNS = {"date", "day", "week", "month", "year", "quarter", "period_start"}
+_AGGREGATE = re.compile(r"^(\w+)\((.*)\)$")
+_AGGREGATE_NAMES = {"sum": "total", "count": "count", "avg": "average", "max": "maximum", "min": "minimum"}
+
+
+def humanize(column: str) -> str:
+    """'total_revenue' -> 'total revenue', 'SUM(grand_total)' -> 'total grand total'."""
+    m = _AGGREGATE.match(column.strip())
+    if m:
+        inner = humanize(m.group(2)) if m.group(2).strip() != "*" else ""
+        return f"{_AGGREGATE_NAMES.get(m.group(1).lower(), m.group(1).lower())} {inner}".strip()
+    column = column.split(".")[-1].strip("`")
+    return re.sub(r"_+", " ", column).strip().lower()
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool)
+
+
+def numeric_columns(columns, rows) -> list:
+    """Columns whose every non-NULL value is a number (NULL-only columns don't count)."""
+    numeric = []
+    for c in columns:
+        values = [row[c] for row in rows if row[c] is not None]
+        if values and all(is_number(v) for v in values):
+            numeric.append(c)
+    return numeric
+
+
+def is_time_column(column, rows) -> bool:
+    """Dates, 'YYYY[-MM[-DD]]' labels, or numbers under a name like 'month' / 'year'."""
+    values = [row[column] for row in rows if row[column] is not None]
+    if not values:
+        return False
+    if all(isinstance(v, (datetime.date, datetime.datetime)) for v in values):
+        return True
+    if all(isinstance(v, str) and DATE_LABEL.match(v) for v in values):
+        return True
+    name = column.split(".")[-1].strip("`").lower()
+    return (name in TIME_COLUMNS or humanize(column) in TIME_COLUMNS) and all(is_number(v) for v in values)
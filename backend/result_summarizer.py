@@ -0,0 +1,248 @@
+# Deterministic one-sentence summaries for the result shapes most questions produce.
+# analysis_service consults summarize_result() before calling Ollama; when the shape is
+# recognised (scalar, single row, ranked list, time series, period comparison) the
+# headline is computed here and the second LLM round trip is skipped.
+import os
+import re
+import threading
+
+from result_shape import humanize, is_number, is_time_column, numeric_columns
+from sql_templates import extract_period
+from logging_config import get_logger
+
+log = get_logger("result_summarizer")
+
+# Configuration
+SUMMARIZER_ENABLED = os.getenv("SUMMARIZER_ENABLED", "1") == "1"
+# "indian" groups digits as 4,52,000; "international" as 452,000
+SUMMARY_DIGIT_GROUPING = os.getenv("SUMMARY_DIGIT_GROUPING", "indian")
+SUMMARY_MAX_FIELDS = int(os.getenv("SUMMARY_MAX_FIELDS", "4"))  # single rows wider than this go to the LLM
+
+_PERIOD_LABELS = re.compile(
+    r"^(this|last|previous|current|next)\s+(day|week|month|quarter|year)$|^(today|yesterday|total|overall|all time)$",
+    re.IGNORECASE,
+)
+
+_STATS_LOCK = threading.Lock()
+_STATS = {"summarized": 0, "fallbacks": 0, "shapes": {}}
+
+
+# ---------------------------------------------------------------------------
+# Formatting
+# ---------------------------------------------------------------------------
+
+def _group_digits(digits: str) -> str:
+    if SUMMARY_DIGIT_GROUPING != "indian" or len(digits) <= 3:
+        return f"{int(digits):,}"
+    head, tail = digits[:-3], digits[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    if head:
+        groups.insert(0, head)
+    return ",".join(groups + [tail])
+
+
+def format_number(value) -> str:
+    value = float(value)
+    sign = "-" if value < 0 else ""
+    whole, _, fraction = f"{abs(value):.2f}".partition(".")
+    fraction = fraction.rstrip("0")
+    return f"{sign}{_group_digits(whole)}" + (f".{fraction}" if fraction else "")
+
+
+def format_change(current, previous) -> str:
+    """'up 12.5%' / 'down 3%' / 'unchanged' / '' when the base is zero."""
+    if not previous:
+        return ""
+    change = (current - previous) / abs(previous) * 100
+    if abs(change) < 0.05:
+        return "unchanged"
+    return f"{'up' if change > 0 else 'down'} {format_number(round(abs(change), 1))}%"
+
+
+def _entity(column: str) -> str:
+    """Plural noun for a label column: 'service_name' -> 'services'."""
+    noun = humanize(re.sub(r"_?(name|title|label)$", "", column, flags=re.IGNORECASE)) or "entries"
+    return noun if noun.endswith("s") else noun + "s"
+
+
+def _sentence(text: str) -> str:
+    return text[:1].upper() + text[1:] + ("" if text.endswith(".") else ".")
+
+
+# ---------------------------------------------------------------------------
+# Shape detection
+# ---------------------------------------------------------------------------
+
+def _monotonic(values):
+    """'desc' / 'asc' when the values are sorted, else None."""
+    if all(a >= b for a, b in zip(values, values[1:])):
+        return "desc"
+    if all(a <= b for a, b in zip(values, values[1:])):
+        return "asc"
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Summaries per shape
+# ---------------------------------------------------------------------------
+
+def _summarize_scalar(question, column, value):
+    label = humanize(column)
+    period = extract_period(question.lower())
+    scope = f" for {period[0].lower()}" if period else ""
+    if value is None:
+        return f"No {label} was recorded{scope}."
+    shown = format_number(value) if is_number(value) else str(value)
+    return _sentence(f"{label}{scope} is {shown}")
+
+
+def _summarize_single_row(row, columns, numeric):
+    if len(columns) > SUMMARY_MAX_FIELDS:
+        return None
+    labels = [c for c in columns if c not in numeric]
+    subject = str(row[labels[0]]) if labels and row[labels[0]] is not None else None
+    parts = []
+    for c in columns:
+        if subject is not None and c == labels[0]:
+            continue
+        value = row[c]
+        shown = "n/a" if value is None else (format_number(value) if c in numeric else str(value))
+        parts.append(f"{humanize(c)} is {shown}")
+    if not parts:
+        return None
+    body = ", ".join(parts[:-1]) + (" and " if len(parts) > 1 else "") + parts[-1]
+    return _sentence(f"For {subject}, {body}" if subject else body)
+
+
+def _summarize_periods(label_col, metric, rows):
+    metric_name = humanize(metric)
+    values = [(str(row[label_col]), float(row[metric] or 0)) for row in rows]
+    (first_label, first), (second_label, second) = values[0], values[1]
+    change = format_change(first, second)
+    text = f"{metric_name} for {first_label.lower()} is {format_number(first)}"
+    text += f", {change} from {second_label.lower()} ({format_number(second)})" if change else \
+        f" against {format_number(second)} for {second_label.lower()}"
+    rest = [f"{label.lower()} {format_number(v)}" for label, v in values[2:]]
+    if rest:
+        text += "; " + ", ".join(rest)
+    return _sentence(text)
+
+
+def _summarize_time_series(time_col, metric, rows):
+    metric_name = humanize(metric)
+    points = sorted(
+        ((row[time_col], float(row[metric] or 0)) for row in rows if row[time_col] is not None),
+        key=lambda p: p[0],
+    )
+    if len(points) < 2:
+        return None
+    labels = [str(t) for t, _ in points]
+    values = [v for _, v in points]
+    peak = max(range(len(values)), key=values.__getitem__)
+    low = min(range(len(values)), key=values.__getitem__)
+    text = (
+        f"{metric_name} across {len(values)} {humanize(time_col)}s totals {format_number(sum(values))}; "
+        f"the latest ({labels[-1]}) is {format_number(values[-1])}"
+    )
+    change = format_change(values[-1], values[-2])
+    if change:
+        text += f", {change} from {labels[-2]}"
+    text += f", with a peak of {format_number(values[peak])} in {labels[peak]}"
+    if low != peak:
+        text += f" and a low of {format_number(values[low])} in {labels[low]}"
+    return _sentence(text)
+
+
+def _summarize_ranked(label_col, metric, rows, order):
+    metric_name = humanize(metric)
+    entity = _entity(label_col)
+    values = [float(row[metric] or 0) for row in rows]
+    total = sum(values)
+    leader, leader_value = str(rows[0][label_col]), values[0]
+    if order == "desc":
+        text = f"{leader} leads {metric_name} with {format_number(leader_value)}"
+        if total > 0 and leader_value >= 0:
+            text += f" ({format_number(round(leader_value / total * 100, 1))}% of the {format_number(total)} total across {len(rows)} {entity})"
+    else:
+        text = f"{leader} has the lowest {metric_name} at {format_number(leader_value)} among {len(rows)} {entity}"
+    runners = [f"{row[label_col]} ({format_number(v)})" for row, v in zip(rows[1:3], values[1:3])]
+    if runners:
+        text += ", followed by " + " and ".join(runners)
+    return _sentence(text)
+
+
+def _summarize_list(label_col, rows):
+    names = [str(row[label_col]) for row in rows if row[label_col] is not None]
+    if not names:
+        return None
+    shown = ", ".join(names[:5])
+    more = f" and {len(names) - 5} more" if len(names) > 5 else ""
+    return _sentence(f"found {len(rows)} {_entity(label_col)}: {shown}{more}")
+
+
+def _classify(question: str, data: list):
+    """Returns (shape, summary) or (None, None) when the LLM should handle the result."""
+    rows = [row for row in data if isinstance(row, dict)]
+    if not rows or len(rows) != len(data):
+        return None, None
+    columns = list(rows[0].keys())
+    numeric = numeric_columns(columns, rows)
+    labels = [c for c in columns if c not in numeric]
+
+    if len(rows) == 1 and len(columns) == 1:
+        return "scalar", _summarize_scalar(question, columns[0], rows[0][columns[0]])
+    if len(rows) == 1:
+        return "single_row", _summarize_single_row(rows[0], columns, numeric)
+
+    if len(labels) == 1 and len(numeric) == 1:
+        label_col, metric = labels[0], numeric[0]
+        label_values = [row[label_col] for row in rows]
+        if humanize(label_col) == "period" or all(
+            isinstance(v, str) and _PERIOD_LABELS.match(v.strip()) for v in label_values
+        ):
+            return "period_comparison", _summarize_periods(label_col, metric, rows)
+    time_cols = [c for c in columns if is_time_column(c, rows)]
+    if len(time_cols) == 1 and len(numeric) - (time_cols[0] in numeric) == 1:
+        metric = next(c for c in numeric if c != time_cols[0])
+        return "time_series", _summarize_time_series(time_cols[0], metric, rows)
+
+    if len(labels) == 1 and numeric:
+        order = _monotonic([float(row[numeric[0]] or 0) for row in rows])
+        if order:
+            return "ranked_list", _summarize_ranked(labels[0], numeric[0], rows, order)
+    if len(columns) == 1 and labels:
+        return "list", _summarize_list(labels[0], rows)
+    return None, None
+
+
+def summarize_result(question: str, data: list):
+    """One-sentence summary of a query result, or None if it needs the LLM."""
+    if not SUMMARIZER_ENABLED or not data:
+        return None
+    try:
+        shape, summary = _classify(question, data)
+    except Exception as e:
+        log.warning("Result summarizer failed: %s", e)
+        shape, summary = None, None
+    with _STATS_LOCK:
+        if summary:
+            _STATS["summarized"] += 1
+            _STATS["shapes"][shape] = _STATS["shapes"].get(shape, 0) + 1
+        else:
+            _STATS["fallbacks"] += 1
+    return summary
+
+
+def summarizer_stats() -> dict:
+    with _STATS_LOCK:
+        total = _STATS["summarized"] + _STATS["fallbacks"]
+        return {
+            "enabled": SUMMARIZER_ENABLED,
+            "summarized": _STATS["summarized"],
+            "fallbacks": _STATS["fallbacks"],
+            "summarized_rate": _STATS["summarized"] / total if total else 0.0,
+            "shapes": dict(_STATS["shapes"]),
+        }
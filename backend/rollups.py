@@ -0,0 +1,356 @@
+# Incrementally maintained aggregate tables behind /insights.
+#
+# Each Rollup folds one billing table into a small rollup_* table (daily revenue,
+# per-customer spend and last visit, per-service and per-product sales). A
+# background job adds the rows inserted since the last run: rows are read by
+# primary key above the stored watermark, in batches, and merged additively with
+# INSERT ... ON DUPLICATE KEY UPDATE in the same transaction that moves the
+# watermark, so a crash never counts a row twice. When the source has an indexed
+# updated_at column, keys of rows edited since the last run are recomputed from
+# scratch as well. Deletes are only picked up by the periodic full rebuild.
+#
+# Coordination lives in rollup_watermarks: the watermark row is locked (SELECT ...
+# FOR UPDATE) while a rollup is updated, so several workers can run the job at once.
+# `complete` says the rollup has caught up since its last rebuild; /insights reads
+# the rollups only when all of them are complete and recomputes from raw rows otherwise.
+import asyncio
+import os
+import time
+
+from logging_config import get_logger
+
+log = get_logger("rollups")
+
+# Configuration
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "1") == "1"
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "60"))       # seconds between incremental runs (0 = off)
+ROLLUP_REBUILD_INTERVAL = float(os.getenv("ROLLUP_REBUILD_INTERVAL", "86400"))    # seconds between full rebuilds (0 = never)
+ROLLUP_BATCH_ROWS = int(os.getenv("ROLLUP_BATCH_ROWS", "50000"))                 # source rows folded in per transaction
+ROLLUP_SETTLE_SECONDS = int(os.getenv("ROLLUP_SETTLE_SECONDS", "5"))              # younger rows wait (their ids may still have gaps)
+ROLLUP_RECOMPUTE_CHUNK = 500                                                     # keys per recompute statement
+
+WATERMARKS_TABLE = "rollup_watermarks"
+_WATERMARKS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {WATERMARKS_TABLE} (
+        name VARCHAR(64) PRIMARY KEY,
+        last_id BIGINT NOT NULL DEFAULT 0,
+        last_changed_at DATETIME NULL,
+        complete TINYINT NOT NULL DEFAULT 0,
+        refreshed_at DATETIME NULL,
+        rebuilt_at DATETIME NULL
+    )
+"""
+
+
+class Column:
+    """
+    A rollup column and the aggregate that fills it. `merge` says how a delta is
+    folded into an existing row: "sum" adds, "max" keeps the larger, "set" overwrites.
+    A key column with ddl=None takes the type of the source column of the same name.
+    """
+
+    def __init__(self, name: str, ddl: str, expr: str, merge: str = "set"):
+        self.name = name
+        self.ddl = ddl
+        self.expr = expr
+        self.merge = merge
+
+    def delta_update(self, table: str) -> str:
+        # Qualified: the source table may have a column of the same name
+        current, new = f"{table}.{self.name}", f"VALUES({self.name})"
+        if self.merge == "sum":
+            return f"{current} = {current} + {new}"
+        if self.merge == "max":
+            return f"{current} = GREATEST(COALESCE({current}, {new}), COALESCE({new}, {current}))"
+        return f"{current} = {new}"
+
+
+class Rollup:
+    """One aggregate table: `key` groups rows of `source` (aliased s), `columns` aggregate them."""
+
+    def __init__(self, name: str, source: str, key: Column, columns: list, where: str = None,
+                 indexes=(), date_key: bool = False, changed_column: str = "updated_at"):
+        self.name = name
+        self.table = f"rollup_{name}"
+        self.source = source
+        self.key = key
+        self.columns = columns
+        self.where = where
+        self.indexes = indexes
+        self.date_key = date_key            # key is DATE(s.created_at): recompute by day ranges
+        self.changed_column = changed_column
+
+    def key_type(self, schema) -> str:
+        """The key column's type: declared, or copied from the source column in the schema snapshot."""
+        if self.key.ddl:
+            return self.key.ddl
+        details = schema.details.get(self.source.lower(), []) if schema is not None else []
+        for column in details:
+            if column["name"].lower() == self.key.name.lower():
+                return column["type"]
+        raise RuntimeError(f"type of {self.source}.{self.key.name} is unknown (schema not loaded?)")
+
+    def ddl(self, schema) -> str:
+        parts = [f"{self.key.name} {self.key_type(schema)} PRIMARY KEY"]
+        parts += [f"{c.name} {c.ddl}" for c in self.columns]
+        parts += [f"KEY idx_{self.name}_{column} ({column})" for column in self.indexes]
+        return f"CREATE TABLE IF NOT EXISTS {self.table} ({', '.join(parts)})"
+
+    def _upsert(self, condition: str, updates: str) -> str:
+        names = ", ".join([self.key.name] + [c.name for c in self.columns])
+        exprs = ", ".join([self.key.expr] + [c.expr for c in self.columns])
+        where = f"({condition}) AND ({self.where})" if self.where else condition
+        return (
+            f"INSERT INTO {self.table} ({names}) "
+            f"SELECT {exprs} FROM {self.source} s WHERE {where} GROUP BY {self.key.expr} "
+            f"ON DUPLICATE KEY UPDATE {updates}"
+        )
+
+    def delta_sql(self) -> str:
+        """Folds source rows with last_id < id <= hi into the rollup; params (last_id, hi)."""
+        return self._upsert("s.id > %s AND s.id <= %s", ", ".join(c.delta_update(self.table) for c in self.columns))
+
+    def recompute_sql(self, keys: list, last_id: int):
+        """
+        (sql, params) that recompute the given keys from their source rows up to
+        last_id; later rows are added by the delta that reaches them.
+        """
+        if self.date_key:
+            condition = " OR ".join(["(s.created_at >= %s AND s.created_at < %s + INTERVAL 1 DAY)"] * len(keys))
+            params = [value for key in keys for value in (key, key)]
+        else:
+            condition = f"{self.key.expr} IN ({', '.join(['%s'] * len(keys))})"
+            params = list(keys)
+        condition = f"({condition}) AND s.id <= %s"
+        params.append(last_id)
+        updates = ", ".join(f"{self.table}.{c.name} = VALUES({c.name})" for c in self.columns)
+        return self._upsert(condition, updates), params
+
+    def changed_keys_sql(self) -> str:
+        """Keys of already-folded rows edited since the last run; params (last_changed_at, last_id)."""
+        where = f" AND ({self.where})" if self.where else ""
+        return (
+            f"SELECT DISTINCT {self.key.expr} FROM {self.source} s "
+            f"WHERE s.{self.changed_column} >= %s AND s.id <= %s{where}"
+        )
+
+
+ROLLUPS = [
+    Rollup(
+        "daily_revenue", "billing_transactions",
+        key=Column("day", "DATE", "DATE(s.created_at)"),
+        columns=[
+            Column("revenue", "DECIMAL(18,3) NOT NULL DEFAULT 0", "COALESCE(SUM(s.grand_total), 0)", "sum"),
+            Column("transactions", "BIGINT NOT NULL DEFAULT 0", "COUNT(*)", "sum"),
+        ],
+        date_key=True,
+    ),
+    Rollup(
+        "customer_spend", "billing_transactions",
+        key=Column("customer_id", None, "s.customer_id"),
+        columns=[
+            Column("total_spent", "DECIMAL(18,3) NOT NULL DEFAULT 0", "COALESCE(SUM(s.grand_total), 0)", "sum"),
+            Column("visits", "BIGINT NOT NULL DEFAULT 0", "COUNT(*)", "sum"),
+            Column("last_visit", "DATETIME NULL", "MAX(s.created_at)", "max"),
+        ],
+        where="s.customer_id IS NOT NULL",
+        indexes=("total_spent", "last_visit"),
+    ),
+    Rollup(
+        "service_sales", "billing_trans_summary",
+        key=Column("service_id", None, "s.service_id"),
+        columns=[
+            Column("service_name", "VARCHAR(255) NULL", "MAX(s.service_name)"),
+            Column("qty", "BIGINT NOT NULL DEFAULT 0", "COALESCE(SUM(s.qty), 0)", "sum"),
+            Column("revenue", "DECIMAL(18,3) NOT NULL DEFAULT 0", "COALESCE(SUM(s.grand_total), 0)", "sum"),
+        ],
+        where="s.service_id IS NOT NULL",
+        indexes=("qty",),
+    ),
+    Rollup(
+        "product_sales", "billing_trans_inventory",
+        key=Column("product_id", None, "s.product_id"),
+        columns=[
+            Column("qty", "BIGINT NOT NULL DEFAULT 0", "COALESCE(SUM(s.qty), 0)", "sum"),
+            Column("revenue", "DECIMAL(18,3) NOT NULL DEFAULT 0", "COALESCE(SUM(s.grand_total), 0)", "sum"),
+            Column("last_sold", "DATETIME NULL", "MAX(s.created_at)", "max"),
+        ],
+        where="s.product_id IS NOT NULL",
+    ),
+]
+
+
+class InsightRollups:
+    """Creates, updates and reports on the ROLLUPS; refresh() is safe to run from several workers."""
+
+    def __init__(self, rollups=ROLLUPS):
+        self.rollups = rollups
+        self._tables_ready = False
+        self._stats = {"runs": 0, "rows_folded": 0, "keys_recomputed": 0, "rebuilds": 0,
+                       "failures": 0, "last_error": None, "last_run_ms": None}
+
+    @staticmethod
+    def _schema():
+        from schema_registry import schema_registry
+        return schema_registry.get()
+
+    def _ensure_tables(self, cursor):
+        if self._tables_ready:
+            return
+        schema = self._schema()
+        cursor.execute(_WATERMARKS_DDL)
+        for rollup in self.rollups:
+            key_type = rollup.key_type(schema)
+            cursor.execute(
+                "SELECT COLUMN_TYPE FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+                (rollup.table, rollup.key.name)
+            )
+            existing = cursor.fetchone()
+            if existing is not None and str(existing[0]).lower() != key_type.lower():
+                # The source key changed type (or an older build guessed it): rebuild from scratch
+                log.info("Rollup %s key type %s -> %s; rebuilding", rollup.name, existing[0], key_type)
+                cursor.execute(f"DROP TABLE {rollup.table}")
+                cursor.execute(
+                    f"UPDATE {WATERMARKS_TABLE} SET last_id = 0, last_changed_at = NULL, complete = 0, "
+                    f"rebuilt_at = NULL WHERE name = %s", (rollup.name,)
+                )
+            cursor.execute(rollup.ddl(schema))
+            cursor.execute(f"INSERT IGNORE INTO {WATERMARKS_TABLE} (name) VALUES (%s)", (rollup.name,))
+        self._tables_ready = True
+
+    def _tracks_changes(self, rollup) -> bool:
+        # Edited rows are only looked for when the change column is indexed; otherwise that scan
+        # would grow with the table, and the periodic rebuild catches edits instead
+        schema = self._schema()
+        return schema is not None and rollup.changed_column in schema.indexed_columns(rollup.source)
+
+    def _lock(self, conn, cursor, rollup):
+        conn.start_transaction()
+        cursor.execute(
+            f"SELECT last_id, last_changed_at, complete, rebuilt_at, "
+            f"rebuilt_at IS NULL OR rebuilt_at < NOW() - INTERVAL %s SECOND "
+            f"FROM {WATERMARKS_TABLE} WHERE name = %s FOR UPDATE",
+            (ROLLUP_REBUILD_INTERVAL, rollup.name)
+        )
+        return cursor.fetchone()
+
+    def _reset(self, conn, cursor, rollup):
+        # Runs inside _lock()'s transaction; the rollup reads as incomplete until it catches up again
+        cursor.execute(f"DELETE FROM {rollup.table}")
+        cursor.execute(
+            f"UPDATE {WATERMARKS_TABLE} SET last_id = 0, last_changed_at = NULL, complete = 0, "
+            f"rebuilt_at = NOW() WHERE name = %s", (rollup.name,)
+        )
+        conn.commit()
+        self._stats["rebuilds"] += 1
+        log.info("Rebuilding rollup %s", rollup.name)
+
+    def _recompute_changed(self, cursor, rollup, last_changed, last_id) -> int:
+        cursor.execute(rollup.changed_keys_sql(), (last_changed, last_id))
+        keys = [row[0] for row in cursor.fetchall()]
+        for start in range(0, len(keys), ROLLUP_RECOMPUTE_CHUNK):
+            sql, params = rollup.recompute_sql(keys[start:start + ROLLUP_RECOMPUTE_CHUNK], last_id)
+            cursor.execute(sql, params)
+        return len(keys)
+
+    def _step(self, conn, cursor, rollup, track_changes: bool) -> bool:
+        """One transaction: the next batch of new rows plus edited keys. True when caught up."""
+        last_id, last_changed, _, _, _ = self._lock(conn, cursor, rollup)
+        # The next batch by primary key, minus rows too young to be sure no lower id is still uncommitted
+        cursor.execute(
+            f"SELECT MAX(id), COUNT(*) FROM (SELECT id, created_at FROM {rollup.source} "
+            f"WHERE id > %s ORDER BY id LIMIT %s) batch WHERE created_at <= NOW() - INTERVAL %s SECOND",
+            (last_id, ROLLUP_BATCH_ROWS, ROLLUP_SETTLE_SECONDS)
+        )
+        hi, rows = cursor.fetchone()
+        if hi is not None:
+            cursor.execute(rollup.delta_sql(), (last_id, hi))
+            self._stats["rows_folded"] += rows
+            last_id = hi
+
+        changed_at = last_changed
+        if track_changes:
+            cursor.execute(f"SELECT MAX({rollup.changed_column}) FROM {rollup.source}")
+            changed_at = cursor.fetchone()[0]
+            if last_changed is not None:
+                self._stats["keys_recomputed"] += self._recompute_changed(cursor, rollup, last_changed, last_id)
+
+        caught_up = rows < ROLLUP_BATCH_ROWS
+        cursor.execute(
+            f"UPDATE {WATERMARKS_TABLE} SET last_id = %s, last_changed_at = %s, refreshed_at = NOW(), "
+            f"complete = complete OR %s WHERE name = %s",
+            (last_id, changed_at, caught_up, rollup.name)
+        )
+        conn.commit()
+        return caught_up
+
+    def refresh_rollup(self, conn, cursor, rollup, rebuild: bool = False):
+        _, _, _, rebuilt_at, rebuild_due = self._lock(conn, cursor, rollup)
+        if rebuild or rebuilt_at is None or (ROLLUP_REBUILD_INTERVAL > 0 and rebuild_due):
+            # An explicit rebuild, the first build, or a scheduled one
+            self._reset(conn, cursor, rollup)
+        else:
+            conn.commit()
+        track_changes = self._tracks_changes(rollup)
+        while not self._step(conn, cursor, rollup, track_changes):
+            pass
+
+    def refresh(self, rebuild: bool = False) -> bool:
+        """Brings every rollup up to date. False when the database refused (e.g. no CREATE privilege)."""
+        if not ROLLUPS_ENABLED:
+            return False
+        from database import get_db_connection
+        started = time.perf_counter()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            self._ensure_tables(cursor)
+            for rollup in self.rollups:
+                self.refresh_rollup(conn, cursor, rollup, rebuild)
+            cursor.close()
+        except Exception as e:
+            self._stats["failures"] += 1
+            self._stats["last_error"] = str(e)
+            log.warning("Rollup refresh failed: %s", e)
+            return False
+        finally:
+            conn.close()
+        self._stats["runs"] += 1
+        self._stats["last_error"] = None
+        self._stats["last_run_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return True
+
+    def ready(self, cursor) -> bool:
+        """True when every rollup has caught up since its last rebuild (one small query)."""
+        if not ROLLUPS_ENABLED:
+            return False
+        try:
+            cursor.execute(f"SELECT COUNT(*) AS complete_rollups FROM {WATERMARKS_TABLE} WHERE complete = 1")
+            row = cursor.fetchone()
+        except Exception:
+            # Not created yet
+            return False
+        count = row["complete_rollups"] if isinstance(row, dict) else row[0]
+        return count == len(self.rollups)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": ROLLUPS_ENABLED,
+            "refresh_interval": ROLLUP_REFRESH_INTERVAL,
+            "rebuild_interval": ROLLUP_REBUILD_INTERVAL,
+            "rollups": [rollup.table for rollup in self.rollups],
+            **self._stats,
+        }
+
+
+insight_rollups = InsightRollups()
+
+
+async def run_rollup_refresh():
+    """Background task started at startup: builds the rollups, then folds in new rows every ROLLUP_REFRESH_INTERVAL seconds."""
+    if not ROLLUPS_ENABLED or ROLLUP_REFRESH_INTERVAL <= 0:
+        return
+    while True:
+        await asyncio.to_thread(insight_rollups.refresh)
+        await asyncio.sleep(ROLLUP_REFRESH_INTERVAL)
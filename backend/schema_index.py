@@ -0,0 +1,182 @@
+# BM25 relevance index over the database schema, used by nl_sql.get_relevant_schema
+# to send the model only the tables (and, for wide tables, the columns) a question
+# needs. Built once per schema version from table names, column names split on
+# underscores, curated synonyms and sampled values of low-cardinality columns.
+import math
+import os
+import re
+import threading
+
+from logging_config import get_logger
+
+log = get_logger("schema_index")
+
+# Configuration
+SCHEMA_MAX_TABLES = int(os.getenv("SCHEMA_MAX_TABLES", "4"))
+SCHEMA_MIN_RELATIVE_SCORE = float(os.getenv("SCHEMA_MIN_RELATIVE_SCORE", "0.5"))  # vs. the best table
+SCHEMA_MAX_COLUMNS = int(os.getenv("SCHEMA_MAX_COLUMNS", "14"))                    # wider tables are pruned
+SCHEMA_SAMPLE_VALUES = os.getenv("SCHEMA_SAMPLE_VALUES", "1") == "1"
+SCHEMA_SAMPLE_MAX_DISTINCT = int(os.getenv("SCHEMA_SAMPLE_MAX_DISTINCT", "40"))
+
+# Curated vocabulary per table (what people call the data, not what the columns are named)
+TABLE_SYNONYMS = {
+    "master_customer": ["customer", "client", "people", "person", "birthday", "anniversary", "membership", "balance", "visit", "gender"],
+    "billing_transactions": ["bill", "billing", "sale", "revenue", "income", "money", "spent", "spend", "spending", "transaction", "discount", "tax", "earning", "turnover"],
+    "billing_trans_summary": ["service", "top service", "popular", "qty", "spending", "revenue", "sold"],
+    "appointment_transactions": ["appointment", "booking", "slot", "pending", "confirmed", "cancelled", "completed", "balance due", "payment mode", "peak hour", "busiest"],
+    "appointment_trans_summary": ["appointment", "booking", "service", "appointment date"],
+    "master_service": ["service", "treatment", "work", "price list", "menu"],
+    "master_employee": ["staff", "employee", "worker", "specialist", "stylist", "therapist"],
+    "master_inventory": ["inventory", "stock", "product", "item", "never sold", "low stock", "reorder"],
+    "billing_trans_inventory": ["product", "item", "sold", "never sold", "retail"],
+}
+# Columns whose distinct values are worth indexing (status words, payment modes, service names)
+_SAMPLE_COLUMNS = re.compile(r"(status|mode|type|category|gender|service_name|payment)", re.IGNORECASE)
+# Columns kept when a wide table is pruned
+_CORE_COLUMNS = re.compile(r"(^id$|_id$|_no$|_name$|^name$|created_at|_date$|grand_total|amount|qty|status)", re.IGNORECASE)
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "with", "and", "or", "is", "are", "was", "were",
+    "what", "which", "who", "how", "many", "much", "show", "me", "list", "give", "get", "all", "my", "our",
+    "we", "do", "does", "did", "have", "has", "there", "this", "that", "last", "from", "at", "be", "it",
+    "tell", "find", "total", "number", "top", "most", "per", "each", "than", "more", "less",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# BM25 parameters and field weights (a token in the table name counts 3 times, ...)
+_K1, _B = 1.2, 0.75
+_WEIGHTS = {"table": 3, "synonym": 2, "column": 1, "value": 1}
+
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith("es") and token[-3] in "sxz":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list:
+    return [_stem(t) for t in _TOKEN.findall(text.lower().replace("_", " ")) if t not in _STOPWORDS]
+
+
+class SchemaIndex:
+    """BM25 over one document per table; per-column term sets decide which columns of wide tables to keep."""
+
+    def __init__(self, tables: dict, values: dict = None, synonyms: dict = TABLE_SYNONYMS, version: str = None):
+        # tables: table -> [column, ...]; values: table -> {column: [distinct value, ...]}
+        self.version = version
+        self.tables = tables
+        values = values or {}
+        self._docs = {}
+        self._columns = {}
+        for table, columns in tables.items():
+            terms = {}
+            self._add(terms, tokenize(table), _WEIGHTS["table"])
+            self._add(terms, [t for s in synonyms.get(table, []) for t in tokenize(s)], _WEIGHTS["synonym"])
+            for column in columns:
+                column_terms = tokenize(column) + [t for v in values.get(table, {}).get(column, []) for t in tokenize(str(v))]
+                self._columns[(table, column)] = set(column_terms)
+                self._add(terms, tokenize(column), _WEIGHTS["column"])
+            for column, distinct in values.get(table, {}).items():
+                self._add(terms, [t for v in distinct for t in tokenize(str(v))], _WEIGHTS["value"])
+            self._docs[table] = terms
+
+        self._lengths = {table: sum(terms.values()) for table, terms in self._docs.items()}
+        self._avg_length = (sum(self._lengths.values()) / len(self._lengths)) if self._lengths else 1.0
+        document_frequency = {}
+        for terms in self._docs.values():
+            for term in terms:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        n = len(self._docs)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()
+        }
+
+    @staticmethod
+    def _add(terms: dict, tokens: list, weight: int):
+        for token in tokens:
+            terms[token] = terms.get(token, 0) + weight
+
+    def score(self, question: str) -> dict:
+        """BM25 score per table (tables without a matching term are left out)."""
+        query = set(tokenize(question))
+        scores = {}
+        for table, terms in self._docs.items():
+            norm = _K1 * (1 - _B + _B * self._lengths[table] / self._avg_length)
+            total = 0.0
+            for term in query:
+                tf = terms.get(term)
+                if tf:
+                    total += self._idf[term] * tf * (_K1 + 1) / (tf + norm)
+            if total > 0:
+                scores[table] = total
+        return scores
+
+    def select_tables(self, question: str, max_tables: int = SCHEMA_MAX_TABLES) -> list:
+        ranked = sorted(self.score(question).items(), key=lambda kv: kv[1], reverse=True)
+        if not ranked:
+            return []
+        cutoff = ranked[0][1] * SCHEMA_MIN_RELATIVE_SCORE
+        return [table for table, score in ranked[:max_tables] if score >= cutoff]
+
+    def select_columns(self, table: str, question: str, max_columns: int = SCHEMA_MAX_COLUMNS) -> list:
+        """All columns of narrow tables; for wide ones, the matching and core columns (schema order)."""
+        columns = self.tables.get(table, [])
+        if len(columns) <= max_columns:
+            return columns
+        query = set(tokenize(question))
+        matched = [c for c in columns if self._columns.get((table, c), set()) & query]
+        core = [c for c in columns if _CORE_COLUMNS.search(c)]
+        keep = set(matched[:max_columns])
+        for column in core:
+            if len(keep) >= max_columns:
+                break
+            keep.add(column)
+        return [c for c in columns if c in keep]
+
+
+def sample_values(cursor, tables: dict) -> dict:
+    """Distinct values of low-cardinality status/mode/name columns: table -> {column: [values]}."""
+    values = {}
+    for table, columns in tables.items():
+        for column in columns:
+            if not _SAMPLE_COLUMNS.search(column):
+                continue
+            try:
+                cursor.execute(
+                    f"SELECT DISTINCT `{column}` FROM `{table}` WHERE `{column}` IS NOT NULL "
+                    f"LIMIT {SCHEMA_SAMPLE_MAX_DISTINCT + 1}"
+                )
+                distinct = [row[0] for row in cursor.fetchall()]
+            except Exception as e:
+                log.warning("Could not sample %s.%s: %s", table, column, e)
+                continue
+            if 0 < len(distinct) <= SCHEMA_SAMPLE_MAX_DISTINCT:
+                values.setdefault(table, {})[column] = [v for v in distinct if isinstance(v, str)]
+    return values
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_schema_index(tables: dict, version: str, load_values=None) -> SchemaIndex:
+    """Index for this schema version, built on first use (load_values() samples the database)."""
+    global _INDEX
+    index = _INDEX
+    if index is not None and index.version == version:
+        return index
+    with _INDEX_LOCK:
+        if _INDEX is None or _INDEX.version != version:
+            values = {}
+            if SCHEMA_SAMPLE_VALUES and load_values is not None:
+                try:
+                    values = load_values()
+                except Exception as e:
+                    log.warning("Schema value sampling failed: %s", e)
+            _INDEX = SchemaIndex(tables, values, version=version)
+            log.info("Schema index built for version %s (%s tables)", version, len(tables))
+        return _INDEX
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+from logging_config import get_logger
+
+log = get_logger("schema_registry")
+
+# Configuration
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "300"))       # seconds between background reloads (0 = off)
+SCHEMA_LOAD_RETRY_INTERVAL = float(os.getenv("SCHEMA_LOAD_RETRY_INTERVAL", "5"))   # seconds before a failed first load is retried
+# Tables the backend maintains for itself (insights rollups); never offered to the model
+SCHEMA_HIDDEN_PREFIXES = tuple(p for p in os.getenv("SCHEMA_HIDDEN_PREFIXES", "rollup_").split(",") if p)
+
+# Every column of the current database in one round trip; COLUMN_KEY marks
+# primary (PRI), unique (UNI) and other indexed (MUL) columns
+_COLUMNS_QUERY = (
+    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, COLUMN_KEY, IS_NULLABLE "
+    "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+    "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+)
+
+
+class SchemaSnapshot:
+    """Immutable view of the database schema at one point in time."""
+
+    def __init__(self, rows, loaded_at: float = None):
+        # rows: (table, column, type, key, nullable) in table/ordinal order
+        self.tables = []      # table names, in name order
+        self.columns = {}     # lowercased table -> [column, ...]
+        self.details = {}     # lowercased table -> [{"name", "type", "key", "nullable"}, ...]
+        for table, column, column_type, key, nullable in rows:
+            lower = table.lower()
+            if lower.startswith(SCHEMA_HIDDEN_PREFIXES):
+                continue
+            if lower not in self.columns:
+                self.tables.append(table)
+                self.columns[lower] = []
+                self.details[lower] = []
+            self.columns[lower].append(column)
+            self.details[lower].append({
+                "name": column, "type": column_type, "key": key or "", "nullable": nullable == "YES"
+            })
+        # Format: table_name.column_name to avoid ambiguity in JOINs
+        self.descriptions = {
+            table: f"Table {table}: {', '.join(f'{table}.{c}' for c in self.columns[table.lower()])}"
+            for table in self.tables
+        }
+        # Types and keys are part of the version, so an ALTER that only changes them still counts
+        fingerprint = "\n".join(
+            f"{table}.{d['name']} {d['type']} {d['key']}"
+            for table in self.tables for d in self.details[table.lower()]
+        )
+        self.version = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:16]
+        self.loaded_at = loaded_at or time.time()
+
+    def table_columns(self) -> dict:
+        """table -> [column, ...] in table order."""
+        return {t: self.columns[t.lower()] for t in self.tables}
+
+    def has_table(self, table: str) -> bool:
+        return table.lower() in self.columns
+
+    def indexed_columns(self, table: str) -> list:
+        return [d["name"] for d in self.details.get(table.lower(), []) if d["key"]]
+
+
+def load_snapshot(cursor) -> SchemaSnapshot:
+    cursor.execute(_COLUMNS_QUERY)
+    return SchemaSnapshot(cursor.fetchall())
+
+
+class SchemaRegistry:
+    """
+    Holds the current SchemaSnapshot. refresh() reloads it with a single
+    information_schema query and swaps the reference atomically, so readers never
+    see a half-built schema. When the version changes every listener registered
+    with on_change() is called with (old_version, new_version); caches derived
+    from the schema hook in there. A failed reload keeps the last good snapshot.
+    """
+
+    def __init__(self, loader=None):
+        self._loader = loader or self._load_from_db
+        self._snapshot = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._last_attempt = 0.0
+        self._stats = {"loads": 0, "changes": 0, "failures": 0, "last_error": None, "load_ms": None}
+
+    @staticmethod
+    def _load_from_db() -> SchemaSnapshot:
+        from database import get_db_connection  # keeps snapshots usable without a MySQL driver
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            snapshot = load_snapshot(cursor)
+            cursor.close()
+            return snapshot
+        finally:
+            conn.close()
+
+    def on_change(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def get(self):
+        """Current snapshot, loading it on first use. None while the database is unreachable."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        if self._last_attempt and time.monotonic() - self._last_attempt < SCHEMA_LOAD_RETRY_INTERVAL:
+            return None
+        self.refresh()
+        return self._snapshot
+
+    def refresh(self) -> bool:
+        """Reloads the schema. Returns True when the version changed."""
+        with self._lock:
+            self._last_attempt = time.monotonic()
+            started = time.perf_counter()
+            try:
+                snapshot = self._loader()
+            except Exception as e:
+                self._stats["failures"] += 1
+                self._stats["last_error"] = str(e)
+                log.warning("Schema load failed: %s", e)
+                return False
+            self._stats["loads"] += 1
+            self._stats["last_error"] = None
+            self._stats["load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            old = self._snapshot
+            if old is not None and old.version == snapshot.version:
+                return False
+            if not snapshot.tables:
+                # An empty schema is almost always a permissions or connection problem
+                self._stats["failures"] += 1
+                self._stats["last_error"] = "no tables found"
+                log.warning("Schema load found no tables; keeping the previous schema")
+                return False
+            self._snapshot = snapshot
+
+        old_version = old.version if old is not None else None
+        if old is not None:
+            self._stats["changes"] += 1
+            log.info("Schema changed: %s -> %s", old_version, snapshot.version)
+        for listener in self._listeners:
+            try:
+                listener(old_version, snapshot.version)
+            except Exception as e:
+                log.warning("Schema change listener failed: %s", e)
+        return True
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "tables": len(snapshot.tables) if snapshot else 0,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "refresh_interval": SCHEMA_REFRESH_INTERVAL,
+            **self._stats,
+        }
+
+
+schema_registry = SchemaRegistry()
+
+
+async def run_schema_refresh():
+    """Background task started at startup: reloads the schema every SCHEMA_REFRESH_INTERVAL seconds."""
+    if SCHEMA_REFRESH_INTERVAL <= 0:
+        return
+    while True:
+        await asyncio.sleep(SCHEMA_REFRESH_INTERVAL)
+        await asyncio.to_thread(schema_registry.refresh)
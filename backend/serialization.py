@@ -0,0 +1,59 @@
+import datetime
+import decimal
+import json
+
+from mysql.connector import FieldType
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+# MySQL field types reported in the columnar "types" list
+_TYPE_NAMES = {
+    "TINY": "int", "SHORT": "int", "LONG": "int", "LONGLONG": "int", "INT24": "int", "YEAR": "int",
+    "DECIMAL": "decimal", "NEWDECIMAL": "decimal",
+    "FLOAT": "float", "DOUBLE": "float",
+    "DATE": "date", "NEWDATE": "date",
+    "DATETIME": "datetime", "TIMESTAMP": "datetime",
+    "TIME": "time",
+    "JSON": "json",
+    "BIT": "bytes", "TINY_BLOB": "bytes", "MEDIUM_BLOB": "bytes", "LONG_BLOB": "bytes", "BLOB": "bytes",
+}
+
+
+def column_type_name(type_code) -> str:
+    return _TYPE_NAMES.get(FieldType.get_info(type_code), "string")
+
+
+def json_default(value):
+    """Encodes the values MySQL hands back that JSON has no native type for."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, set):
+        return sorted(value)
+    return str(value)
+
+
+if orjson is not None:
+    def dumps_bytes(obj) -> bytes:
+        # orjson encodes datetime/date/time natively; Decimal and the rest go through json_default
+        return orjson.dumps(obj, default=json_default)
+else:
+    def dumps_bytes(obj) -> bytes:
+        return json.dumps(obj, default=json_default, separators=(",", ":")).encode("utf-8")
+
+
+def to_columnar(result) -> dict:
+    """{"columns", "types", "rows"} payload from a columnar QueryResult; row tuples encode as arrays."""
+    return {
+        "columns": list(result.columns),
+        "types": list(result.types),
+        "rows": list(result),
+    }
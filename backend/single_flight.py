@@ -0,0 +1,71 @@
+import asyncio
+import os
+import threading
+
+# Configuration
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight work. The first caller for a key starts the work
+    as its own task; callers arriving while it runs await the same task instead of
+    starting another. Exceptions reach every waiter. A waiter that is cancelled
+    (client gone, superseded) only stops waiting; the shared task is cancelled once
+    the last waiter has left.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> _Call
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0, "abandoned": 0}
+
+    async def do(self, key, factory):
+        """Returns (result, shared) where shared is True when another request did the work."""
+        if not SINGLE_FLIGHT_ENABLED:
+            return await factory(), False
+
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+        with self._lock:
+            self._stats["coalesced" if shared else "leaders"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is waiting for the answer any more
+                call.task.cancel()
+                with self._lock:
+                    self._stats["abandoned"] += 1
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self._stats["leaders"] + self._stats["coalesced"]
+            return {
+                "enabled": SINGLE_FLIGHT_ENABLED,
+                "in_flight": len(self._calls),
+                **self._stats,
+                "coalesced_rate": self._stats["coalesced"] / started if started else 0.0,
+            }
+
+
+query_flights = SingleFlight()
@@ -0,0 +1,256 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from logging_config import get_logger
+
+log = get_logger("sql_cache")
+
+# Configuration
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "1") == "1"
+SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql_cache.db"))
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "5000"))
+
+
+class SQLCache:
+    """
+    Question → validated SQL cache. Lookups are served from an in-memory LRU;
+    every entry is written through to SQLite so the cache survives restarts.
+    Keys combine the normalized question, the schema version and the model name.
+
+    The same store keeps SQL repairs (broken SQL fingerprint → SQL that ran),
+    so a failure the repair stage fixed once is fixed without the LLM next time.
+    """
+
+    def __init__(self, path=SQL_CACHE_PATH, max_entries=SQL_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (question, schema_version, model) -> {"sql", "created_at", "last_used", "hits"}
+        self._dirty = set()            # keys whose hit counters have not been written yet
+        self._repairs = OrderedDict()  # (broken_fingerprint, schema_version) -> repaired sql
+        self._lock = threading.Lock()
+        self._db = None
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "repair_hits": 0}
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS sql_cache (
+                    question TEXT NOT NULL,
+                    schema_version TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (question, schema_version, model)
+                )
+            """)
+            rows = self._db.execute(
+                "SELECT question, schema_version, model, sql, created_at, last_used, hits "
+                "FROM sql_cache ORDER BY last_used DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+            for question, schema_version, model, sql, created_at, last_used, hits in reversed(rows):
+                self._entries[(question, schema_version, model)] = {
+                    "sql": sql, "created_at": created_at, "last_used": last_used, "hits": hits
+                }
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS sql_repairs (
+                    fingerprint TEXT NOT NULL,
+                    schema_version TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (fingerprint, schema_version)
+                )
+            """)
+            rows = self._db.execute(
+                "SELECT fingerprint, schema_version, sql FROM sql_repairs ORDER BY created_at DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+            for fingerprint, schema_version, sql in reversed(rows):
+                self._repairs[(fingerprint, schema_version)] = sql
+        return self._db
+
+    def load(self):
+        """Opens the store and loads the most recently used entries into memory."""
+        with self._lock:
+            self._connect()
+
+    def get(self, question: str, schema_version: str, model: str):
+        key = (question, schema_version, model)
+        with self._lock:
+            try:
+                self._connect()
+            except sqlite3.Error as e:
+                log.warning("SQL cache unavailable: %s", e)
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            entry["hits"] += 1
+            entry["last_used"] = time.time()
+            self._dirty.add(key)
+            self._stats["hits"] += 1
+            return entry["sql"]
+
+    def put(self, question: str, schema_version: str, model: str, sql: str):
+        key = (question, schema_version, model)
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._connect()
+                entry = {"sql": sql, "created_at": now, "last_used": now, "hits": 0}
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                self._stats["stores"] += 1
+                db.execute(
+                    "INSERT OR REPLACE INTO sql_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (*key, sql, now, now, 0)
+                )
+                self._dirty.discard(key)
+                while len(self._entries) > self.max_entries:
+                    old_key, _ = self._entries.popitem(last=False)
+                    self._dirty.discard(old_key)
+                    db.execute("DELETE FROM sql_cache WHERE question = ? AND schema_version = ? AND model = ?", old_key)
+                    self._stats["evictions"] += 1
+                self._flush_locked()
+                db.commit()
+            except sqlite3.Error as e:
+                log.warning("Could not persist SQL cache entry: %s", e)
+
+    def discard(self, question: str, schema_version: str, model: str):
+        """Drops an entry, e.g. when its SQL failed to execute."""
+        key = (question, schema_version, model)
+        with self._lock:
+            try:
+                db = self._connect()
+                self._entries.pop(key, None)
+                self._dirty.discard(key)
+                db.execute("DELETE FROM sql_cache WHERE question = ? AND schema_version = ? AND model = ?", key)
+                db.commit()
+            except sqlite3.Error as e:
+                log.warning("Could not delete SQL cache entry: %s", e)
+
+    def get_repair(self, fingerprint: str, schema_version: str):
+        """SQL that previously replaced the broken SQL with this fingerprint, if any."""
+        key = (fingerprint, schema_version)
+        with self._lock:
+            try:
+                self._connect()
+            except sqlite3.Error as e:
+                log.warning("SQL cache unavailable: %s", e)
+                return None
+            sql = self._repairs.get(key)
+            if sql is not None:
+                self._repairs.move_to_end(key)
+                self._stats["repair_hits"] += 1
+            return sql
+
+    def put_repair(self, fingerprint: str, schema_version: str, sql: str):
+        key = (fingerprint, schema_version)
+        with self._lock:
+            try:
+                db = self._connect()
+                self._repairs[key] = sql
+                self._repairs.move_to_end(key)
+                db.execute("INSERT OR REPLACE INTO sql_repairs VALUES (?, ?, ?, ?)", (*key, sql, time.time()))
+                while len(self._repairs) > self.max_entries:
+                    old_key, _ = self._repairs.popitem(last=False)
+                    db.execute("DELETE FROM sql_repairs WHERE fingerprint = ? AND schema_version = ?", old_key)
+                db.commit()
+            except sqlite3.Error as e:
+                log.warning("Could not persist SQL repair: %s", e)
+
+    def _flush_locked(self):
+        if self._dirty:
+            self._db.executemany(
+                "UPDATE sql_cache SET last_used = ?, hits = ? WHERE question = ? AND schema_version = ? AND model = ?",
+                [(self._entries[k]["last_used"], self._entries[k]["hits"], *k) for k in self._dirty if k in self._entries]
+            )
+            self._dirty.clear()
+
+    def flush(self):
+        """Persists hit counters and last-used times accumulated in memory."""
+        with self._lock:
+            if self._db is None:
+                return
+            try:
+                self._flush_locked()
+                self._db.commit()
+            except sqlite3.Error as e:
+                log.warning("Could not flush SQL cache: %s", e)
+
+    def purge(self, question: str = None) -> int:
+        """
+        Deletes every entry (and every stored repair), or every entry for one
+        normalized question. Returns the number of question entries removed.
+        """
+        with self._lock:
+            db = self._connect()
+            keys = [k for k in self._entries if question is None or k[0] == question]
+            for key in keys:
+                del self._entries[key]
+                self._dirty.discard(key)
+            if question is None:
+                self._repairs.clear()
+                db.execute("DELETE FROM sql_cache")
+                db.execute("DELETE FROM sql_repairs")
+            else:
+                db.execute("DELETE FROM sql_cache WHERE question = ?", (question,))
+            db.commit()
+            return len(keys)
+
+    def purge_versions(self, keep: str) -> int:
+        """Deletes entries and repairs for every schema version but `keep`. Returns the entries removed."""
+        with self._lock:
+            db = self._connect()
+            keys = [k for k in self._entries if k[1] != keep]
+            for key in keys:
+                del self._entries[key]
+                self._dirty.discard(key)
+            for key in [k for k in self._repairs if k[1] != keep]:
+                del self._repairs[key]
+            db.execute("DELETE FROM sql_cache WHERE schema_version != ?", (keep,))
+            db.execute("DELETE FROM sql_repairs WHERE schema_version != ?", (keep,))
+            db.commit()
+            return len(keys)
+
+    def entries(self, limit: int = 100) -> list:
+        """Most recently used entries first."""
+        with self._lock:
+            self._connect()
+            items = list(self._entries.items())[-limit:] if limit else list(self._entries.items())
+            return [
+                {"question": q, "schema_version": v, "model": m, **entry}
+                for (q, v, m), entry in reversed(items)
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "enabled": SQL_CACHE_ENABLED,
+                "path": self.path,
+                "entries": len(self._entries),
+                "repairs": len(self._repairs),
+                "max_entries": self.max_entries,
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+sql_cache = SQLCache()
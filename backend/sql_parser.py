@@ -0,0 +1,282 @@
+# Single-pass tokenizer and light parser for the SQL the model generates.
+#
+# One compiled regex splits a statement into tokens, so keywords inside string
+# literals, backquoted names and comments are never mistaken for SQL. The parse
+# walks the tokens once and records what the rest of the backend needs:
+#   - whether the statement is a single read-only SELECT (validate_sql_safety)
+#   - the tables it reads, without CTE names or derived tables (result cache, templates)
+#   - a canonical text (whitespace, case and table aliases normalized) for cache keys,
+#     and a literal-free "shape" of it for grouping queries in logs and metrics
+import functools
+import hashlib
+import re
+from collections import namedtuple
+
+Token = namedtuple("Token", "kind text")
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<exec_comment>/\*!.*?\*/)
+  | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<ident>`(?:[^`]|``)*`)
+  | (?P<number>0x[0-9A-Fa-f]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<param>%\(\w+\)s|%s|\?)
+  | (?P<word>@{0,2}[A-Za-z_$][A-Za-z0-9_$]*)
+  | (?P<op><=>|<=|>=|<>|!=|:=|\|\||&&|<<|>>|->>|->|[-+*/%=<>(),.;!~^&|:])
+  | (?P<error>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Statements and clauses that write, lock or run code
+_FORBIDDEN_WORDS = {
+    "INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "TRUNCATE", "CREATE", "RENAME", "GRANT",
+    "REVOKE", "EXEC", "EXECUTE", "CALL", "LOAD", "HANDLER", "LOCK", "UNLOCK", "INTO", "PREPARE",
+}
+# Functions that block, read files or wait on locks/replication
+_FORBIDDEN_FUNCTIONS = {
+    "SLEEP", "BENCHMARK", "LOAD_FILE", "GET_LOCK", "RELEASE_LOCK", "RELEASE_ALL_LOCKS",
+    "IS_FREE_LOCK", "IS_USED_LOCK", "MASTER_POS_WAIT", "SOURCE_POS_WAIT",
+    "WAIT_FOR_EXECUTED_GTID_SET", "WAIT_UNTIL_SQL_THREAD_AFTER_GTIDS", "SYS_EXEC", "SYS_EVAL",
+}
+# Words that end a table reference (so they are never read as its alias)
+_CLAUSE_WORDS = {
+    "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION", "EXCEPT", "INTERSECT", "WINDOW",
+    "ON", "USING", "JOIN", "INNER", "LEFT", "RIGHT", "CROSS", "NATURAL", "STRAIGHT_JOIN",
+    "OUTER", "FULL", "FOR", "INTO", "USE", "IGNORE", "FORCE", "PARTITION", "LATERAL", "AS",
+}
+_FROM_END_WORDS = {"WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION", "EXCEPT", "INTERSECT", "WINDOW", "SELECT"}
+
+_LITERAL_LIST = re.compile(r"\( \?(?: , \?)* \)")
+
+# Canonical alias names contain '#', which can never be part of an unquoted SQL name
+_ALIAS_NAME = "t#{}"
+
+
+def tokenize(sql: str) -> list:
+    """Significant tokens of `sql`; whitespace and ordinary comments are dropped."""
+    return [
+        Token(m.lastgroup, m.group())
+        for m in _TOKEN.finditer(sql)
+        if m.lastgroup not in ("ws", "comment")
+    ]
+
+
+def _name(token) -> str:
+    """Lowercased identifier with backquotes removed."""
+    if token.kind == "ident":
+        return token.text[1:-1].replace("``", "`").lower()
+    return token.text.lower()
+
+
+def _is_word(token, *words) -> bool:
+    return token.kind == "word" and token.text.upper() in words
+
+
+def _is_op(token, text) -> bool:
+    return token.kind == "op" and token.text == text
+
+
+def _matching_paren(tokens, i) -> int:
+    """Index of the ")" closing the "(" at tokens[i] (len(tokens) if unbalanced)."""
+    depth = 0
+    for j in range(i, len(tokens)):
+        if _is_op(tokens[j], "("):
+            depth += 1
+        elif _is_op(tokens[j], ")"):
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(tokens)
+
+
+class ParsedSQL:
+    """Result of parse_sql(). `problem` is None for a single read-only SELECT."""
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.tokens = tokenize(sql)
+        # Trailing semicolons are harmless; anything after one is a second statement
+        while self.tokens and _is_op(self.tokens[-1], ";"):
+            self.tokens.pop()
+        self.ctes = []        # names defined by WITH
+        self.tables = []      # tables read, lowercased, in order of first use
+        self.aliases = {}     # lowercased alias -> table name, or None for a derived table
+        self.table_refs = 0   # table references in FROM/JOIN lists, repeats and derived tables included
+        self._scan_ctes()
+        self._scan_tables()
+        self.problem = self._check()
+
+    def _scan_ctes(self):
+        tokens = self.tokens
+        for i, token in enumerate(tokens):
+            if not _is_word(token, "WITH"):
+                continue
+            j = i + 1
+            if j < len(tokens) and _is_word(tokens[j], "RECURSIVE"):
+                j += 1
+            while j < len(tokens) and tokens[j].kind in ("word", "ident"):
+                self.ctes.append(_name(tokens[j]))
+                j += 1
+                if j < len(tokens) and _is_op(tokens[j], "("):        # column list
+                    j = _matching_paren(tokens, j) + 1
+                if j < len(tokens) and _is_word(tokens[j], "AS"):
+                    j += 1
+                if j < len(tokens) and _is_op(tokens[j], "("):
+                    j = _matching_paren(tokens, j) + 1
+                if j < len(tokens) and _is_op(tokens[j], ","):
+                    j += 1
+                else:
+                    break
+
+    def _read_alias(self, i: int, table):
+        """Reads "[AS] alias" at tokens[i]; returns the index after it."""
+        tokens = self.tokens
+        j = i + 1 if i < len(tokens) and _is_word(tokens[i], "AS") else i
+        if j < len(tokens) and tokens[j].kind in ("word", "ident") and not (
+                tokens[j].kind == "word" and tokens[j].text.upper() in _CLAUSE_WORDS | _FROM_END_WORDS):
+            self.aliases[_name(tokens[j])] = table
+            return j + 1
+        return i
+
+    def _scan_tables(self):
+        tokens = self.tokens
+        in_from = {}       # paren depth -> inside a FROM clause at that depth
+        derived = []       # depths at which a derived table's "(" was opened
+        depth = 0
+        expect_table = False
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if _is_op(token, "("):
+                if expect_table:
+                    derived.append(depth)
+                    self.table_refs += 1
+                    expect_table = False
+                depth += 1
+                i += 1
+                continue
+            if _is_op(token, ")"):
+                in_from.pop(depth, None)
+                depth -= 1
+                i += 1
+                if derived and derived[-1] == depth:
+                    derived.pop()
+                    i = self._read_alias(i, None)
+                continue
+            if expect_table and token.kind in ("word", "ident"):
+                expect_table = False
+                # schema.table -> table; a name followed by "(" is a table function (JSON_TABLE)
+                j = i
+                while j + 2 < len(tokens) and _is_op(tokens[j + 1], ".") and tokens[j + 2].kind in ("word", "ident"):
+                    j += 2
+                if j + 1 < len(tokens) and _is_op(tokens[j + 1], "("):
+                    i = j + 1
+                    continue
+                table = _name(tokens[j])
+                self.table_refs += 1
+                if table not in self.ctes and table != "dual" and table not in self.tables:
+                    self.tables.append(table)
+                i = self._read_alias(j + 1, table)
+                continue
+            expect_table = False
+            if token.kind == "word":
+                word = token.text.upper()
+                if word in ("FROM", "JOIN", "STRAIGHT_JOIN"):
+                    in_from[depth] = True
+                    expect_table = True
+                elif word in _FROM_END_WORDS:
+                    in_from[depth] = False
+            elif _is_op(token, ",") and in_from.get(depth):
+                expect_table = True
+            i += 1
+
+    def _check(self):
+        tokens = self.tokens
+        if not tokens:
+            return "empty statement"
+        if not _is_word(tokens[0], "SELECT", "WITH"):
+            return "not a SELECT statement"
+        for i, token in enumerate(tokens):
+            if token.kind == "error":
+                return f"unexpected character {token.text!r} (unterminated string or comment?)"
+            if token.kind == "exec_comment":
+                return "executable comment"
+            if _is_op(token, ";"):
+                return "multiple statements"
+            if token.kind != "word":
+                continue
+            word = token.text.upper()
+            follows_dot = i > 0 and _is_op(tokens[i - 1], ".")
+            calls = i + 1 < len(tokens) and _is_op(tokens[i + 1], "(")
+            if follows_dot:
+                continue
+            if calls and word in _FORBIDDEN_FUNCTIONS:
+                return f"function {word}() is not allowed"
+            if word in _FORBIDDEN_WORDS or (word == "REPLACE" and not calls):
+                return f"{word} is not allowed"
+        return None
+
+    @property
+    def is_read_only(self) -> bool:
+        return self.problem is None
+
+    def _alias_names(self) -> dict:
+        return {alias: _ALIAS_NAME.format(n) for n, alias in enumerate(self.aliases, 1)}
+
+    def canonical(self, literals: bool = True) -> str:
+        """
+        Normalized text: one space between tokens, keywords and names lowercased,
+        backquotes dropped, table aliases renamed t#1, t#2, ... With literals=False
+        strings and numbers become "?" and IN lists collapse to "(?+)".
+        """
+        tokens = self.tokens
+        renamed = self._alias_names()
+        out = []
+        for i, token in enumerate(tokens):
+            if _is_word(token, "AS") and i + 1 < len(tokens) and _name(tokens[i + 1]) in renamed \
+                    and self._declares(i + 1):
+                continue        # "FROM t AS c" and "FROM t c" are the same query
+            if token.kind in ("string", "number", "param"):
+                text = token.text if literals else "?"
+            elif token.kind in ("word", "ident"):
+                name = _name(token)
+                # Only qualifiers ("c." ) and the declaration itself are aliases; a bare name may be a column
+                qualifies = i + 1 < len(tokens) and _is_op(tokens[i + 1], ".")
+                declares = name in renamed and self._declares(i)
+                text = renamed[name] if name in renamed and (qualifies or declares) else name
+            else:
+                text = token.text
+            out.append(text)
+        text = " ".join(out)
+        if not literals:
+            text = _LITERAL_LIST.sub("(?+)", text)
+        return text
+
+    def _declares(self, i: int) -> bool:
+        # The alias follows the table name (or ")" of a derived table), optionally after AS
+        tokens = self.tokens
+        j = i - 1
+        if j >= 0 and _is_word(tokens[j], "AS"):
+            j -= 1
+        if j < 0:
+            return False
+        previous = tokens[j]
+        if _is_op(previous, ")"):
+            return True
+        return previous.kind in ("word", "ident") and (
+            _name(previous) in self.tables or _name(previous) in self.ctes
+        ) and not (previous.kind == "word" and previous.text.upper() in _CLAUSE_WORDS)
+
+    def fingerprint(self, literals: bool = True) -> str:
+        return hashlib.sha1(self.canonical(literals).encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_sql(sql: str) -> ParsedSQL:
+    """Parsed statement; cached, since the same SQL is checked several times per request."""
+    return ParsedSQL(sql)
+
+
+def sql_shape(sql: str) -> str:
+    """Short literal-free fingerprint: queries that differ only in constants share it."""
+    return parse_sql(sql).fingerprint(literals=False)[:12]
@@ -0,0 +1,239 @@
+# Repairs generated SQL that MySQL rejected (unknown column, missing table, syntax).
+# The error and the real columns of the referenced tables are fed back to the model
+# for a bounded number of attempts inside a per-request latency budget. Repairs
+# that run are stored in sql_cache, so the same broken SQL is fixed instantly next time.
+import asyncio
+import contextlib
+import difflib
+import os
+import re
+import threading
+import time
+
+from llm_client import get_async_client, OLLAMA_KEEP_ALIVE
+from metrics import record_llm
+from model_router import LARGE_MODEL, MODEL_ROUTING_ENABLED
+from nl_sql import (
+    MODEL_NAME, get_relevant_schema, get_schema_version, get_table_columns,
+    validate_sql_safety, parse_sql_response, remember_sql,
+)
+from result_cache import sql_fingerprint, referenced_tables
+from sql_cache import sql_cache, SQL_CACHE_ENABLED
+from logging_config import get_logger
+
+log = get_logger("sql_repair")
+
+# Configuration
+SQL_REPAIR_ENABLED = os.getenv("SQL_REPAIR_ENABLED", "1") == "1"
+SQL_REPAIR_MAX_ATTEMPTS = int(os.getenv("SQL_REPAIR_MAX_ATTEMPTS", "2"))
+SQL_REPAIR_BUDGET_MS = float(os.getenv("SQL_REPAIR_BUDGET_MS", "8000"))  # total time the repair stage may add to a request
+# Repairs are harder than generation; use the large model when routing is configured
+SQL_REPAIR_MODEL = os.getenv("SQL_REPAIR_MODEL", LARGE_MODEL if MODEL_ROUTING_ENABLED else MODEL_NAME)
+
+# MySQL errors a rewrite of the query can fix
+REPAIRABLE_ERRNOS = {
+    1052,  # ambiguous column
+    1054,  # unknown column
+    1055,  # not in GROUP BY (ONLY_FULL_GROUP_BY)
+    1064,  # syntax error
+    1111,  # invalid use of group function
+    1146,  # table doesn't exist
+    1248,  # derived table needs an alias
+}
+_QUOTED = re.compile(r"'([^']+)'")
+
+_STATS_LOCK = threading.Lock()
+_STATS = {"repairs": 0, "succeeded": 0, "failed": 0, "attempts": 0, "column_fixes": 0,
+          "cache_hits": 0, "llm_calls": 0, "budget_exhausted": 0}
+
+
+def _count(key: str):
+    with _STATS_LOCK:
+        _STATS[key] += 1
+
+
+def is_repairable(error: Exception) -> bool:
+    return SQL_REPAIR_ENABLED and getattr(error, "errno", None) in REPAIRABLE_ERRNOS
+
+
+def _error_text(error: Exception) -> str:
+    return getattr(error, "msg", None) or str(error)
+
+
+def _bad_identifier(error: Exception):
+    """'bt.customer_name' out of "Unknown column 'bt.customer_name' in 'field list'"."""
+    m = _QUOTED.search(_error_text(error))
+    return m.group(1) if m else None
+
+
+def _table_columns(sql: str) -> dict:
+    return {table: get_table_columns(table) for table in referenced_tables(sql) if get_table_columns(table)}
+
+
+def suggest_column_fix(sql: str, error: Exception):
+    """
+    For an unknown column with exactly one close match among the referenced tables'
+    real columns (e.g. customer_name → customerr_name), returns the SQL with that
+    column substituted. No LLM involved; the caller re-runs it to confirm.
+    """
+    if getattr(error, "errno", None) != 1054:
+        return None
+    identifier = _bad_identifier(error)
+    if not identifier:
+        return None
+    column = identifier.split(".")[-1].strip("`")
+    candidates = sorted({c for columns in _table_columns(sql).values() for c in columns})
+    matches = difflib.get_close_matches(column, candidates, n=2, cutoff=0.85)
+    if len(matches) != 1 or matches[0] == column:
+        return None
+    prefix = identifier[: -len(column)] if identifier.endswith(column) else ""
+    pattern = re.compile(r"(?<![\w.`])" + re.escape(identifier) + r"(?![\w`])")
+    fixed = pattern.sub(prefix + matches[0], sql)
+    return fixed if fixed != sql else None
+
+
+def _repair_request(question: str, sql: str, error: Exception) -> dict:
+    tables = _table_columns(sql)
+    if tables:
+        schema = "\n".join(f"Table {table}: {', '.join(columns)}" for table, columns in tables.items())
+    else:
+        schema = get_relevant_schema(question)
+    if getattr(error, "errno", None) == 1146:
+        # The table itself is wrong; show what else could hold the data
+        schema += "\n" + get_relevant_schema(question)
+
+    hint = ""
+    identifier = _bad_identifier(error)
+    if identifier and getattr(error, "errno", None) == 1054:
+        column = identifier.split(".")[-1]
+        all_columns = sorted({c for columns in tables.values() for c in columns})
+        close = difflib.get_close_matches(column, all_columns, n=3, cutoff=0.6)
+        if close:
+            hint = f"\nColumns similar to {column}: {', '.join(close)}"
+
+    system_prompt = f"""
+    You fix MySQL queries that failed. Respond ONLY with JSON {{"sql": "..."}}.
+
+    RULES:
+    1. Keep the meaning of the original query; change only what the error requires.
+    2. Use ONLY the columns listed below, spelled exactly as listed.
+    3. SELECT statements only. NO explanation. NO markdown.
+
+    REAL COLUMNS:
+    {schema}
+    """
+    user_prompt = (
+        f"Question: {question}\n"
+        f"Failed SQL: {sql}\n"
+        f"MySQL error: {_error_text(error)}{hint}\n"
+        f"Respond with the corrected SQL JSON:"
+    )
+    return {
+        "model": SQL_REPAIR_MODEL,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "messages": [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': user_prompt},
+        ],
+        "options": {'num_predict': 400, 'temperature': 0, 'stop': ["}"]},
+    }
+
+
+def _cached_repair(sql: str):
+    if not SQL_CACHE_ENABLED:
+        return None
+    return sql_cache.get_repair(sql_fingerprint(sql), get_schema_version())
+
+
+def _store_repair(question: str, broken: list, fixed_sql: str):
+    if SQL_CACHE_ENABLED:
+        version = get_schema_version()
+        for sql in broken:
+            sql_cache.put_repair(sql_fingerprint(sql), version, fixed_sql)
+    # The question's cached answer becomes the SQL that actually ran
+    remember_sql(question, fixed_sql)
+
+
+async def _chat(request: dict, llm_limit=None):
+    # The LLM slot is held for the model call only, not while candidates run on MySQL
+    async with (llm_limit or contextlib.nullcontext()):
+        return await get_async_client().chat(**request)
+
+
+async def arepair_and_run(question: str, sql: str, error: Exception, run, llm_limit: asyncio.Semaphore = None):
+    """
+    Repairs `sql` after `error` and re-runs it with `await run(candidate_sql)`.
+    Tries, in order: a stored repair, a close-match column substitution, then the
+    LLM, up to SQL_REPAIR_MAX_ATTEMPTS LLM calls within SQL_REPAIR_BUDGET_MS.
+    `llm_limit` is acquired around each LLM call; waiting for it counts against the budget.
+    Returns (repaired_sql, run_result); raises the last database error on failure.
+    """
+    _count("repairs")
+    deadline = time.monotonic() + SQL_REPAIR_BUDGET_MS / 1000
+    broken = [sql]
+    tried = {sql_fingerprint(sql)}
+    llm_calls = 0
+
+    while is_repairable(error):
+        if time.monotonic() >= deadline:
+            _count("budget_exhausted")
+            break
+        candidate = await asyncio.to_thread(_cached_repair, sql)
+        source = "cache"
+        if not candidate or sql_fingerprint(candidate) in tried:
+            candidate = await asyncio.to_thread(suggest_column_fix, sql, error)
+            source = "column"
+        if not candidate or sql_fingerprint(candidate) in tried:
+            if llm_calls >= SQL_REPAIR_MAX_ATTEMPTS:
+                break
+            remaining = deadline - time.monotonic()
+            llm_calls += 1
+            _count("llm_calls")
+            request = await asyncio.to_thread(_repair_request, question, sql, error)
+            try:
+                response = await asyncio.wait_for(_chat(request, llm_limit), remaining)
+            except asyncio.TimeoutError:
+                _count("budget_exhausted")
+                break
+            except Exception as e:
+                log.warning("SQL repair request failed: %s", e)
+                break
+            record_llm(request["model"], response)
+            candidate = parse_sql_response(response['message']['content'].strip())
+            source = "llm"
+            if not candidate or not validate_sql_safety(candidate) or sql_fingerprint(candidate) in tried:
+                continue
+
+        _count("attempts")
+        if source == "cache":
+            _count("cache_hits")
+        elif source == "column":
+            _count("column_fixes")
+        tried.add(sql_fingerprint(candidate))
+        log.info("Retrying with repaired SQL (%s): %s", source, candidate)
+        try:
+            result = await run(candidate)
+        except Exception as e:
+            log.warning("Repaired SQL failed: %s", e)
+            broken.append(candidate)
+            sql, error = candidate, e
+            continue
+
+        await asyncio.to_thread(_store_repair, question, broken, candidate)
+        _count("succeeded")
+        return candidate, result
+
+    _count("failed")
+    raise error
+
+
+def repair_stats() -> dict:
+    with _STATS_LOCK:
+        return {
+            "enabled": SQL_REPAIR_ENABLED,
+            "model": SQL_REPAIR_MODEL,
+            "max_attempts": SQL_REPAIR_MAX_ATTEMPTS,
+            "budget_ms": SQL_REPAIR_BUDGET_MS,
+            **_STATS,
+            "success_rate": _STATS["succeeded"] / _STATS["repairs"] if _STATS["repairs"] else 0.0,
+        }
@@ -1,10 +1,204 @@
+import os
+import threading
+
 from database import get_db_connection
+from result_cache import result_cache, RESULT_CACHE_ENABLED
+from serialization import column_type_name
+from logging_config import get_logger
+
+log = get_logger("sql_runner")
+
+# Result limits: a bad generated query must not be able to materialize a whole table
+MAX_RESULT_ROWS = int(os.getenv("SQL_MAX_RESULT_ROWS", "5000"))
+MAX_RESULT_BYTES = int(os.getenv("SQL_MAX_RESULT_BYTES", str(8 * 1024 * 1024)))
+FETCH_BATCH_SIZE = int(os.getenv("SQL_FETCH_BATCH_SIZE", "500"))
+
+
+class QueryResult(list):
+    """
+    Rows returned by run_sql_query: dicts by default, tuples in columnar mode
+    (then `columns`/`types` describe them).
+    `truncated` is set when the row or byte cap stopped the fetch early,
+    `cached` when the rows came from the result cache.
+    """
+
+    def __init__(self, rows=(), truncated=False, truncated_reason=None, cached=False,
+                 columns=None, types=None, columnar=False):
+        super().__init__(rows)
+        self.truncated = truncated
+        self.truncated_reason = truncated_reason
+        self.cached = cached
+        self.columns = columns
+        self.types = types
+        self.columnar = columnar
+
+    def derive(self, rows):
+        """Same metadata, different rows (used when slicing a page)."""
+        return QueryResult(rows, self.truncated, self.truncated_reason, self.cached,
+                           self.columns, self.types, self.columnar)
+
+    def value(self, row, column):
+        if not self.columnar:
+            return row.get(column)
+        try:
+            return row[self.columns.index(column)]
+        except ValueError:
+            return None
+
+    def to_dicts(self) -> list:
+        if not self.columnar:
+            return self
+        return [dict(zip(self.columns, row)) for row in self]
+
+
+class QueryTracker:
+    """
+    Records which pooled connections are executing statements for one request,
+    so a cancelled request can KILL QUERY them. The lock is held across the KILL
+    so a connection can never be handed to another request while it is being killed.
+    """
+
+    def __init__(self):
+        self._connection_ids = set()
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def track(self, connection_id):
+        with self._lock:
+            if self._cancelled:
+                raise RuntimeError("Request was cancelled")
+            self._connection_ids.add(connection_id)
+
+    def untrack(self, connection_id):
+        with self._lock:
+            self._connection_ids.discard(connection_id)
+
+    def kill_all(self):
+        with self._lock:
+            self._cancelled = True
+            for connection_id in list(self._connection_ids):
+                try:
+                    kill_query(connection_id)
+                    log.info("Killed query on connection %s", connection_id)
+                except Exception as e:
+                    log.warning("Could not kill query on connection %s: %s", connection_id, e)
+
+
+def kill_query(connection_id: int):
+    """Stops the statement currently running on another server connection."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"KILL QUERY {int(connection_id)}")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _estimate_row_bytes(row) -> int:
+    """Cheap approximation of a row's serialized size."""
+    if isinstance(row, dict):
+        return sum(len(k) + len(str(v)) + 6 for k, v in row.items())
+    return sum(len(str(v)) + 2 for v in row)
+
+
+def iter_sql_query(sql: str, max_rows: int = None, max_bytes: int = None, batch_size: int = None,
+                   on_truncate=None, params=None, tracker: QueryTracker = None,
+                   raw: bool = False, on_columns=None):
+    """
+    Streams rows from an unbuffered cursor in fetchmany() batches.
+    Stops once max_rows or max_bytes is reached and reports why through on_truncate(reason).
+    With a tracker, the statement can be killed from another thread while it runs.
+    raw=True yields plain tuples and reports (columns, types) through on_columns first.
+    """
+    max_rows = MAX_RESULT_ROWS if max_rows is None else max_rows
+    max_bytes = MAX_RESULT_BYTES if max_bytes is None else max_bytes
+    batch_size = batch_size or FETCH_BATCH_SIZE
 
-def run_sql_query(sql: str):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(sql)
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return data
+    streaming = False
+    exhausted = False
+    connection_id = conn.connection_id if tracker else None
+    try:
+        if tracker:
+            tracker.track(connection_id)
+        cursor = conn.cursor(dictionary=not raw, buffered=False)
+        cursor.execute(sql, params)
+        streaming = True
+        if on_columns and cursor.description:
+            on_columns([d[0] for d in cursor.description], [column_type_name(d[1]) for d in cursor.description])
+        rows_sent = 0
+        bytes_sent = 0
+        truncated_reason = None
+        while truncated_reason is None:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                exhausted = True
+                break
+            for row in batch:
+                if max_rows and rows_sent >= max_rows:
+                    truncated_reason = f"row limit of {max_rows} reached"
+                    break
+                bytes_sent += _estimate_row_bytes(row)
+                if max_bytes and bytes_sent > max_bytes:
+                    truncated_reason = f"size limit of {max_bytes} bytes reached"
+                    break
+                rows_sent += 1
+                yield row
+
+        if truncated_reason and on_truncate:
+            on_truncate(truncated_reason)
+        if exhausted:
+            cursor.close()
+    finally:
+        if tracker:
+            tracker.untrack(connection_id)
+        if exhausted or not streaming:
+            conn.close()
+        else:
+            # Unread rows are still on the wire; dropping the connection is cheaper than draining them
+            conn.invalidate()
+
+
+def run_sql_query(sql: str, max_rows: int = None, max_bytes: int = None, use_cache: bool = True,
+                  params=None, tracker: QueryTracker = None, columnar: bool = False,
+                  on_row=None) -> QueryResult:
+    """
+    Executes a query and returns a bounded QueryResult.
+    columnar=True keeps the cursor tuples as-is instead of building a dict per row.
+    on_row(row) is called for each row as it comes off the cursor (within the row and
+    byte caps), so a caller can forward rows before the whole result is read.
+    """
+    use_cache = use_cache and RESULT_CACHE_ENABLED
+    variant = "columnar" if columnar else ""
+    if use_cache:
+        cached = result_cache.get(sql, params, variant)
+        if cached is not None:
+            rows, meta = cached
+            if on_row:
+                for row in rows:
+                    on_row(row)
+            return QueryResult(rows, cached=True, columnar=columnar, **meta)
+        marks = result_cache.snapshot(sql)
+
+    result = QueryResult(columnar=columnar)
+
+    def _mark_truncated(reason):
+        result.truncated = True
+        result.truncated_reason = reason
+        log.warning("Result truncated: %s", reason)
+
+    def _set_columns(columns, types):
+        result.columns = columns
+        result.types = types
+
+    for row in iter_sql_query(sql, max_rows=max_rows, max_bytes=max_bytes,
+                              on_truncate=_mark_truncated, params=params, tracker=tracker,
+                              raw=columnar, on_columns=_set_columns):
+        result.append(row)
+        if on_row:
+            on_row(row)
+    if use_cache and not result.truncated:
+        result_cache.put(sql, result, marks, params, variant,
+                         meta={"columns": result.columns, "types": result.types})
+    return result
@@ -0,0 +1,431 @@
+# Parameterized SQL templates for the questions most of our traffic asks.
+# They are consulted before Ollama; a match returns finished SQL in microseconds.
+# Each matcher pulls slots (names, numbers, periods) out of the preprocessed
+# question and renders the corresponding golden-pattern SQL. A matcher only fires
+# when every other word of the question is one it understands: a qualifier it
+# cannot express (a city, a product, a second period to compare with) sends the
+# question to the LLM instead of returning a confidently wrong answer.
+import os
+import re
+import threading
+from collections import namedtuple
+
+# Configuration
+SQL_TEMPLATES_ENABLED = os.getenv("SQL_TEMPLATES_ENABLED", "1") == "1"
+
+TemplateMatch = namedtuple("TemplateMatch", ["name", "sql", "slots"])
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20,
+}
+_NUMBER = r"(\d+|" + "|".join(_NUMBER_WORDS) + r")"
+
+# Words that can follow "how much did ..." etc. but are not customer names
+_NOT_NAMES = {
+    "we", "i", "you", "they", "us", "our", "the salon", "salon", "the shop", "everyone", "all",
+    "customers", "customer", "clients", "people", "staff", "employees", "it", "this", "that",
+}
+
+
+def _to_int(text: str, default: int) -> int:
+    if not text:
+        return default
+    text = text.lower()
+    return int(text) if text.isdigit() else _NUMBER_WORDS.get(text, default)
+
+
+def _sql_like_literal(name: str) -> str:
+    """'%name%' literal; the name is restricted to letters, spaces, dots, hyphens and apostrophes."""
+    name = re.sub(r"[^A-Za-z .'\-]", "", name).strip()
+    return "'%" + name.replace("'", "''") + "%'"
+
+
+def _clean_name(raw: str):
+    name = raw.strip(" .?!,'\"")
+    name = re.sub(r"'s$", "", name).strip()
+    if not name or name.lower() in _NOT_NAMES or len(name) > 60:
+        return None
+    if not re.fullmatch(r"[A-Za-z][A-Za-z .'\-]*", name):
+        return None
+    return name
+
+
+# ---------------------------------------------------------------------------
+# Slot extraction
+# ---------------------------------------------------------------------------
+
+_PERIODS = [
+    (re.compile(r"\btoday'?s?\b"), "Today", "DATE(created_at) = CURDATE()"),
+    (re.compile(r"\byesterday'?s?\b"), "Yesterday", "DATE(created_at) = DATE_SUB(CURDATE(), INTERVAL 1 DAY)"),
+    (re.compile(r"\bthis week'?s?\b"), "This Week", "YEARWEEK(created_at, 1) = YEARWEEK(CURDATE(), 1)"),
+    (re.compile(r"\blast week'?s?\b"), "Last Week",
+     "YEARWEEK(created_at, 1) = YEARWEEK(DATE_SUB(CURDATE(), INTERVAL 1 WEEK), 1)"),
+    (re.compile(r"\bthis month'?s?\b|\bcurrent month\b"), "This Month",
+     "MONTH(created_at) = MONTH(CURDATE()) AND YEAR(created_at) = YEAR(CURDATE())"),
+    (re.compile(r"\blast month'?s?\b|\bprevious month\b"), "Last Month",
+     "MONTH(created_at) = MONTH(DATE_SUB(CURDATE(), INTERVAL 1 MONTH)) "
+     "AND YEAR(created_at) = YEAR(DATE_SUB(CURDATE(), INTERVAL 1 MONTH))"),
+    (re.compile(r"\bthis year'?s?\b|\bcurrent year\b"), "This Year", "YEAR(created_at) = YEAR(CURDATE())"),
+    (re.compile(r"\blast year'?s?\b|\bprevious year\b"), "Last Year", "YEAR(created_at) = YEAR(CURDATE()) - 1"),
+]
+_LAST_N = re.compile(r"\b(?:last|past|previous)\s+" + _NUMBER + r"\s+(day|week|month|year)s?\b")
+_TOP_N = re.compile(r"\b(?:top|best|first|bottom|worst|lowest)\s+" + _NUMBER + r"\b")
+_COMPARISON = re.compile(r"\b(compare[sd]?|comparing|comparison|versus|vs|against)\b")
+
+# Words any question may contain without changing what it asks
+_FILLER = {
+    "what", "whats", "is", "are", "was", "were", "the", "a", "an", "me", "show", "list", "give",
+    "tell", "get", "find", "display", "please", "can", "you", "i", "we", "us", "our", "my", "do",
+    "does", "did", "have", "has", "had", "there", "which", "how", "much", "many", "s", "of", "for",
+    "in", "on", "at", "to", "so", "far", "till", "until", "date", "all", "time", "now", "currently",
+    "and", "that", "it", "be", "been",
+}
+
+
+def extract_period(question_lower: str, column: str = "created_at"):
+    """Returns (label, SQL condition on `column`) for the first period mentioned, else None."""
+    m = _LAST_N.search(question_lower)
+    if m:
+        n = _to_int(m.group(1), 1)
+        unit = m.group(2).upper()
+        return f"Last {n} {m.group(2)}s", f"{column} >= DATE_SUB(CURDATE(), INTERVAL {n} {unit})"
+    for pattern, label, condition in _PERIODS:
+        if pattern.search(question_lower):
+            return label, condition.replace("created_at", column)
+    return None
+
+
+def period_labels(question_lower: str) -> list:
+    """Labels of every period mentioned, e.g. ["Yesterday", "Today"] for a comparison."""
+    labels = [f"Last {_to_int(m.group(1), 1)} {m.group(2)}s" for m in _LAST_N.finditer(question_lower)]
+    for pattern, label, _ in _PERIODS:
+        labels.extend(label for _ in pattern.finditer(question_lower))
+    return labels
+
+
+def strip_periods(text: str) -> str:
+    """`text` with its period phrases removed (case is kept), so the words left can be checked."""
+    for pattern in [_LAST_N] + [pattern for pattern, _, _ in _PERIODS]:
+        text = re.sub(pattern.pattern, " ", text, flags=re.IGNORECASE)
+    return text
+
+
+def extract_top_n(question_lower: str, default: int = 5) -> int:
+    m = _TOP_N.search(question_lower)
+    return max(1, min(_to_int(m.group(1) if m else None, default), 100))
+
+
+def _only_words(text: str, allowed=()) -> bool:
+    """True when every word of `text` is filler or in `allowed`."""
+    return all(word in _FILLER or word in allowed for word in re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _single_period(question_lower: str):
+    """
+    (period or None, question without it) for questions about at most one period;
+    None for comparisons, which no single-period template can answer.
+    """
+    if _COMPARISON.search(question_lower) or len(period_labels(question_lower)) > 1:
+        return None
+    return extract_period(question_lower), strip_periods(question_lower)
+
+
+# ---------------------------------------------------------------------------
+# Templates
+# ---------------------------------------------------------------------------
+
+def _customer_name(question: str, patterns):
+    for pattern in patterns:
+        m = re.search(pattern, question, re.IGNORECASE)
+        if m:
+            name = _clean_name(m.group("name"))
+            if name:
+                return name
+    return None
+
+
+_NAME = r"(?P<name>[A-Za-z][A-Za-z .'\-]{0,59}?)"
+
+
+def _match_customer_spending(question, question_lower):
+    if not re.search(r"\bspen[dt]|\bspending\b", question_lower):
+        return None
+    single = _single_period(question_lower)
+    if single is None:
+        return None
+    period, rest = single
+    name = _customer_name(strip_periods(question), [
+        r"\bhow much (?:has|did|does) (?:customer )?" + _NAME + r" spen[dt]\b",
+        r"\b(?:total )?(?:spending|amount spent|spent) (?:of|by|for) (?:customer )?" + _NAME + r"\s*\??$",
+        r"^(?:what is |show )?(?:customer )?" + _NAME + r"'s (?:total )?spending\b",
+    ])
+    # "How much did Priya spend on facials?" is not her total spending
+    if not name or not _only_words(rest.replace(name.lower(), " "), {"spend", "spent", "spending", "amount", "total", "customer", "by"}):
+        return None
+    # billing_transactions spells the column customerr_name (master_customer has customer_name)
+    sql = (
+        f"SELECT SUM(grand_total) as spending FROM billing_transactions "
+        f"WHERE customerr_name LIKE {_sql_like_literal(name)}"
+    )
+    if period:
+        return {"name": name, "period": period[0]}, f"{sql} AND {period[1]}"
+    return {"name": name}, sql
+
+
+def _match_customer_visits(question, question_lower):
+    if not re.search(r"\bvisit", question_lower):
+        return None
+    # visitcnt is a lifetime counter; visits in a period need the appointment tables
+    if period_labels(question_lower):
+        return None
+    name = _customer_name(question, [
+        r"\bhow many (?:times|visits) (?:has|did|does) (?:customer )?" + _NAME + r" (?:visit(?:ed)?|come|came)\b",
+        r"\b(?:visit count|visits|number of visits) (?:of|by|for) (?:customer )?" + _NAME + r"\s*\??$",
+        r"\bhow often (?:has|does|did) (?:customer )?" + _NAME + r" visit",
+    ])
+    if not name or not _only_words(question_lower.replace(name.lower(), " "), {
+            "times", "visits", "visit", "visited", "come", "came", "customer", "count", "number", "by", "often"}):
+        return None
+    return {"name": name}, (
+        f"SELECT visitcnt FROM master_customer WHERE customer_name LIKE {_sql_like_literal(name)}"
+    )
+
+
+def _match_customer_profile(question, question_lower):
+    if not re.search(r"\b(details?|profile|info(?:rmation)?|who is)\b", question_lower):
+        return None
+    name = _customer_name(question, [
+        r"\b(?:details?|profile|info(?:rmation)?) (?:of|for|about|on) (?:the )?(?:customer )?" + _NAME + r"\s*\??$",
+        r"\bcustomer " + _NAME + r"'s (?:details?|profile|info(?:rmation)?)",
+        r"^who is (?:customer )?" + _NAME + r"\s*\??$",
+    ])
+    if not name:
+        return None
+    return {"name": name}, (
+        f"SELECT * FROM master_customer WHERE customer_name LIKE {_sql_like_literal(name)}"
+    )
+
+
+_LOW_STOCK = re.compile(r"\blow (?:on )?stock\b|\bstock (?:is )?low\b|\brunning low\b|\bout of stock\b|\bneeds? restock(?:ing)?\b")
+
+
+def _match_low_stock(question, question_lower):
+    if not _LOW_STOCK.search(question_lower):
+        return None
+    # "Is stock low for shampoo?" asks about one product, not the whole list
+    if not _only_words(_LOW_STOCK.sub(" ", question_lower), {"products", "product", "items", "item", "inventory", "stock"}):
+        return None
+    return {}, (
+        "SELECT product_name, volume, min_stock_level FROM master_inventory "
+        "WHERE CAST(NULLIF(volume, '') AS DECIMAL(10,2)) < min_stock_level"
+    )
+
+
+_NEVER_SOLD = re.compile(r"\bnever (?:been )?sold\b|\bnot (?:been )?sold\b|\bunsold\b|\bzero sales\b|\bno sales\b")
+
+
+def _match_never_sold(question, question_lower):
+    if not _NEVER_SOLD.search(question_lower):
+        return None
+    single = _single_period(question_lower)
+    if single is None:
+        return None
+    period, rest = single
+    if not _only_words(_NEVER_SOLD.sub(" ", rest), {"products", "product", "items", "item", "inventory", "ever", "any", "yet"}):
+        return None
+    if period:
+        # Products with no sale inside the period (the period belongs in the join, not the WHERE)
+        label, condition = extract_period(question_lower, "ti.created_at")
+        return {"period": label}, (
+            f"SELECT i.product_name FROM master_inventory i LEFT JOIN billing_trans_inventory ti "
+            f"ON i.product_id = ti.product_id AND {condition} WHERE ti.id IS NULL"
+        )
+    return {}, (
+        "SELECT i.product_name FROM master_inventory i LEFT JOIN billing_trans_inventory ti "
+        "ON i.product_id = ti.product_id WHERE ti.id IS NULL"
+    )
+
+
+_TOP_SERVICES_WORDS = {
+    "services", "service", "top", "best", "most", "popular", "unpopular", "highest", "leading", "sold",
+    "selling", "performing", "least", "lowest", "bottom", "worst", "fewest", "by", "revenue", "quantity",
+    "qty", "count", "booked",
+}
+
+
+def _match_top_services(question, question_lower):
+    if not re.search(r"\bservices?\b", question_lower):
+        return None
+    if not re.search(r"\b(top|best|most popular|popular|unpopular|highest|leading|most sold|"
+                     r"least|lowest|bottom|worst|fewest)\b", question_lower):
+        return None
+    single = _single_period(question_lower)
+    if single is None:
+        return None
+    period, rest = single
+    # "top services for Priya" or "... by stylist" need a filter or grouping this template lacks
+    if not _only_words(_TOP_N.sub(" ", rest), _TOP_SERVICES_WORDS):
+        return None
+    n = extract_top_n(question_lower)
+    ascending = bool(re.search(r"\b(least|lowest|bottom|worst|fewest|unpopular)\b", rest))
+    direction = "ASC" if ascending else "DESC"
+    where = f"WHERE {period[1]} " if period else ""
+    slots = {"n": n, "order": direction.lower()}
+    if period:
+        slots["period"] = period[0]
+    by_quantity = bool(re.search(r"\b(popular|unpopular|most sold|quantity|qty|count|booked)\b", rest)) \
+        and "revenue" not in rest
+    if by_quantity:
+        return {**slots, "metric": "quantity"}, (
+            f"SELECT service_name, SUM(qty) as total_sold FROM billing_trans_summary {where}"
+            f"GROUP BY service_id, service_name ORDER BY total_sold {direction} LIMIT {n}"
+        )
+    return {**slots, "metric": "revenue"}, (
+        f"SELECT service_name, SUM(grand_total) as revenue FROM billing_trans_summary {where}"
+        f"GROUP BY service_id, service_name ORDER BY revenue {direction} LIMIT {n}"
+    )
+
+
+_COMPARISON_WORDS = {"compare", "compared", "comparing", "comparison", "revenue", "sales", "with", "vs", "versus", "against", "month", "year"}
+
+
+def _match_revenue_comparison(question, question_lower):
+    # "Compare this month revenue with last month" (preprocess maps vs/versus to compare)
+    if not ("compare" in question_lower and "revenue" in question_lower and "month" in question_lower):
+        return None
+    if not set(period_labels(question_lower)) <= {"This Month", "Last Month"} \
+            or not _only_words(strip_periods(question_lower), _COMPARISON_WORDS):
+        return None
+    return {}, (
+        "SELECT 'This Month' as period, COALESCE(SUM(grand_total), 0) as revenue FROM billing_transactions "
+        "WHERE MONTH(created_at) = MONTH(CURDATE()) AND YEAR(created_at) = YEAR(CURDATE()) "
+        "UNION ALL SELECT 'Last Month', COALESCE(SUM(grand_total), 0) FROM billing_transactions "
+        "WHERE MONTH(created_at) = MONTH(DATE_SUB(CURDATE(), INTERVAL 1 MONTH)) "
+        "AND YEAR(created_at) = YEAR(DATE_SUB(CURDATE(), INTERVAL 1 MONTH)) "
+        "UNION ALL SELECT 'Last Year', COALESCE(SUM(grand_total), 0) FROM billing_transactions "
+        "WHERE YEAR(created_at) = YEAR(CURDATE()) - 1 "
+        "UNION ALL SELECT 'Total', COALESCE(SUM(grand_total), 0) FROM billing_transactions"
+    )
+
+
+def _match_year_comparison(question, question_lower):
+    if not ("compare" in question_lower and "revenue" in question_lower and "year" in question_lower):
+        return None
+    if not set(period_labels(question_lower)) <= {"This Year", "Last Year"} \
+            or not _only_words(strip_periods(question_lower), _COMPARISON_WORDS):
+        return None
+    return {}, (
+        "SELECT 'This Year' as period, COALESCE(SUM(grand_total), 0) as revenue FROM billing_transactions "
+        "WHERE YEAR(created_at) = YEAR(CURDATE()) "
+        "UNION ALL SELECT 'Last Year', COALESCE(SUM(grand_total), 0) FROM billing_transactions "
+        "WHERE YEAR(created_at) = YEAR(CURDATE()) - 1"
+    )
+
+
+def _match_revenue_trend(question, question_lower):
+    if not re.search(r"\b(revenue|sales|income)\b", question_lower):
+        return None
+    if not re.search(r"\b(trend|monthly|month by month|month-wise|per month|each month|over the last|over the past)\b", question_lower):
+        return None
+    # Only "last N months" windows; "over the last year" or "for facials" go to the LLM
+    labels = period_labels(question_lower)
+    if len(labels) > 1 or (labels and not re.fullmatch(r"Last \d+ months", labels[0])):
+        return None
+    if not _only_words(strip_periods(question_lower), {
+            "revenue", "sales", "income", "trend", "trends", "monthly", "month", "by", "wise", "per", "each", "over"}):
+        return None
+    m = re.search(r"\b(?:last|past|previous)\s+" + _NUMBER + r"\s+months?\b", question_lower)
+    n = max(1, min(_to_int(m.group(1) if m else None, 6), 36))
+    return {"months": n}, (
+        f"SELECT DATE_FORMAT(created_at, '%Y-%m') as month, SUM(grand_total) as revenue "
+        f"FROM billing_transactions WHERE created_at >= DATE_SUB(CURDATE(), INTERVAL {n} MONTH) "
+        f"GROUP BY month ORDER BY month DESC"
+    )
+
+
+def _match_revenue_period(question, question_lower):
+    if not re.search(r"\b(revenue|sales|income|earnings|collection)\b", question_lower):
+        return None
+    single = _single_period(question_lower)
+    if single is None:
+        return None
+    # "revenue this month for facial services" or "by payment mode" is not the period total
+    period, rest = single
+    if not _only_words(rest, {
+            "revenue", "sales", "income", "earnings", "collection", "total", "overall", "make", "made",
+            "earn", "earned", "generated", "gross"}):
+        return None
+    if re.search(r"\b(total|overall|all[- ]time)\b", question_lower) and not period:
+        return {"period": "Total"}, "SELECT COALESCE(SUM(grand_total), 0) as revenue FROM billing_transactions"
+    if not period:
+        return None
+    label, condition = period
+    return {"period": label}, (
+        f"SELECT COALESCE(SUM(grand_total), 0) as revenue FROM billing_transactions WHERE {condition}"
+    )
+
+
+def _match_customer_count(question, question_lower):
+    if not re.search(r"\b(how many|number of|count of|total) (?:customers|clients)\b", question_lower):
+        return None
+    # "new customers this month", "customers in Chennai" and the like are not the total
+    if period_labels(question_lower) or not _only_words(question_lower, {
+            "customers", "clients", "number", "count", "total", "registered"}):
+        return None
+    return {}, "SELECT COUNT(*) as total_customers FROM master_customer"
+
+
+# Ordered: more specific templates first
+TEMPLATES = [
+    ("revenue_comparison", _match_revenue_comparison),
+    ("year_comparison", _match_year_comparison),
+    ("customer_spending", _match_customer_spending),
+    ("customer_visits", _match_customer_visits),
+    ("customer_profile", _match_customer_profile),
+    ("low_stock", _match_low_stock),
+    ("never_sold", _match_never_sold),
+    ("top_services", _match_top_services),
+    ("revenue_trend", _match_revenue_trend),
+    ("revenue_period", _match_revenue_period),
+    ("customer_count", _match_customer_count),
+]
+
+_STATS_LOCK = threading.Lock()
+_STATS = {"lookups": 0, "misses": 0, "hits": {name: 0 for name, _ in TEMPLATES}}
+
+
+def match_template(question: str):
+    """
+    Returns a TemplateMatch for the first template that fits the (preprocessed)
+    question, or None when the question should go to the LLM.
+    """
+    if not SQL_TEMPLATES_ENABLED:
+        return None
+    question = question.strip()
+    question_lower = question.lower()
+    for name, matcher in TEMPLATES:
+        result = matcher(question, question_lower)
+        if result is not None:
+            slots, sql = result
+            with _STATS_LOCK:
+                _STATS["lookups"] += 1
+                _STATS["hits"][name] += 1
+            return TemplateMatch(name, sql, slots)
+    with _STATS_LOCK:
+        _STATS["lookups"] += 1
+        _STATS["misses"] += 1
+    return None
+
+
+def template_stats() -> dict:
+    with _STATS_LOCK:
+        lookups = _STATS["lookups"]
+        hits = lookups - _STATS["misses"]
+        return {
+            "enabled": SQL_TEMPLATES_ENABLED,
+            "lookups": lookups,
+            "misses": _STATS["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "hits": dict(_STATS["hits"]),
+        }
@@ -0,0 +1,69 @@
+import json
+import urllib.request
+
+from bench.seed_db import TABLES
+from bench.fake_ollama import FakeModel, FakeOllama, ModelProfile, apply_stop
+from bench.stats import percentile, summarize_stages, check_thresholds, check_regression
+from test_sql_templates import production_columns
+
+golden = [
+    {"question": "Which products are low on stock?", "sql": "SELECT product_name FROM master_inventory"},
+    {"question": "What are the top 5 services by revenue?", "sql": "SELECT service_name FROM billing_trans_summary"},
+]
+
+
+def test_percentiles_use_nearest_rank():
+    values = list(range(1, 101))
+    assert [percentile(values, p) for p in (50, 95, 99)] == [50, 95, 99]
+    assert percentile([7.0], 99) == 7.0
+
+
+def test_stage_summaries_and_checks():
+    stages = summarize_stages([{"db": 10.0, "total": 100.0}, {"db": 30.0, "total": 300.0}])
+    assert stages["db"] == {"count": 2, "mean": 20.0, "p50": 10.0, "p95": 30.0, "p99": 30.0, "max": 30.0}
+    assert check_thresholds(stages, {"total": {"p95": 250}, "db": {"p95": 50}}) == [
+        "total p95 300.0 ms > limit 250.0 ms"
+    ]
+    assert check_regression(stages, {"db": {"p95": 20.0}, "total": {"p95": 290.0}}, 0.2) == [
+        "db p95 30.0 ms vs baseline 20.0 ms (+50%)"
+    ]
+
+
+def test_fake_model_answers_golden_sql_and_honors_stop():
+    model = FakeModel(golden)
+    sql_prompt = [{"role": "system", "content": 'Respond ONLY with JSON {"sql": "..."}'},
+                  {"role": "user", "content": "Question: which products are low on stock\nRespond with the SQL JSON:"}]
+    assert model.reply(sql_prompt, {"stop": ["}"]}) == '{"sql": "SELECT product_name FROM master_inventory"'
+    assert apply_stop("one\ntwo}", ["}", "\n"]) == "one"
+
+
+def test_fake_ollama_serves_chat():
+    profile = ModelProfile(load_ms=0, prompt_tokens_per_second=1e6, tokens_per_second=0)
+    with FakeOllama(FakeModel(golden, profile)) as url:
+        body = json.dumps({"model": "fake", "stream": False, "messages": [
+            {"role": "user", "content": 'Question: top 5 services by revenue?\nReply {"sql": ...}'}]}).encode()
+        request = urllib.request.Request(f"{url}/api/chat", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            reply = json.loads(response.read())
+    assert reply["done"] is True
+    assert json.loads(reply["message"]["content"])["sql"] == "SELECT service_name FROM billing_trans_summary"
+
+
+def test_seed_tables_match_production_columns():
+    production = production_columns()
+    for table, known in production.items():
+        for line in TABLES[table].strip().splitlines():
+            name, column_type = line.strip().rstrip(",").split()[:2]
+            if name in ("PRIMARY", "KEY", "UNIQUE"):
+                continue
+            assert name in known, (table, name)
+            assert column_type.lower() == known[name], (table, name, column_type, known[name])
+
+
+if __name__ == "__main__":
+    test_percentiles_use_nearest_rank()
+    test_stage_summaries_and_checks()
+    test_fake_model_answers_golden_sql_and_honors_stop()
+    test_fake_ollama_serves_chat()
+    test_seed_tables_match_production_columns()
+    print("All benchmark helper checks passed.")
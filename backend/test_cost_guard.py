@@ -0,0 +1,101 @@
+import time
+
+import cost_guard
+from cost_guard import CostGuard, QueryCostError, apply_time_limit, estimate_rows_examined
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._result = []
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(sql)
+        if sql.startswith("EXPLAIN"):
+            self._result = self.connection.plan
+        else:
+            self._result = [("8.0.36",)]
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Stands in for a pooled connection; every EXPLAIN returns `plan`."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.statements = []
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+def guard_with(plan, **settings):
+    connection = FakeConnection(plan)
+    cost_guard.get_db_connection = lambda: connection
+    return CostGuard(**{"row_budget": 1000, "max_rows": 100000, "limit": 50, "max_execution_ms": 2000, **settings}), connection
+
+
+def test_estimate_multiplies_joins_and_adds_selects():
+    plan = [{"id": 1, "rows": 100}, {"id": 1, "rows": 20}, {"id": 2, "rows": 5}, {"id": 2, "rows": None}]
+    assert estimate_rows_examined(plan) == 100 * 20 + 5
+
+
+def test_over_budget_unbounded_query_gets_a_limit():
+    guard, _ = guard_with([{"id": 1, "rows": 5000}])
+    assert guard.check("SELECT * FROM billing_transactions;") == "SELECT * FROM billing_transactions LIMIT 50"
+    # An explicit LIMIT is left alone
+    assert guard.check("SELECT * FROM billing_transactions LIMIT 10") == "SELECT * FROM billing_transactions LIMIT 10"
+    # A LIMIT inside a subquery does not bound the outer query
+    assert guard.check("SELECT * FROM (SELECT * FROM t LIMIT 5) x JOIN u").endswith(" LIMIT 50")
+
+
+def test_far_over_budget_is_rejected():
+    guard, _ = guard_with([{"id": 1, "rows": 1000}, {"id": 1, "rows": 1000}])
+    try:
+        guard.check("SELECT * FROM a JOIN b")
+    except QueryCostError as e:
+        assert "1,000,000 rows" in str(e)
+    else:
+        raise AssertionError("expected QueryCostError")
+
+
+def test_verdicts_are_memoized_until_they_expire():
+    guard, connection = guard_with([{"id": 1, "rows": 10}], memo_ttl=0.05)
+    guard.check("SELECT * FROM t WHERE id = 1")
+    guard.check("select *  from t where id = 1")
+    assert sum(s.startswith("EXPLAIN") for s in connection.statements) == 1
+    time.sleep(0.06)
+    connection.plan = [{"id": 1, "rows": 5000}]
+    assert guard.check("SELECT * FROM t WHERE id = 1").endswith("LIMIT 50")
+    assert sum(s.startswith("EXPLAIN") for s in connection.statements) == 2
+    guard.clear()
+    guard.check("SELECT * FROM t WHERE id = 1")
+    assert sum(s.startswith("EXPLAIN") for s in connection.statements) == 3
+
+
+def test_time_limit_hint_goes_on_the_main_select():
+    assert apply_time_limit("SELECT 1;", 2000) == "SELECT /*+ MAX_EXECUTION_TIME(2000) */ 1"
+    assert apply_time_limit("WITH c AS (SELECT 1) SELECT * FROM c", 2000) == \
+        "WITH c AS (SELECT 1) SELECT /*+ MAX_EXECUTION_TIME(2000) */ * FROM c"
+    assert apply_time_limit("SELECT 1", 2500, "mariadb") == "SET STATEMENT max_statement_time=2.5 FOR SELECT 1"
+    assert apply_time_limit("SELECT 1", 0) == "SELECT 1"
+
+
+if __name__ == "__main__":
+    test_estimate_multiplies_joins_and_adds_selects()
+    test_over_budget_unbounded_query_gets_a_limit()
+    test_far_over_budget_is_rejected()
+    test_verdicts_are_memoized_until_they_expire()
+    test_time_limit_hint_goes_on_the_main_select()
+    print("All cost guard checks passed.")
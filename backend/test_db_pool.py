@@ -0,0 +1,127 @@
+import threading
+import time
+
+from database import ConnectionPool, PoolExhaustedError, PoolTimeoutError
+
+
+class FakeRaw:
+    """A mysql.connector connection as far as the pool is concerned."""
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.ping_fails = False
+        self.unread_result = False
+        self.in_transaction = False
+        self.rolled_back = False
+
+    def ping(self, reconnect=False):
+        if self.ping_fails:
+            raise ConnectionError("server has gone away")
+
+    def rollback(self):
+        self.rolled_back = True
+        self.in_transaction = False
+
+    def consume_results(self):
+        self.unread_result = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(ConnectionPool):
+    def __init__(self, **kwargs):
+        super().__init__(host="fake", **kwargs)
+        self.opened = []
+
+    def _connect(self):
+        raw = FakeRaw(len(self.opened) + 1)
+        self.opened.append(raw)
+        with self._cond:
+            self._stats["created"] += 1
+        return (raw, time.monotonic())
+
+
+def test_checkout_times_out_when_pool_is_full():
+    pool = FakePool(min_size=0, max_size=1, checkout_timeout=0.05)
+    held = pool.acquire()
+    started = time.monotonic()
+    try:
+        pool.acquire()
+    except PoolTimeoutError:
+        assert time.monotonic() - started >= 0.05
+    else:
+        raise AssertionError("expected PoolTimeoutError")
+    assert pool.stats()["timeouts"] == 1
+    held.close()
+    # The freed connection is handed out again instead of opening a new one
+    assert pool.acquire()._raw is held._raw
+    assert pool.stats()["created"] == 1
+
+
+def test_waiter_gets_connection_released_by_another_thread():
+    pool = FakePool(min_size=0, max_size=1, checkout_timeout=2)
+    held = pool.acquire()
+    threading.Timer(0.05, held.close).start()
+    conn = pool.acquire()
+    assert conn._raw.number == 1
+    assert pool.stats()["wait_time_max"] >= 0.04
+
+
+def test_waiters_beyond_the_limit_are_rejected():
+    pool = FakePool(min_size=0, max_size=1, max_waiters=0, checkout_timeout=1)
+    pool.acquire()
+    try:
+        pool.acquire()
+    except PoolExhaustedError:
+        pass
+    else:
+        raise AssertionError("expected PoolExhaustedError")
+    assert pool.stats()["rejected"] == 1
+
+
+def test_old_and_dead_connections_are_replaced_on_checkout():
+    pool = FakePool(min_size=0, max_size=2, max_lifetime=0.05)
+    first = pool.acquire()
+    raw = first._raw
+    first.close()
+    time.sleep(0.06)
+    second = pool.acquire()
+    assert raw.closed and second._raw is not raw
+    assert pool.stats()["recycled"] == 1
+    second._raw.ping_fails = True
+    dead = second._raw
+    second.close()
+    third = pool.acquire()
+    assert dead.closed and third._raw is not dead
+    assert pool.stats()["failed_pings"] == 1
+    assert pool.stats()["size"] == 1
+
+
+def test_invalidate_discards_and_release_cleans_up():
+    pool = FakePool(min_size=0, max_size=2)
+    conn = pool.acquire()
+    raw = conn._raw
+    conn.invalidate()
+    assert raw.closed
+    assert pool.stats()["size"] == 0 and pool.stats()["idle"] == 0
+    conn.close()    # no effect once invalidated
+    assert pool.stats()["in_use"] == 0
+
+    conn = pool.acquire()
+    conn._raw.in_transaction = True
+    conn._raw.unread_result = True
+    raw = conn._raw
+    conn.close()
+    assert raw.rolled_back and not raw.unread_result and not raw.closed
+    assert pool.stats()["idle"] == 1
+
+
+if __name__ == "__main__":
+    test_checkout_times_out_when_pool_is_full()
+    test_waiter_gets_connection_released_by_another_thread()
+    test_waiters_beyond_the_limit_are_rejected()
+    test_old_and_dead_connections_are_replaced_on_checkout()
+    test_invalidate_discards_and_release_cleans_up()
+    print("All pool checks passed.")
@@ -0,0 +1,80 @@
+import asyncio
+import io
+import json
+import logging
+import logging.handlers
+import queue
+
+from logging_config import JsonFormatter, _DroppingQueueHandler, _RequestIdFilter, set_request_id
+
+
+def make_logger(name: str, maxsize: int = 100):
+    """Logger wired like setup_logging(), writing JSON lines into a buffer."""
+    buffer = io.StringIO()
+    output = logging.StreamHandler(buffer)
+    output.setFormatter(JsonFormatter())
+    log_queue = queue.Queue(maxsize=maxsize)
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(_RequestIdFilter())
+    logger = logging.getLogger(f"test.{name}")
+    logger.handlers = [handler]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, output)
+    return logger, listener, buffer
+
+
+def lines(buffer) -> list:
+    return [json.loads(line) for line in buffer.getvalue().splitlines()]
+
+
+def test_json_lines_carry_request_id_and_extras():
+    logger, listener, buffer = make_logger("extras")
+    listener.start()
+    set_request_id("req-1")
+    logger.info("query %s", "completed", extra={"status": "success", "timings": {"db": 12.5}})
+    listener.stop()
+    (entry,) = lines(buffer)
+    assert entry["msg"] == "query completed"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "req-1"
+    assert entry["status"] == "success"
+    assert entry["timings"] == {"db": 12.5}
+
+
+def test_request_id_follows_worker_threads():
+    logger, listener, buffer = make_logger("threads")
+    listener.start()
+
+    async def handle(request_id):
+        set_request_id(request_id)
+        await asyncio.to_thread(logger.info, "from a worker")
+
+    async def main():
+        await asyncio.gather(handle("a"), handle("b"))
+
+    asyncio.run(main())
+    listener.stop()
+    assert sorted(entry["request_id"] for entry in lines(buffer)) == ["a", "b"]
+
+
+def test_exceptions_are_formatted_and_full_queue_drops():
+    logger, listener, buffer = make_logger("drops", maxsize=1)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("failed")
+    dropped = _DroppingQueueHandler.dropped
+    logger.warning("no room")
+    assert _DroppingQueueHandler.dropped == dropped + 1
+    listener.start()
+    listener.stop()
+    (entry,) = lines(buffer)
+    assert "ValueError: boom" in entry["exc"]
+
+
+if __name__ == "__main__":
+    test_json_lines_carry_request_id_and_extras()
+    test_request_id_follows_worker_threads()
+    test_exceptions_are_formatted_and_full_queue_drops()
+    print("All logging checks passed.")
@@ -0,0 +1,51 @@
+import metrics
+from metrics import Counter, Histogram, record_llm, server_timing, stage_timer, track_timings
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        h.observe(value, "db")
+    lines = h.render()
+    assert 'demo_seconds_bucket{stage="db",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="db",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{stage="db",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="db"} 3' in lines
+
+
+def test_counter_escapes_labels():
+    c = Counter("demo_total", "Demo.", ("status",))
+    c.inc('say "hi"', amount=2)
+    assert c.render()[-1] == 'demo_total{status="say \\"hi\\""} 2'
+
+
+def test_stage_timer_feeds_request_timings():
+    timings = {}
+    track_timings(timings)
+    before = metrics.STAGE_SECONDS.count("unit_test_stage")
+    with stage_timer("unit_test_stage"):
+        pass
+    assert "unit_test_stage" in timings
+    assert metrics.STAGE_SECONDS.count("unit_test_stage") == before + 1
+    track_timings(None)
+
+
+def test_llm_tokens_and_rate():
+    record_llm("test-model", {"prompt_eval_count": 120, "eval_count": 30, "eval_duration": 500_000_000})
+    assert metrics.LLM_TOKENS.value("test-model", "prompt") == 120
+    assert metrics.LLM_TOKENS.value("test-model", "completion") == 30
+    assert metrics.LLM_TOKEN_RATE.count("test-model") == 1
+
+
+def test_server_timing_header():
+    assert server_timing({"sql_generation": 812.44, "db": 3}) == "sql_generation;dur=812.4, db;dur=3.0"
+
+
+if __name__ == "__main__":
+    test_histogram_renders_cumulative_buckets()
+    test_counter_escapes_labels()
+    test_stage_timer_feeds_request_timings()
+    test_llm_tokens_and_rate()
+    test_server_timing_header()
+    print(metrics.render())
+    print("All metrics checks passed.")
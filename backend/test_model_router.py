@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import nl_sql
+from model_router import score_complexity, ROUTER_COMPLEXITY_THRESHOLD, LARGE_MODEL
+
+easy = [
+    "How many customers are there?",
+    "What is the total revenue?",
+    "Show all products",
+    "List services",
+]
+
+hard = [
+    "Which customers spent more than 5000 last month but have not visited this month?",
+    "Compare service revenue per stylist this year versus last year",
+    "Show the average bill value per customer along with their visit count",
+    "What share of revenue comes from products versus services each month?",
+]
+
+
+def test_easy_questions_stay_on_small_model():
+    for question in easy:
+        score, reasons = score_complexity(question)
+        assert score < ROUTER_COMPLEXITY_THRESHOLD, (question, score, reasons)
+
+
+def test_hard_questions_go_to_large_model():
+    for question in hard:
+        score, reasons = score_complexity(question)
+        assert score >= ROUTER_COMPLEXITY_THRESHOLD, (question, score, reasons)
+
+
+def test_sync_and_async_generation_escalate_alike():
+    """generate_sql and agenerate_sql share one flow; unusable small-model SQL goes to the large model."""
+    calls = []
+    checked_on = []
+
+    def generate(question, model):
+        calls.append(model)
+        return "SELECT broken" if model != LARGE_MODEL else "SELECT 1"
+
+    async def agenerate(question, model, llm_limit=None):
+        # A real suspension, as an Ollama call would have
+        await asyncio.sleep(0.01)
+        return generate(question, model)
+
+    def usable(sql):
+        checked_on.append(threading.get_ident())
+        return sql == "SELECT 1"
+
+    patched = {
+        "_fast_path_sql": lambda question: None,
+        "get_cached_sql": lambda question: None,
+        "remember_sql": lambda question, sql: None,
+        "sql_is_usable": usable,
+        "route_model": lambda question: ("small", "small-model"),
+        "_generate_with_model": generate,
+        "_agenerate_with_model": agenerate,
+    }
+    saved = {name: getattr(nl_sql, name) for name in patched}
+    try:
+        for name, value in patched.items():
+            setattr(nl_sql, name, value)
+        assert nl_sql.generate_sql("q") == "SELECT 1"
+        assert asyncio.run(nl_sql.agenerate_sql("q")) == "SELECT 1"
+    finally:
+        for name, value in saved.items():
+            setattr(nl_sql, name, value)
+    assert calls == ["small-model", LARGE_MODEL] * 2
+    # The sync path checks SQL on the calling thread; the async one on a worker thread
+    assert checked_on[0] == threading.get_ident() and checked_on[1] != threading.get_ident()
+
+
+if __name__ == "__main__":
+    print("Testing model routing scores...")
+    for question in easy + hard:
+        print(f"  {question!r} -> {score_complexity(question)}")
+    test_easy_questions_stay_on_small_model()
+    test_hard_questions_go_to_large_model()
+    test_sync_and_async_generation_escalate_alike()
+    print("All routing checks passed.")
@@ -0,0 +1,131 @@
+import datetime
+import decimal
+
+import cost_guard
+from pagination import CursorError, decode_cursor, encode_cursor, fetch_page, ordering_key
+from schema_registry import SchemaSnapshot
+from sql_runner import QueryResult
+
+# Time limits are attached without asking a server for its version
+cost_guard._SERVER_FLAVOR = "mysql"
+
+schema = SchemaSnapshot([
+    ("master_customer", "id", "bigint", "PRI", "NO"),
+    ("master_customer", "customer_name", "varchar(120)", "", "YES"),
+    ("master_customer", "mobile_no", "varchar(20)", "UNI", "YES"),
+    ("billing_transactions", "id", "bigint", "PRI", "NO"),
+    ("billing_transactions", "customer_id", "varchar(50)", "", "YES"),
+    ("billing_transactions", "invoice_id", "varchar(50)", "MUL", "NO"),
+    ("billing_trans_summary", "invoice_id", "varchar(50)", "PRI", "NO"),
+    ("billing_trans_summary", "line_no", "int", "PRI", "NO"),
+])
+
+
+class FakeTable:
+    """Serves keyset and offset pages of `rows` the way MySQL would, recording each statement."""
+
+    def __init__(self, rows, key):
+        self.rows = sorted(rows, key=lambda r: r[key])
+        self.key = key
+        self.statements = []
+
+    def __call__(self, sql, params=None):
+        self.statements.append((sql, params))
+        limit = int(sql.rsplit("LIMIT", 1)[1].split()[0])
+        rows = self.rows
+        if params:
+            rows = [r for r in rows if r[self.key] > params[0]]
+        elif "OFFSET" in sql:
+            rows = rows[int(sql.rsplit("OFFSET", 1)[1]):]
+        return QueryResult(rows[:limit])
+
+
+def test_keyset_needs_a_key_the_schema_marks_unique():
+    assert ordering_key("SELECT * FROM master_customer ORDER BY id", schema) == [("id", "ASC")]
+    assert ordering_key("SELECT * FROM master_customer ORDER BY mobile_no DESC", schema) == [("mobile_no", "DESC")]
+    # A foreign key repeats across rows; a join can repeat a primary key
+    assert ordering_key("SELECT * FROM billing_transactions ORDER BY customer_id", schema) is None
+    assert ordering_key("SELECT * FROM billing_transactions ORDER BY invoice_id", schema) is None
+    assert ordering_key(
+        "SELECT c.id, b.grand_total FROM master_customer c JOIN billing_transactions b "
+        "ON b.customer_id = c.id ORDER BY c.id", schema) is None
+    assert ordering_key("SELECT * FROM master_customer a, master_customer b ORDER BY id", schema) is None
+    # Part of a composite primary key is not unique; all of it is
+    assert ordering_key("SELECT * FROM billing_trans_summary ORDER BY line_no", schema) is None
+    assert ordering_key("SELECT * FROM billing_trans_summary ORDER BY invoice_id, line_no", schema) is not None
+    # Without a schema nothing is known to be unique
+    assert ordering_key("SELECT * FROM master_customer ORDER BY id", None) is None
+
+
+def test_ties_on_a_non_unique_key_page_by_offset():
+    rows = [{"id": i, "customer_id": "C1" if i <= 3 else "C2"} for i in range(1, 7)]
+    table = FakeTable(rows, "customer_id")
+    sql = "SELECT id, customer_id FROM billing_transactions ORDER BY customer_id"
+    seen, state = [], None
+    while True:
+        page, info = fetch_page(sql, sql, page_size=2, state=state, run=table, schema=schema)
+        assert info["mode"] == "offset"
+        seen.extend(row["id"] for row in page)
+        if not info["has_more"]:
+            break
+        state = decode_cursor(info["next_cursor"])
+    assert sorted(seen) == [1, 2, 3, 4, 5, 6]
+
+
+def test_keyset_continues_after_the_last_key():
+    table = FakeTable([{"id": i, "customer_name": f"c{i}"} for i in range(1, 6)], "id")
+    sql = "SELECT id, customer_name FROM master_customer ORDER BY id"
+    page, info = fetch_page(sql, sql, page_size=2, run=table, schema=schema)
+    assert info["mode"] == "keyset" and [row["id"] for row in page] == [1, 2]
+    page, info = fetch_page(sql, sql, state=decode_cursor(info["next_cursor"]), run=table, schema=schema)
+    assert [row["id"] for row in page] == [3, 4]
+    assert table.statements[-1][1] == (2,)
+
+
+def test_percent_signs_survive_parameter_binding():
+    table = FakeTable([{"id": i, "customer_name": "suresh"} for i in range(1, 4)], "id")
+    sql = "SELECT id, customer_name FROM master_customer WHERE customer_name LIKE '%suresh%' ORDER BY id"
+    page, info = fetch_page(sql, sql, page_size=1, run=table, schema=schema)
+    assert table.statements[0][1] is None and "'%suresh%'" in table.statements[0][0]
+    fetch_page(sql, sql, state=decode_cursor(info["next_cursor"]), run=table, schema=schema)
+    statement, params = table.statements[-1]
+    assert "'%%suresh%%'" in statement
+    # What the driver sends after substituting the params
+    assert "'%suresh%'" in statement % tuple(params)
+
+
+def test_cursors_are_signed_and_round_trip():
+    state = {"sql": "SELECT * FROM master_customer ORDER BY id", "size": 2, "mode": "keyset",
+             "after": [decimal.Decimal("12.50"), datetime.datetime(2024, 5, 1, 9, 30)]}
+    cursor = encode_cursor(state)
+    assert decode_cursor(cursor)["after"] == ["12.50", "2024-05-01 09:30:00.000000"]
+    payload, signature = cursor.rsplit(".", 1)
+    # Swapping in other SQL (or any other byte) invalidates the signature
+    forged = encode_cursor({**state, "sql": "SELECT * FROM users"}).rsplit(".", 1)[0] + "." + signature
+    for bad in (forged, payload + "." + "0" * 32, "not-a-cursor", encode_cursor({"sql": "x", "mode": "other"})):
+        try:
+            decode_cursor(bad)
+        except CursorError:
+            pass
+        else:
+            raise AssertionError(bad)
+
+
+def test_null_key_switches_the_cursor_to_offset():
+    rows = [{"id": 1, "mobile_no": "1"}, {"id": 2, "mobile_no": None}, {"id": 3, "mobile_no": None}]
+    table = FakeTable(rows, "id")
+    sql = "SELECT id, mobile_no FROM master_customer ORDER BY mobile_no"
+    page, info = fetch_page(sql, sql, page_size=2, run=table, schema=schema)
+    assert info["mode"] == "keyset"
+    state = decode_cursor(info["next_cursor"])
+    assert state["mode"] == "offset" and state["seen"] == 2 and "after" not in state
+
+
+if __name__ == "__main__":
+    test_keyset_needs_a_key_the_schema_marks_unique()
+    test_ties_on_a_non_unique_key_page_by_offset()
+    test_keyset_continues_after_the_last_key()
+    test_percent_signs_survive_parameter_binding()
+    test_cursors_are_signed_and_round_trip()
+    test_null_key_switches_the_cursor_to_offset()
+    print("All pagination checks passed.")
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+from profiling import ProfileStore, RequestThreadExecutor, SamplingProfiler, SlowRequestLog
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def other_busy_loop(stop):
+    busy_loop(stop)
+
+
+def test_profiler_samples_tracked_threads_only():
+    stop = threading.Event()
+    with SamplingProfiler(interval_ms=1) as profiler:
+        mine = threading.Thread(target=profiler.track, args=(busy_loop, stop))
+        other = threading.Thread(target=other_busy_loop, args=(stop,))
+        mine.start()
+        other.start()
+        time.sleep(0.1)
+        stop.set()
+        mine.join()
+        other.join()
+    result = profiler.result
+    functions = [entry["function"] for entry in result.top(50)]
+    assert "test_profiling.py:busy_loop" in functions
+    assert result.samples > 0
+    assert "busy_loop" in result.folded()
+    assert "other_busy_loop" not in result.folded()
+
+
+def test_executor_follows_the_profiled_request_only():
+    async def request(profiled, stop):
+        profiler = SamplingProfiler(interval_ms=1).start() if profiled else None
+        try:
+            await asyncio.to_thread(busy_loop if profiled else other_busy_loop, stop)
+        finally:
+            result = profiler.stop() if profiler else None
+        return result
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(RequestThreadExecutor())
+        stop = threading.Event()
+        asyncio.get_running_loop().call_later(0.1, stop.set)
+        return await asyncio.gather(request(True, stop), request(False, stop))
+
+    result, _ = asyncio.run(main())
+    assert "busy_loop" in result.folded()
+    assert "other_busy_loop" not in result.folded()
+
+
+def test_slow_log_keeps_slowest_over_threshold():
+    log = SlowRequestLog(threshold_ms=100, size=2)
+    assert log.record("/query", {"total": 50}) is False
+    log.record("/query", {"total": 150}, question="a")
+    log.record("/query", {"total": 900}, question="b")
+    log.record("/query", {"total": 300}, question="c")
+    assert [e["question"] for e in log.slowest()] == ["b", "c"]
+
+
+def test_profile_store_evicts_oldest():
+    store = ProfileStore(size=2)
+    ids = [store.put(object()) for _ in range(3)]
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2]) is not None
+
+
+if __name__ == "__main__":
+    test_profiler_samples_tracked_threads_only()
+    test_executor_follows_the_profiled_request_only()
+    test_slow_log_keeps_slowest_over_threshold()
+    test_profile_store_evicts_oldest()
+    print("All profiling checks passed.")
@@ -0,0 +1,80 @@
+import asyncio
+
+import query_pipeline
+from query_pipeline import run_batch
+
+
+class FakePipeline:
+    """Stands in for stream_query_pipeline; records questions and peak concurrent LLM and DB use."""
+
+    def __init__(self):
+        self.questions = []
+        self.active = 0
+        self.peak = 0
+        self.db_active = 0
+        self.db_peak = 0
+
+    async def __call__(self, question, page_size=None, page_state=None, response_format="rows",
+                       timings=None, llm_limit=None, db_limit=None):
+        self.questions.append(question)
+        async with llm_limit:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+        async with db_limit:
+            self.db_active += 1
+            self.db_peak = max(self.db_peak, self.db_active)
+            await asyncio.sleep(0.01)
+            self.db_active -= 1
+        timings["sql_generation"] = 10.0
+        yield "sql", {"sql": f"SELECT '{question}'"}
+        yield "answer", {"answer": question, "status": "success"}
+
+
+def run(questions, llm_concurrency=2, db_concurrency=None):
+    pipeline = FakePipeline()
+    saved = (query_pipeline.stream_query_pipeline, query_pipeline.load_schema_if_needed,
+             query_pipeline.BATCH_LLM_CONCURRENCY, query_pipeline.BATCH_DB_CONCURRENCY)
+    query_pipeline.stream_query_pipeline = pipeline
+    query_pipeline.load_schema_if_needed = lambda: None
+    query_pipeline.BATCH_LLM_CONCURRENCY = llm_concurrency
+    if db_concurrency is not None:
+        query_pipeline.BATCH_DB_CONCURRENCY = db_concurrency
+    try:
+        return asyncio.run(run_batch(questions)), pipeline
+    finally:
+        (query_pipeline.stream_query_pipeline, query_pipeline.load_schema_if_needed,
+         query_pipeline.BATCH_LLM_CONCURRENCY, query_pipeline.BATCH_DB_CONCURRENCY) = saved
+
+
+def test_duplicates_run_once_and_keep_request_order():
+    batch, pipeline = run(["Total revenue?", "low stock", "  total REVENUE ", "low stock"])
+    assert sorted(pipeline.questions) == ["Total revenue?", "low stock"]
+    assert batch["questions"] == 4 and batch["unique"] == 2
+    results = batch["results"]
+    assert [r["question"] for r in results] == ["Total revenue?", "low stock", "  total REVENUE ", "low stock"]
+    assert results[2]["duplicate_of"] == 0 and results[3]["duplicate_of"] == 1
+    assert results[2]["sql"] == results[0]["sql"]
+    assert "duplicate_of" not in results[0]
+    assert results[0]["timings"]["sql_generation"] == 10.0 and "total" in results[0]["timings"]
+
+
+def test_llm_slots_bound_concurrency():
+    batch, pipeline = run([f"question {n}" for n in range(6)], llm_concurrency=2)
+    assert batch["unique"] == 6
+    assert pipeline.peak == 2
+
+
+def test_db_slots_leave_pool_connections_for_live_traffic():
+    assert query_pipeline.BATCH_DB_CONCURRENCY < query_pipeline.POOL_MAX_SIZE or query_pipeline.POOL_MAX_SIZE == 1
+    batch, pipeline = run([f"question {n}" for n in range(8)], llm_concurrency=8, db_concurrency=3)
+    assert batch["unique"] == 8
+    assert pipeline.db_peak == 3
+
+
+if __name__ == "__main__":
+    test_duplicates_run_once_and_keep_request_order()
+    test_llm_slots_bound_concurrency()
+    test_db_slots_leave_pool_connections_for_live_traffic()
+    print("All batch checks passed.")
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+
+import cost_guard
+import pagination
+import query_pipeline
+import sql_runner
+from query_pipeline import run_cancellable, run_query_pipeline
+from sql_runner import QueryTracker, run_sql_query
+
+
+class HangingCursor:
+    """A statement that runs until KILL QUERY reaches its connection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        self.connection.started.set()
+        if not self.connection.killed.wait(2):
+            raise AssertionError("statement was never killed")
+        raise RuntimeError("Query execution was interrupted")
+
+    def close(self):
+        pass
+
+
+class HangingConnection:
+    def __init__(self, connection_id):
+        self.connection_id = connection_id
+        self.started = threading.Event()
+        self.killed = threading.Event()
+        self.closed = threading.Event()
+
+    def cursor(self, **kwargs):
+        return HangingCursor(self)
+
+    def close(self):
+        self.closed.set()
+
+
+class RecordingTracker(QueryTracker):
+    instances = []
+
+    def __init__(self):
+        super().__init__()
+        self.instances.append(self)
+
+
+class NoSchema:
+    def get(self):
+        return None
+
+
+def test_tracker_kills_tracked_connections_and_refuses_new_ones():
+    killed = []
+    saved = sql_runner.kill_query
+    sql_runner.kill_query = killed.append
+    try:
+        tracker = QueryTracker()
+        tracker.track(11)
+        tracker.track(12)
+        tracker.untrack(11)
+        tracker.kill_all()
+    finally:
+        sql_runner.kill_query = saved
+    assert killed == [12]
+    try:
+        tracker.track(13)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("a cancelled request must not start new statements")
+
+
+def test_disconnect_cancels_the_query():
+    async def slow():
+        await asyncio.sleep(5)
+        return "finished"
+
+    async def scenario():
+        checks = []
+
+        async def is_disconnected():
+            checks.append(True)
+            return len(checks) > 1
+
+        started = time.monotonic()
+        result = await run_cancellable(slow(), is_disconnected, poll_interval=0.01)
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result is None and elapsed < 1
+
+
+def test_newer_question_from_the_same_client_supersedes_the_older():
+    async def answer(value, delay):
+        await asyncio.sleep(delay)
+        return value
+
+    async def scenario():
+        older = asyncio.ensure_future(run_cancellable(answer("older", 5), client_id="tab-1"))
+        await asyncio.sleep(0.01)
+        assert "tab-1" in query_pipeline._ACTIVE_BY_CLIENT
+        newer = await run_cancellable(answer("newer", 0.01), client_id="tab-1")
+        return await older, newer
+
+    older, newer = asyncio.run(scenario())
+    assert older is None and newer == "newer"
+    assert "tab-1" not in query_pipeline._ACTIVE_BY_CLIENT
+
+
+def test_cancelled_pipeline_kills_its_statement():
+    connection = HangingConnection(connection_id=42)
+    killed = []
+
+    def kill_query(connection_id):
+        killed.append(connection_id)
+        connection.killed.set()
+
+    async def generated_sql(question, llm_limit=None):
+        return "SELECT SUM(grand_total) FROM billing_transactions"
+
+    saved = (query_pipeline.agenerate_sql, query_pipeline.check_sql_cost, query_pipeline.run_sql_query,
+             pagination.schema_registry, sql_runner.get_db_connection, sql_runner.kill_query,
+             query_pipeline.QueryTracker)
+    query_pipeline.agenerate_sql = generated_sql
+    query_pipeline.check_sql_cost = lambda sql: sql
+    query_pipeline.run_sql_query = lambda sql, **kw: run_sql_query(sql, use_cache=False, **kw)
+    pagination.schema_registry = NoSchema()
+    sql_runner.get_db_connection = lambda: connection
+    sql_runner.kill_query = kill_query
+    query_pipeline.QueryTracker = RecordingTracker
+    cost_guard._SERVER_FLAVOR = "mysql"
+
+    async def scenario():
+        async def is_disconnected():
+            # The client goes away once the statement is running on MySQL
+            return connection.started.is_set()
+
+        return await run_cancellable(run_query_pipeline("revenue"), is_disconnected,
+                                     client_id="tab-2", poll_interval=0.01)
+
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        (query_pipeline.agenerate_sql, query_pipeline.check_sql_cost, query_pipeline.run_sql_query,
+         pagination.schema_registry, sql_runner.get_db_connection, sql_runner.kill_query,
+         query_pipeline.QueryTracker) = saved
+    assert result is None
+    assert killed == [42]
+    # The worker thread finishes once the statement is interrupted and returns its connection
+    assert connection.closed.wait(2)
+    (tracker,) = RecordingTracker.instances
+    assert tracker._connection_ids == set()
+    assert "tab-2" not in query_pipeline._ACTIVE_BY_CLIENT
+
+
+if __name__ == "__main__":
+    test_tracker_kills_tracked_connections_and_refuses_new_ones()
+    test_disconnect_cancels_the_query()
+    test_newer_question_from_the_same_client_supersedes_the_older()
+    test_cancelled_pipeline_kills_its_statement()
+    print("All cancellation checks passed.")
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import threading
+
+from fastapi.testclient import TestClient
+
+import cost_guard
+import main
+import pagination
+import query_pipeline
+import sql_runner
+from pagination import fetch_page
+from query_pipeline import stream_query_pipeline
+from sql_runner import run_sql_query
+
+
+class FakeCursor:
+    """Unbuffered cursor over `rows`; waits for `release` before handing out the second batch."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = [("id", 3), ("name", 253)]
+        self.batches = 0
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(sql)
+
+    def fetchmany(self, size):
+        start = self.batches * size
+        self.batches += 1
+        if self.batches == 2 and self.connection.release is not None:
+            assert self.connection.release.wait(2), "second batch was never released"
+        return self.connection.rows[start:start + size]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    connection_id = 7
+
+    def __init__(self, rows, release=None):
+        self.rows = rows
+        self.release = release
+        self.statements = []
+        self.closed = False
+        self.invalidated = False
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+    def invalidate(self):
+        self.invalidated = True
+
+
+def rows(n):
+    return [{"id": i, "name": f"customer {i}"} for i in range(1, n + 1)]
+
+
+def connect(connection):
+    sql_runner.get_db_connection = lambda: connection
+    return connection
+
+
+class NoSchema:
+    def get(self):
+        return None
+
+
+def test_row_cap_stops_forwarding_and_drops_the_connection():
+    connection = connect(FakeConnection(rows(10)))
+    seen = []
+    result = run_sql_query("SELECT * FROM t", max_rows=3, use_cache=False, on_row=seen.append)
+    assert seen == rows(3) and list(result) == rows(3)
+    assert result.truncated and result.truncated_reason == "row limit of 3 reached"
+    # Rows were left unread, so the connection is not returned to the pool
+    assert connection.invalidated and not connection.closed
+
+
+def test_byte_cap_stops_before_the_row_that_crosses_it():
+    connect(FakeConnection(rows(10)))
+    seen = []
+    one_row = sql_runner._estimate_row_bytes(rows(1)[0])
+    result = run_sql_query("SELECT * FROM t", max_bytes=one_row * 2 + 1, use_cache=False, on_row=seen.append)
+    assert len(seen) == 2 and len(result) == 2
+    assert result.truncated_reason == f"size limit of {one_row * 2 + 1} bytes reached"
+
+
+def test_fetch_page_forwards_only_the_page_rows():
+    cost_guard._SERVER_FLAVOR = "mysql"
+    connection = connect(FakeConnection(rows(5)))
+    seen = []
+    page, info = fetch_page("SELECT * FROM t", "SELECT * FROM t", page_size=3,
+                            run=lambda sql, **kw: run_sql_query(sql, use_cache=False, **kw),
+                            schema=NoSchema(), on_row=seen.append)
+    # The look-ahead row tells fetch_page there is a next page but is not part of this one
+    assert seen == rows(3) and list(page) == rows(3)
+    assert info["has_more"] and connection.statements[0].endswith("LIMIT 4 OFFSET 0")
+
+
+def run_pipeline(connection, page_size=3, on_event=None):
+    async def generated_sql(question, llm_limit=None):
+        return "SELECT id, name FROM master_customer"
+
+    async def analysis(question, data, llm_limit=None):
+        yield f"{len(data)} customers."
+
+    saved = (query_pipeline.agenerate_sql, query_pipeline.check_sql_cost, query_pipeline.run_sql_query,
+             query_pipeline.astream_analysis, pagination.schema_registry)
+    query_pipeline.agenerate_sql = generated_sql
+    query_pipeline.check_sql_cost = lambda sql: sql
+    query_pipeline.run_sql_query = lambda sql, **kw: run_sql_query(sql, use_cache=False, **kw)
+    query_pipeline.astream_analysis = analysis
+    pagination.schema_registry = NoSchema()
+    cost_guard._SERVER_FLAVOR = "mysql"
+    connect(connection)
+
+    async def collect():
+        events = []
+        async for event, payload in stream_query_pipeline("customers", page_size, stream_answer=True,
+                                                          stream_rows=True):
+            events.append((event, payload))
+            if on_event:
+                on_event(event, payload)
+        return events
+
+    try:
+        return asyncio.run(collect())
+    finally:
+        (query_pipeline.agenerate_sql, query_pipeline.check_sql_cost, query_pipeline.run_sql_query,
+         query_pipeline.astream_analysis, pagination.schema_registry) = saved
+
+
+def test_pipeline_yields_rows_before_the_cursor_is_finished():
+    release = threading.Event()
+    saved = sql_runner.FETCH_BATCH_SIZE
+    sql_runner.FETCH_BATCH_SIZE = 2
+    # The second fetchmany() blocks until the first rows have reached the consumer
+    on_event = lambda event, payload: release.set() if event == "row" else None
+    try:
+        events = run_pipeline(FakeConnection(rows(5), release), page_size=4, on_event=on_event)
+    finally:
+        sql_runner.FETCH_BATCH_SIZE = saved
+    names = [event for event, _ in events]
+    assert names == ["sql", "row", "row", "row", "row", "data", "token", "answer"]
+    assert [payload["row"] for event, payload in events if event == "row"] == rows(4)
+    data = dict(events)["data"]
+    assert data["page"]["has_more"] and len(data["data"]) == 4
+
+
+def fake_pipeline(events):
+    async def pipeline(question, page_size=None, page_state=None, response_format="rows", **kwargs):
+        for event in events:
+            yield event
+    return pipeline
+
+
+PIPELINE_EVENTS = [
+    ("sql", {"sql": "SELECT id FROM t"}),
+    ("row", {"row": {"id": 1}}),
+    ("row", {"row": {"id": 2}}),
+    ("data", {"data": [{"id": 1}, {"id": 2}], "truncated": True, "cached": False,
+              "page": {"has_more": False, "next_cursor": None}}),
+    ("token", {"text": "Two ids."}),
+    ("answer", {"answer": "Two ids.", "status": "success"}),
+]
+
+
+def test_ndjson_framing():
+    saved = main.stream_query_pipeline
+    main.stream_query_pipeline = fake_pipeline(PIPELINE_EVENTS)
+    try:
+        response = TestClient(main.app).post("/query/stream", json={"question": "ids"})
+    finally:
+        main.stream_query_pipeline = saved
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.text.endswith("\n")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["type"] for line in lines] == ["meta", "row", "row", "token", "end"]
+    assert lines[0] == {"type": "meta", "question": "ids", "sql": "SELECT id FROM t"}
+    assert lines[1]["data"] == {"id": 1}
+    end = lines[-1]
+    assert end["row_count"] == 2 and end["truncated"] is True and end["status"] == "success"
+    assert "total" in end["timings"]
+
+
+def test_sse_framing():
+    events = [event for event in PIPELINE_EVENTS if event[0] != "row"]
+    saved = main.stream_query_pipeline
+    main.stream_query_pipeline = fake_pipeline(events)
+    try:
+        response = TestClient(main.app).get("/query/events", params={"question": "ids"})
+    finally:
+        main.stream_query_pipeline = saved
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = response.text.split("\n\n")
+    assert frames[-1] == ""
+    parsed = []
+    for frame in frames[:-1]:
+        event_line, data_line = frame.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        parsed.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    assert [name for name, _ in parsed] == ["start", "sql", "data", "token", "answer", "done"]
+    assert parsed[2][1]["truncated"] is True
+
+
+if __name__ == "__main__":
+    test_row_cap_stops_forwarding_and_drops_the_connection()
+    test_byte_cap_stops_before_the_row_that_crosses_it()
+    test_fetch_page_forwards_only_the_page_rows()
+    test_pipeline_yields_rows_before_the_cursor_is_finished()
+    test_ndjson_framing()
+    test_sse_framing()
+    print("All streaming checks passed.")
@@ -0,0 +1,113 @@
+import time
+
+import result_cache
+from result_cache import ResultCache, TableWatermarks
+
+
+class FakeWatermarks:
+    """Table -> watermark values the test moves by hand."""
+
+    def __init__(self, **values):
+        self.values = values
+        self.reads = 0
+
+    def get(self, tables):
+        self.reads += 1
+        return {t: self.values[t] for t in tables if t in self.values}
+
+    def clear(self):
+        pass
+
+
+SQL = "SELECT customer_name FROM master_customer WHERE id = 7"
+
+
+def test_hit_until_a_referenced_table_moves():
+    marks = FakeWatermarks(master_customer="10@2024-05-01")
+    cache = ResultCache(watermarks=marks)
+    cache.put(SQL, [{"customer_name": "Asha"}], cache.snapshot(SQL))
+    # Layout, case and backquotes do not change the key
+    assert cache.get("select customer_name from `master_customer` where id = 7")[0] == [{"customer_name": "Asha"}]
+    marks.values["master_customer"] = "11@2024-05-02"
+    assert cache.get(SQL) is None
+    assert cache.stats()["invalidated"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_params_variant_and_ttl_are_part_of_the_key():
+    cache = ResultCache(ttl=0.05, watermarks=FakeWatermarks(master_customer="1@"))
+    cache.put(SQL, [{"n": 1}], {"master_customer": "1@"}, params=(7,), variant="columnar")
+    assert cache.get(SQL, (7,)) is None
+    assert cache.get(SQL, (8,), "columnar") is None
+    assert cache.get(SQL, (7,), "columnar") is not None
+    time.sleep(0.06)
+    assert cache.get(SQL, (7,), "columnar") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_queries_without_watermarks_are_not_cached_and_lru_evicts():
+    cache = ResultCache(max_entries=2, watermarks=FakeWatermarks(t="1@"))
+    cache.put("SELECT 1", [{"x": 1}], {})
+    assert cache.stats()["stores"] == 0
+    for n in range(3):
+        cache.put(f"SELECT * FROM t WHERE id = {n}", [{"id": n}], {"t": "1@"})
+    assert cache.get("SELECT * FROM t WHERE id = 0") is None
+    assert cache.get("SELECT * FROM t WHERE id = 2") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self._result = None
+
+    def execute(self, sql, params=None):
+        self.db.statements.append(sql)
+        if "information_schema" in sql:
+            self._result = [(t, c) for t, columns in self.db.columns.items() if t in params for c in columns]
+        else:
+            self._result = [tuple(self.db.marks[t] for t in self.db.columns if f"`{t}`" in sql)]
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0]
+
+    def close(self):
+        pass
+
+
+class FakeDb:
+    def __init__(self):
+        self.columns = {"billing_transactions": ["id", "created_at"], "master_customer": ["id", "updated_at"]}
+        self.marks = {"billing_transactions": "5@2024-05-01", "master_customer": "2@2024-04-01"}
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+def test_watermarks_read_all_tables_in_one_query_and_skip_unknown_names():
+    db = FakeDb()
+    result_cache.get_db_connection = lambda: db
+    marks = TableWatermarks(check_interval=60)
+    values = marks.get(["billing_transactions", "master_customer", "recent"])
+    assert values == {"billing_transactions": "5@2024-05-01", "master_customer": "2@2024-04-01"}
+    (select,) = [s for s in db.statements if "information_schema" not in s]
+    assert "MAX(`created_at`)" in select and "MAX(`updated_at`)" in select
+    # Within the check interval nothing is read again
+    db.marks["master_customer"] = "3@2024-04-02"
+    assert marks.get(["master_customer"]) == {"master_customer": "2@2024-04-01"}
+    assert len(db.statements) == 2
+
+
+if __name__ == "__main__":
+    test_hit_until_a_referenced_table_moves()
+    test_params_variant_and_ttl_are_part_of_the_key()
+    test_queries_without_watermarks_are_not_cached_and_lru_evicts()
+    test_watermarks_read_all_tables_in_one_query_and_skip_unknown_names()
+    print("All result cache checks passed.")
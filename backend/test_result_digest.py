@@ -0,0 +1,46 @@
+import datetime
+from decimal import Decimal
+
+from result_digest import compact_result, estimate_tokens
+
+small = [
+    {"service_name": "Hair", "revenue": Decimal("5000.50"), "last_sold": datetime.date(2024, 5, 1)},
+    {"service_name": "Nails", "revenue": Decimal("300.00"), "last_sold": None},
+]
+
+large = [
+    {"customer_name": f"Customer {i}", "city": "ABC"[i % 3], "spent": Decimal(100 + i * 7), "visits": i % 30 + 1}
+    for i in range(300)
+]
+
+
+def test_small_results_are_sent_as_a_table():
+    assert compact_result(small) == (
+        "columns: service_name | revenue | last_sold\n"
+        "Hair | 5000.5 | 2024-05-01\n"
+        "Nails | 300 | -"
+    )
+
+
+def test_large_results_are_aggregated_within_budget():
+    for budget in (60, 150, 300):
+        digest = compact_result(large, budget)
+        assert estimate_tokens(digest) <= budget, (budget, digest)
+    digest = compact_result(large, 300)
+    assert digest.startswith("rows: 300; columns: customer_name | city | spent | visits")
+    assert "spent: sum=" in digest and "max=2193 (Customer 299)" in digest
+    assert "Decimal(" not in digest
+
+
+def test_trend_slope_for_time_series():
+    series = [{"month": f"2024-{m:02d}", "revenue": 1000 * m} for m in range(1, 13)] * 5
+    digest = compact_result(series, 80)
+    assert "trend of revenue by month:" in digest
+
+
+if __name__ == "__main__":
+    print(compact_result(large, 150))
+    test_small_results_are_sent_as_a_table()
+    test_large_results_are_aggregated_within_budget()
+    test_trend_slope_for_time_series()
+    print("All digest checks passed.")
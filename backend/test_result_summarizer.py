@@ -0,0 +1,100 @@
+import datetime
+from decimal import Decimal
+
+from result_summarizer import summarize_result, format_number, humanize
+
+cases = [
+    ("What is the total revenue?", [{"revenue": Decimal("452000.00")}], "Revenue is 4,52,000."),
+    ("What is last month's revenue?", [{"revenue": Decimal("120500.50")}], "Revenue for last month is 1,20,500.5."),
+    ("How many customers are there?", [{"COUNT(*)": 320}], "Count is 320."),
+    (
+        "How many times has Alice visited?",
+        [{"customer_name": "Alice", "visitcnt": 7}],
+        "For Alice, visitcnt is 7.",
+    ),
+    (
+        "compare this month revenue with last month",
+        [
+            {"period": "This Month", "revenue": Decimal("120000")},
+            {"period": "Last Month", "revenue": Decimal("100000")},
+            {"period": "Last Year", "revenue": Decimal("900000")},
+            {"period": "Total", "revenue": Decimal("2500000")},
+        ],
+        "Revenue for this month is 1,20,000, up 20% from last month (1,00,000); last year 9,00,000, total 25,00,000.",
+    ),
+    (
+        "Show revenue trend for last 3 months",
+        [
+            {"month": "2024-06", "revenue": Decimal("210000")},
+            {"month": "2024-05", "revenue": Decimal("200000")},
+            {"month": "2024-04", "revenue": Decimal("250000")},
+        ],
+        "Revenue across 3 months totals 6,60,000; the latest (2024-06) is 2,10,000, up 5% from 2024-05, "
+        "with a peak of 2,50,000 in 2024-04 and a low of 2,00,000 in 2024-05.",
+    ),
+    (
+        "Show top 3 services by revenue",
+        [
+            {"service_name": "Hair Cut", "revenue": Decimal("50000")},
+            {"service_name": "Facial", "revenue": Decimal("30000")},
+            {"service_name": "Nails", "revenue": Decimal("20000")},
+        ],
+        "Hair Cut leads revenue with 50,000 (50% of the 1,00,000 total across 3 services), "
+        "followed by Facial (30,000) and Nails (20,000).",
+    ),
+    (
+        "Which products have never sold?",
+        [{"product_name": "Shampoo"}, {"product_name": "Serum"}],
+        "Found 2 products: Shampoo, Serum.",
+    ),
+]
+
+# Shapes the summarizer leaves to the LLM
+llm_cases = [
+    # Low stock: unordered, string volumes
+    [
+        {"product_name": "Gel", "volume": "2", "min_stock_level": 5},
+        {"product_name": "Wax", "volume": "1", "min_stock_level": 10},
+        {"product_name": "Oil", "volume": "3", "min_stock_level": 4},
+    ],
+    # Wide profile row
+    [{"id": 1, "customer_name": "Raj", "gender": "M", "visitcnt": 3, "mobile": "999", "email": "r@x"}],
+]
+
+
+def test_summaries():
+    for question, data, expected in cases:
+        assert summarize_result(question, data) == expected, question
+
+
+def test_unhandled_shapes_fall_back():
+    for data in llm_cases:
+        assert summarize_result("question", data) is None
+
+
+def test_formatting():
+    assert format_number(Decimal("4520000")) == "45,20,000"
+    assert format_number(-1234.5) == "-1,234.5"
+    assert format_number(999) == "999"
+    assert humanize("SUM(grand_total)") == "total grand total"
+    assert humanize("bt.total_spent") == "total spent"
+
+
+def test_time_series_with_dates():
+    data = [
+        {"date": datetime.date(2024, 6, 2), "revenue": 10},
+        {"date": datetime.date(2024, 6, 1), "revenue": 20},
+    ]
+    summary = summarize_result("daily revenue", data)
+    assert summary.startswith("Revenue across 2 dates totals 30; the latest (2024-06-02) is 10, down 50% from 2024-06-01")
+
+
+if __name__ == "__main__":
+    print("Testing result summarizer...")
+    for question, data, expected in cases:
+        print(f"  {question!r} -> {summarize_result(question, data)}")
+    test_summaries()
+    test_unhandled_shapes_fall_back()
+    test_formatting()
+    test_time_series_with_dates()
+    print("All summarizer checks passed.")
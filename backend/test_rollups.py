@@ -0,0 +1,141 @@
+import rollups
+from rollups import ROLLUPS, InsightRollups
+from schema_registry import SchemaSnapshot
+
+by_name = {rollup.name: rollup for rollup in ROLLUPS}
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeCursor:
+    """Answers the rollup job's reads from `watermark` and `batch`; records every statement."""
+
+    def __init__(self, watermark, batch, key_types=None):
+        self.watermark = watermark
+        self.batch = batch
+        self.key_types = key_types or {}      # existing rollup table -> key column type
+        self.executed = []
+        self._result = None
+
+    def execute(self, sql, params=()):
+        self.executed.append((" ".join(sql.split()), params))
+        if "FOR UPDATE" in sql:
+            self._result = [self.watermark]
+        elif sql.startswith("SELECT MAX(id)"):
+            self._result = [self.batch]
+        elif "information_schema" in sql:
+            key_type = self.key_types.get(params[0])
+            self._result = [(key_type,) if key_type else None]
+        else:
+            self._result = [None]
+
+    def fetchone(self):
+        return self._result[0]
+
+
+def test_delta_merges_additively_and_recompute_overwrites():
+    customers = by_name["customer_spend"]
+    delta = customers.delta_sql()
+    assert "WHERE (s.id > %s AND s.id <= %s) AND (s.customer_id IS NOT NULL)" in delta
+    assert "rollup_customer_spend.total_spent = rollup_customer_spend.total_spent + VALUES(total_spent)" in delta
+    assert "GREATEST(COALESCE(rollup_customer_spend.last_visit" in delta
+
+    sql, params = customers.recompute_sql([7, 9], 500)
+    assert "s.customer_id IN (%s, %s)) AND s.id <= %s" in sql
+    assert "rollup_customer_spend.total_spent = VALUES(total_spent)" in sql
+    assert params == [7, 9, 500]
+
+
+def test_daily_rollup_recomputes_by_day_range():
+    sql, params = by_name["daily_revenue"].recompute_sql(["2024-05-01"], 10)
+    assert "s.created_at >= %s AND s.created_at < %s + INTERVAL 1 DAY" in sql
+    assert params == ["2024-05-01", "2024-05-01", 10]
+    assert "GROUP BY DATE(s.created_at)" in sql
+
+
+def test_step_folds_batch_and_moves_watermark():
+    rollup = by_name["service_sales"]
+    conn, cursor = FakeConnection(), FakeCursor(watermark=(100, None, 1, None, 0), batch=(140, 40))
+    caught_up = InsightRollups()._step(conn, cursor, rollup, track_changes=False)
+    assert caught_up is True
+    statements = dict(cursor.executed)
+    assert statements[rollup.delta_sql()] == (100, 140)
+    update = [params for sql, params in cursor.executed if sql.startswith("UPDATE rollup_watermarks")]
+    assert update == [(140, None, True, "service_sales")]
+    assert conn.commits == 1
+
+
+def test_step_without_new_rows_keeps_watermark():
+    rollup = by_name["product_sales"]
+    cursor = FakeCursor(watermark=(100, None, 1, None, 0), batch=(None, 0))
+    InsightRollups()._step(FakeConnection(), cursor, rollup, track_changes=False)
+    assert not any(sql.startswith("INSERT INTO rollup_product_sales") for sql, _ in cursor.executed)
+    assert cursor.executed[-1][1][0] == 100
+
+
+# billing_transactions.customer_id is varchar(50) DEFAULT '0' in the salon schema
+schema = SchemaSnapshot([
+    ("billing_transactions", "id", "bigint", "PRI", "NO"),
+    ("billing_transactions", "customer_id", "varchar(50)", "", "YES"),
+    ("billing_trans_summary", "service_id", "varchar(20)", "MUL", "YES"),
+    ("billing_trans_inventory", "product_id", "int", "MUL", "YES"),
+])
+
+
+def test_key_columns_copy_the_source_type():
+    assert "customer_id varchar(50) PRIMARY KEY" in by_name["customer_spend"].ddl(schema)
+    assert "service_id varchar(20) PRIMARY KEY" in by_name["service_sales"].ddl(schema)
+    assert "product_id int PRIMARY KEY" in by_name["product_sales"].ddl(schema)
+    assert "day DATE PRIMARY KEY" in by_name["daily_revenue"].ddl(schema)
+    sql, params = by_name["customer_spend"].recompute_sql(["CUST-0042", "0"], 99)
+    assert params == ["CUST-0042", "0", 99]
+
+
+def test_key_type_change_rebuilds_the_rollup():
+    job = InsightRollups()
+    job._schema = lambda: schema
+    cursor = FakeCursor(None, None, key_types={"rollup_customer_spend": "bigint", "rollup_product_sales": "int"})
+    job._ensure_tables(cursor)
+    statements = [sql for sql, _ in cursor.executed]
+    assert "DROP TABLE rollup_customer_spend" in statements
+    assert "DROP TABLE rollup_product_sales" not in statements
+    resets = [params for sql, params in cursor.executed if sql.startswith("UPDATE rollup_watermarks")]
+    assert resets == [("customer_spend",)]
+
+
+def test_unknown_key_type_fails_the_run():
+    try:
+        by_name["customer_spend"].ddl(None)
+    except RuntimeError as e:
+        assert "billing_transactions.customer_id" in str(e)
+    else:
+        raise AssertionError("expected RuntimeError")
+
+
+def test_disabled_rollups_are_never_ready():
+    enabled, rollups.ROLLUPS_ENABLED = rollups.ROLLUPS_ENABLED, False
+    try:
+        assert InsightRollups().ready(FakeCursor(None, None)) is False
+    finally:
+        rollups.ROLLUPS_ENABLED = enabled
+
+
+if __name__ == "__main__":
+    test_delta_merges_additively_and_recompute_overwrites()
+    test_daily_rollup_recomputes_by_day_range()
+    test_step_folds_batch_and_moves_watermark()
+    test_step_without_new_rows_keeps_watermark()
+    test_key_columns_copy_the_source_type()
+    test_key_type_change_rebuilds_the_rollup()
+    test_unknown_key_type_fails_the_run()
+    test_disabled_rollups_are_never_ready()
+    print("All rollup checks passed.")
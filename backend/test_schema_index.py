@@ -0,0 +1,53 @@
+from schema_index import SchemaIndex, tokenize
+
+tables = {
+    "master_customer": ["id", "customer_name", "gender", "visitcnt", "mobile", "created_at"],
+    "billing_transactions": ["id", "bill_no", "customer_id", "grand_total", "payment_mode", "created_at"],
+    "billing_trans_summary": ["id", "bill_no", "service_id", "service_name", "qty", "grand_total"],
+    "appointment_transactions": ["id", "customer_id", "status", "payment_mode", "appointment_date"],
+    "master_employee": ["id", "employee_name", "designation"],
+    "master_inventory": ["id", "product_id", "product_name", "volume", "min_stock_level"],
+}
+values = {
+    "appointment_transactions": {"status": ["Pending", "Completed"], "payment_mode": ["UPI", "Cash"]},
+    "billing_trans_summary": {"service_name": ["Haircut", "Facial"]},
+}
+
+index = SchemaIndex(tables, values, version="test")
+
+
+def test_tokenize_splits_and_stems():
+    assert tokenize("How many Customers paid by payment_mode?") == ["customer", "paid", "payment", "mode"]
+
+
+def test_tables_ranked_by_question():
+    assert index.select_tables("How many customers are there?")[0] == "master_customer"
+    assert index.select_tables("list our staff")[0] == "master_employee"
+    assert index.select_tables("products low on stock") == ["master_inventory"]
+
+
+def test_sampled_values_match():
+    # "pending" only appears as a status value; "haircuts" as a service name
+    assert index.select_tables("which bookings are pending")[0] == "appointment_transactions"
+    assert "billing_trans_summary" in index.select_tables("how many haircuts this month")
+
+
+def test_unrelated_question_selects_nothing():
+    assert index.select_tables("what is the weather like") == []
+
+
+def test_wide_tables_are_pruned_to_relevant_columns():
+    wide = {"master_customer": ["id", "customer_name"] + [f"extra_{i}" for i in range(20)] + ["birthday"]}
+    columns = SchemaIndex(wide).select_columns("master_customer", "customers with birthday today", max_columns=5)
+    assert columns == ["id", "customer_name", "birthday"]
+
+
+if __name__ == "__main__":
+    for q in ["How many customers are there?", "which bookings are pending", "how many haircuts this month"]:
+        print(f"  {q!r} -> {index.score(q)}")
+    test_tokenize_splits_and_stems()
+    test_tables_ranked_by_question()
+    test_sampled_values_match()
+    test_unrelated_question_selects_nothing()
+    test_wide_tables_are_pruned_to_relevant_columns()
+    print("All schema index checks passed.")
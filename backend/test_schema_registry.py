@@ -0,0 +1,66 @@
+from schema_registry import SchemaRegistry, SchemaSnapshot
+
+rows = [
+    ("billing_transactions", "id", "int", "PRI", "NO"),
+    ("billing_transactions", "grand_total", "decimal(10,2)", "", "YES"),
+    ("master_customer", "id", "int", "PRI", "NO"),
+    ("master_customer", "mobile", "varchar(15)", "UNI", "YES"),
+]
+
+
+def test_snapshot_from_information_schema_rows():
+    schema = SchemaSnapshot(rows)
+    assert schema.tables == ["billing_transactions", "master_customer"]
+    assert schema.columns["master_customer"] == ["id", "mobile"]
+    assert schema.descriptions["billing_transactions"] == (
+        "Table billing_transactions: billing_transactions.id, billing_transactions.grand_total"
+    )
+    assert schema.indexed_columns("MASTER_CUSTOMER") == ["id", "mobile"]
+
+
+def test_version_tracks_types_and_keys():
+    altered = [r if r[1] != "grand_total" else r[:2] + ("decimal(12,2)",) + r[3:] for r in rows]
+    assert SchemaSnapshot(rows).version == SchemaSnapshot(list(rows)).version
+    assert SchemaSnapshot(rows).version != SchemaSnapshot(altered).version
+
+
+def test_rollup_tables_are_hidden():
+    schema = SchemaSnapshot(rows + [("rollup_daily_revenue", "day", "date", "PRI", "NO")])
+    assert not schema.has_table("rollup_daily_revenue")
+    assert schema.version == SchemaSnapshot(rows).version
+
+
+def test_refresh_swaps_and_notifies_only_on_change():
+    loads = [rows, rows, rows + [("master_employee", "id", "int", "PRI", "NO")]]
+    registry, changes = SchemaRegistry(loader=lambda: SchemaSnapshot(loads.pop(0))), []
+    registry.on_change(lambda old, new: changes.append((old, new)))
+
+    first = registry.get()
+    assert registry.refresh() is False
+    assert registry.refresh() is True
+    assert registry.get().has_table("master_employee")
+    assert changes == [(None, first.version), (first.version, registry.get().version)]
+
+
+def test_failed_refresh_keeps_last_snapshot():
+    def loader():
+        if calls:
+            raise ConnectionError("MySQL went away")
+        calls.append(1)
+        return SchemaSnapshot(rows)
+
+    calls = []
+    registry = SchemaRegistry(loader=loader)
+    version = registry.get().version
+    assert registry.refresh() is False
+    assert registry.get().version == version
+    assert registry.stats()["last_error"] == "MySQL went away"
+
+
+if __name__ == "__main__":
+    test_snapshot_from_information_schema_rows()
+    test_version_tracks_types_and_keys()
+    test_rollup_tables_are_hidden()
+    test_refresh_swaps_and_notifies_only_on_change()
+    test_failed_refresh_keeps_last_snapshot()
+    print("All schema registry checks passed.")
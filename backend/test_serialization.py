@@ -0,0 +1,64 @@
+import datetime
+import decimal
+import json
+
+from mysql.connector import FieldType
+from serialization import column_type_name, dumps_bytes, json_default, to_columnar
+from sql_runner import QueryResult
+
+ROWS = [
+    (1, "Priya Sharma", decimal.Decimal("1250.500"), datetime.date(2024, 5, 1),
+     datetime.datetime(2024, 5, 1, 18, 30), None),
+    (2, "Arjun Kumar", decimal.Decimal("0.000"), datetime.date(2024, 5, 2),
+     datetime.datetime(2024, 5, 2, 9, 0), datetime.timedelta(hours=1, minutes=5)),
+]
+COLUMNS = ["id", "customer", "grand_total", "bill_date", "created_at", "duration"]
+TYPE_CODES = [FieldType.LONGLONG, FieldType.VAR_STRING, FieldType.NEWDECIMAL, FieldType.DATE,
+              FieldType.DATETIME, FieldType.TIME]
+
+
+def columnar_result():
+    return QueryResult(ROWS, columns=COLUMNS, types=[column_type_name(t) for t in TYPE_CODES], columnar=True)
+
+
+def test_type_names():
+    assert columnar_result().types == ["int", "string", "decimal", "date", "datetime", "time"]
+
+
+def test_columnar_round_trip():
+    result = columnar_result()
+    payload = json.loads(dumps_bytes(to_columnar(result)))
+    assert payload["columns"] == COLUMNS
+    assert payload["types"] == result.types
+    rebuilt = [dict(zip(payload["columns"], row)) for row in payload["rows"]]
+    # Same values as the row-object format, with Decimal, dates and TIME encoded for JSON
+    expected = json.loads(dumps_bytes(result.to_dicts()))
+    assert rebuilt == expected
+    assert rebuilt[0] == {
+        "id": 1, "customer": "Priya Sharma", "grand_total": 1250.5, "bill_date": "2024-05-01",
+        "created_at": "2024-05-01T18:30:00", "duration": None,
+    }
+    assert rebuilt[1]["duration"] == "1:05:00"
+
+
+def test_fast_path_matches_the_stdlib_encoder():
+    payload = to_columnar(columnar_result())
+    stdlib = json.dumps(payload, default=json_default, separators=(",", ":")).encode("utf-8")
+    # orjson (when installed) and the stdlib fallback produce the same document
+    assert json.loads(dumps_bytes(payload)) == json.loads(stdlib)
+    assert dumps_bytes({"x": decimal.Decimal("2.5")}) == b'{"x":2.5}'
+
+
+def test_json_default_covers_mysql_values():
+    assert json_default(decimal.Decimal("3.10")) == 3.1
+    assert json_default(datetime.time(9, 30)) == "09:30:00"
+    assert json_default(b"caf\xc3\xa9") == "café"
+    assert json_default({"b", "a"}) == ["a", "b"]
+
+
+if __name__ == "__main__":
+    test_type_names()
+    test_columnar_round_trip()
+    test_fast_path_matches_the_stdlib_encoder()
+    test_json_default_covers_mysql_values()
+    print("All serialization checks passed.")
@@ -0,0 +1,66 @@
+import asyncio
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_run():
+    async def scenario():
+        flights, runs = SingleFlight(), []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return {"answer": 42}
+
+        results = await asyncio.gather(*(flights.do("q", work) for _ in range(5)))
+        return runs, results
+
+    runs, results = asyncio.run(scenario())
+    assert len(runs) == 1
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert all(result == {"answer": 42} for result, _ in results)
+
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def boom():
+            await asyncio.sleep(0.01)
+            raise ValueError("db down")
+
+        return await asyncio.gather(*(flights.do("q", boom) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(scenario()))
+
+
+def test_work_cancelled_only_when_last_waiter_leaves():
+    async def scenario():
+        flights, cancelled = SingleFlight(), []
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        first = asyncio.ensure_future(flights.do("q", slow))
+        second = asyncio.ensure_future(flights.do("q", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        still_running = not cancelled
+        second.cancel()
+        await asyncio.sleep(0.01)
+        return still_running, bool(cancelled)
+
+    still_running, cancelled = asyncio.run(scenario())
+    assert still_running and cancelled
+
+
+if __name__ == "__main__":
+    test_concurrent_callers_share_one_run()
+    test_errors_reach_every_waiter()
+    test_work_cancelled_only_when_last_waiter_leaves()
+    print("All single-flight checks passed.")
@@ -0,0 +1,112 @@
+import os
+import tempfile
+
+from sql_cache import SQLCache
+
+
+def new_cache(max_entries=100):
+    path = os.path.join(tempfile.mkdtemp(), "sql_cache.db")
+    return SQLCache(path=path, max_entries=max_entries), path
+
+
+def test_entries_survive_a_restart_with_hit_counters():
+    cache, path = new_cache()
+    cache.put("total revenue", "v1", "llama3.2:1b", "SELECT SUM(grand_total) FROM billing_transactions")
+    assert cache.get("total revenue", "v1", "llama3.2:1b") == "SELECT SUM(grand_total) FROM billing_transactions"
+    # Schema version and model are part of the key
+    assert cache.get("total revenue", "v2", "llama3.2:1b") is None
+    assert cache.get("total revenue", "v1", "llama3.2:3b") is None
+    cache.close()
+
+    reopened = SQLCache(path=path)
+    (entry,) = reopened.entries()
+    assert entry["question"] == "total revenue" and entry["hits"] == 1
+    assert reopened.get("total revenue", "v1", "llama3.2:1b") is not None
+    assert reopened.stats()["hits"] == 1 and reopened.stats()["misses"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache, path = new_cache(max_entries=2)
+    cache.put("a", "v1", "m", "SELECT 1")
+    cache.put("b", "v1", "m", "SELECT 2")
+    cache.get("a", "v1", "m")              # "b" is now the oldest
+    cache.put("c", "v1", "m", "SELECT 3")
+    assert cache.get("b", "v1", "m") is None
+    assert cache.get("a", "v1", "m") == "SELECT 1" and cache.get("c", "v1", "m") == "SELECT 3"
+    assert cache.stats()["evictions"] == 1
+    cache.close()
+    # The evicted row is gone from disk as well
+    assert sorted(e["question"] for e in SQLCache(path=path).entries()) == ["a", "c"]
+
+
+def test_reload_keeps_only_the_most_recent_entries():
+    cache, path = new_cache(max_entries=10)
+    for n in range(5):
+        cache.put(f"q{n}", "v1", "m", f"SELECT {n}")
+    cache.close()
+    reopened = SQLCache(path=path, max_entries=3)
+    assert [e["question"] for e in reopened.entries()] == ["q4", "q3", "q2"]
+
+
+def test_discard_removes_an_entry_from_memory_and_disk():
+    cache, path = new_cache()
+    cache.put("low stock", "v1", "m", "SELECT bad")
+    cache.discard("low stock", "v1", "m")
+    assert cache.get("low stock", "v1", "m") is None
+    cache.close()
+    assert SQLCache(path=path).entries() == []
+
+
+def test_purge_by_question_and_everything():
+    cache, path = new_cache()
+    cache.put("a", "v1", "m", "SELECT 1")
+    cache.put("a", "v1", "m2", "SELECT 1")
+    cache.put("b", "v1", "m", "SELECT 2")
+    cache.put_repair("fp", "v1", "SELECT fixed")
+    assert cache.purge("a") == 2
+    assert cache.get("b", "v1", "m") == "SELECT 2"
+    # Repairs are only dropped by a full purge
+    assert cache.get_repair("fp", "v1") == "SELECT fixed"
+    assert cache.purge() == 1
+    assert cache.stats()["entries"] == 0 and cache.get_repair("fp", "v1") is None
+    cache.close()
+    reopened = SQLCache(path=path)
+    assert reopened.entries() == [] and reopened.stats()["repairs"] == 0
+
+
+def test_purge_versions_keeps_the_current_schema():
+    cache, path = new_cache()
+    cache.put("a", "v1", "m", "SELECT 1")
+    cache.put("a", "v2", "m", "SELECT 1")
+    cache.put_repair("fp", "v1", "SELECT old")
+    cache.put_repair("fp", "v2", "SELECT new")
+    assert cache.purge_versions(keep="v2") == 1
+    assert cache.get("a", "v1", "m") is None and cache.get("a", "v2", "m") == "SELECT 1"
+    assert cache.get_repair("fp", "v1") is None and cache.get_repair("fp", "v2") == "SELECT new"
+    cache.close()
+    reopened = SQLCache(path=path)
+    assert [(e["question"], e["schema_version"]) for e in reopened.entries()] == [("a", "v2")]
+    assert reopened.get_repair("fp", "v1") is None and reopened.get_repair("fp", "v2") == "SELECT new"
+
+
+def test_repairs_persist_and_are_bounded():
+    cache, path = new_cache(max_entries=2)
+    for n in range(3):
+        cache.put_repair(f"fp{n}", "v1", f"SELECT {n}")
+    assert cache.get_repair("fp0", "v1") is None
+    assert cache.get_repair("fp2", "v1") == "SELECT 2"
+    assert cache.stats()["repair_hits"] == 1
+    cache.close()
+    reopened = SQLCache(path=path, max_entries=2)
+    assert reopened.get_repair("fp1", "v1") == "SELECT 1" and reopened.get_repair("fp0", "v1") is None
+
+
+if __name__ == "__main__":
+    test_entries_survive_a_restart_with_hit_counters()
+    test_least_recently_used_entry_is_evicted_at_capacity()
+    test_reload_keeps_only_the_most_recent_entries()
+    test_discard_removes_an_entry_from_memory_and_disk()
+    test_purge_by_question_and_everything()
+    test_purge_versions_keeps_the_current_schema()
+    test_repairs_persist_and_are_bounded()
+    print("All SQL cache checks passed.")
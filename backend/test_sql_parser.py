@@ -0,0 +1,63 @@
+from sql_parser import parse_sql, sql_shape, tokenize
+
+
+def test_keywords_in_literals_and_names_are_not_rejected():
+    for sql in (
+        "SELECT COUNT(*) FROM appointment_transactions WHERE status = 'Cancelled'",
+        "SELECT * FROM master_customer WHERE notes LIKE '%REPLACE; DROP TABLE x%'",
+        "SELECT REPLACE(customer_name, 'Mr ', '') FROM master_customer",
+        "SELECT created_at, `update` FROM billing_transactions;",
+        "SELECT 1 -- DELETE FROM x",
+    ):
+        assert parse_sql(sql).is_read_only, sql
+
+
+def test_writes_and_side_effects_are_rejected():
+    for sql, problem in (
+        ("SELECT 1; DROP TABLE master_customer", "multiple statements"),
+        ("SELECT * FROM master_customer INTO OUTFILE '/tmp/c.csv'", "INTO is not allowed"),
+        ("SELECT SLEEP(10)", "function SLEEP() is not allowed"),
+        ("SELECT BENCHMARK(1000000, MD5('x'))", "function BENCHMARK() is not allowed"),
+        ("SELECT /*!50000 DROP TABLE x */ 1", "executable comment"),
+        ("WITH c AS (SELECT 1) DELETE FROM master_customer", "DELETE is not allowed"),
+        ("SELECT * FROM master_customer FOR UPDATE", "UPDATE is not allowed"),
+        ("REPLACE INTO master_customer VALUES (1)", "not a SELECT statement"),
+    ):
+        assert parse_sql(sql).problem == problem, sql
+    assert "unterminated" in parse_sql("SELECT 'open").problem
+
+
+def test_tables_skip_ctes_derived_tables_and_schema_prefix():
+    parsed = parse_sql(
+        "WITH recent AS (SELECT customer_id FROM billing_transactions) "
+        "SELECT c.customer_name FROM salonpos.master_customer c "
+        "JOIN recent r ON r.customer_id = c.id, (SELECT 1 AS x FROM dual) d "
+        "WHERE EXISTS (SELECT 1 FROM `appointment_transactions` a WHERE a.customer_id = c.id)"
+    )
+    assert parsed.tables == ["billing_transactions", "master_customer", "appointment_transactions"]
+    assert parsed.ctes == ["recent"]
+    assert parsed.aliases["d"] is None
+
+
+def test_canonical_ignores_layout_case_and_aliases():
+    a = parse_sql("SELECT c.name FROM master_customer AS c WHERE c.id = 7")
+    b = parse_sql("select  cust.name\nfrom `master_customer` cust where cust.id=7;")
+    assert a.canonical() == b.canonical()
+    assert a.canonical() != parse_sql("SELECT c.name FROM master_customer c WHERE c.id = 8").canonical()
+    # A bare name matching an alias is a column, not the alias
+    assert parse_sql("SELECT c FROM t c").canonical() != parse_sql("SELECT d FROM t d").canonical()
+
+
+def test_shape_drops_literals():
+    assert sql_shape("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'a'") == \
+        sql_shape("SELECT * FROM t WHERE id IN (9) AND name = 'b'")
+    assert [t.kind for t in tokenize("a.b >= 'x'")] == ["word", "op", "word", "op", "string"]
+
+
+if __name__ == "__main__":
+    test_keywords_in_literals_and_names_are_not_rejected()
+    test_writes_and_side_effects_are_rejected()
+    test_tables_skip_ctes_derived_tables_and_schema_prefix()
+    test_canonical_ignores_layout_case_and_aliases()
+    test_shape_drops_literals()
+    print("All SQL parser checks passed.")
@@ -0,0 +1,134 @@
+import asyncio
+import contextlib
+import json
+
+import sql_repair
+from sql_repair import arepair_and_run
+
+
+class DbError(Exception):
+    def __init__(self, errno: int, msg: str):
+        super().__init__(msg)
+        self.errno = errno
+        self.msg = msg
+
+
+class FakeClient:
+    """Answers each repair request with the next SQL in `replies`, after `delay` seconds."""
+
+    def __init__(self, replies, delay: float = 0.0, llm_limit=None):
+        self.replies = list(replies)
+        self.delay = delay
+        self.llm_limit = llm_limit
+        self.calls = 0
+        self.slot_held = []     # whether the LLM slot was taken during each call
+
+    async def chat(self, **request):
+        self.calls += 1
+        if self.llm_limit is not None:
+            self.slot_held.append(self.llm_limit.locked())
+        await asyncio.sleep(self.delay)
+        return {"message": {"content": json.dumps({"sql": self.replies.pop(0)})}}
+
+
+@contextlib.contextmanager
+def fakes(client, **settings):
+    """Replaces the model, the repair caches and schema lookups in sql_repair."""
+    patched = {
+        "get_async_client": lambda: client,
+        "record_llm": lambda model, response: None,
+        "_repair_request": lambda question, sql, error: {"model": "fake"},
+        "_cached_repair": lambda sql: None,
+        "suggest_column_fix": lambda sql, error: None,
+        "_store_repair": lambda question, broken, sql: None,
+        **settings,
+    }
+    saved = {name: getattr(sql_repair, name) for name in patched}
+    try:
+        for name, value in patched.items():
+            setattr(sql_repair, name, value)
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(sql_repair, name, value)
+
+
+def repair(client, run, error=None, **settings):
+    with fakes(client, **settings):
+        error = error or DbError(1054, "Unknown column 'nme' in 'field list'")
+        return asyncio.run(arepair_and_run("q", "SELECT nme FROM t", error, run))
+
+
+def test_stops_after_max_attempts_and_raises_last_error():
+    client = FakeClient(["SELECT a FROM t", "SELECT b FROM t", "SELECT c FROM t"])
+    ran = []
+
+    async def run(sql):
+        ran.append(sql)
+        raise DbError(1054, f"still broken: {sql}")
+
+    try:
+        repair(client, run, SQL_REPAIR_MAX_ATTEMPTS=2)
+    except DbError as e:
+        assert str(e) == "still broken: SELECT b FROM t"
+    else:
+        raise AssertionError("expected the last database error")
+    assert client.calls == 2
+    assert ran == ["SELECT a FROM t", "SELECT b FROM t"]
+
+
+def test_budget_cuts_a_slow_model_call():
+    client = FakeClient(["SELECT name FROM t"], delay=1.0)
+
+    async def run(sql):
+        return []
+
+    try:
+        repair(client, run, SQL_REPAIR_BUDGET_MS=50)
+    except DbError:
+        pass
+    else:
+        raise AssertionError("expected the original error once the budget ran out")
+
+
+def test_unrepairable_errors_are_not_retried():
+    client = FakeClient([])
+
+    async def run(sql):
+        return []
+
+    try:
+        repair(client, run, error=DbError(1045, "Access denied"))
+    except DbError as e:
+        assert e.errno == 1045
+    else:
+        raise AssertionError("expected the original error")
+    assert client.calls == 0
+
+
+def test_llm_slot_is_held_only_for_the_model_call():
+    async def scenario():
+        llm_limit = asyncio.Semaphore(1)
+        client = FakeClient(["SELECT name FROM t"], llm_limit=llm_limit)
+        held_while_running = []
+
+        async def run(sql):
+            held_while_running.append(llm_limit.locked())
+            return ["row"]
+
+        with fakes(client):
+            result = await arepair_and_run("q", "SELECT nme FROM t", DbError(1054, "Unknown column"), run, llm_limit)
+        return result, client.slot_held, held_while_running
+
+    (sql, rows), slot_held, held_while_running = asyncio.run(scenario())
+    assert sql == "SELECT name FROM t" and rows == ["row"]
+    assert slot_held == [True]
+    assert held_while_running == [False]
+
+
+if __name__ == "__main__":
+    test_stops_after_max_attempts_and_raises_last_error()
+    test_budget_cuts_a_slow_model_call()
+    test_unrepairable_errors_are_not_retried()
+    test_llm_slot_is_held_only_for_the_model_call()
+    print("All SQL repair checks passed.")
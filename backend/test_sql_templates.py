@@ -0,0 +1,139 @@
+import os
+import re
+
+from sql_parser import parse_sql
+from sql_templates import match_template, extract_period, extract_top_n
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+cases = [
+    ("Show details for customer John Doe", "customer_profile", "'%John Doe%'"),
+    ("How many times has Alice visited?", "customer_visits", "'%Alice%'"),
+    ("How much did Bob spend?", "customer_spending", "'%Bob%'"),
+    ("What is O'Neil's total spending?", "customer_spending", "'%O''Neil%'"),
+    ("Which products are low on stock?", "low_stock", "min_stock_level"),
+    ("Which products have never sold?", "never_sold", "ti.id IS NULL"),
+    ("Show top 3 services by revenue", "top_services", "LIMIT 3"),
+    ("What are the most popular services?", "top_services", "SUM(qty)"),
+    ("Show revenue trend for last 6 months", "revenue_trend", "INTERVAL 6 MONTH"),
+    ("monthly revenue over the last twelve months", "revenue_trend", "INTERVAL 12 MONTH"),
+    ("compare this month revenue with last month", "revenue_comparison", "UNION ALL"),
+    ("What is today's revenue?", "revenue_period", "CURDATE()"),
+    ("revenue this year", "revenue_period", "YEAR(created_at) = YEAR(CURDATE())"),
+    ("How many customers are there?", "customer_count", "COUNT(*)"),
+    ("How much did Priya spend last month?", "customer_spending", "LIKE '%Priya%' AND MONTH(created_at)"),
+    ("Which services are least popular?", "top_services", "ORDER BY total_sold ASC"),
+    ("Top 5 services this month", "top_services", "WHERE MONTH(created_at) = MONTH(CURDATE())"),
+    ("top services by revenue last year", "top_services", "WHERE YEAR(created_at) = YEAR(CURDATE()) - 1"),
+    ("Which products have not sold this month?", "never_sold", "AND MONTH(ti.created_at) = MONTH(CURDATE())"),
+]
+
+no_match = [
+    "How much did we spend on inventory?",
+    "Which staff member has the most appointments?",
+    "Show revenue by payment mode",
+    # Qualifiers the templates cannot express
+    "What is the revenue this month for facial services?",
+    "revenue yesterday compared to today",
+    "compare today's revenue with last month",
+    "How many customers do we have in Chennai",
+    "How many new customers this month?",
+    "Is stock low for shampoo?",
+    "How much did Priya spend on facials?",
+    "How many times has Alice visited this month?",
+    "Top services for customer Priya",
+    "Which products in the hair category have never sold?",
+    "Show revenue trend over the last year",
+]
+
+
+def test_templates_match():
+    for question, name, fragment in cases:
+        match = match_template(question)
+        assert match is not None, question
+        assert match.name == name, (question, match.name)
+        assert fragment in match.sql, (question, match.sql)
+
+
+def test_unmatched_questions_fall_through():
+    for question in no_match:
+        assert match_template(question) is None, question
+
+
+def test_slots():
+    assert extract_period("revenue for the last 7 days")[1] == "created_at >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)"
+    assert extract_period("revenue yesterday")[0] == "Yesterday"
+    assert extract_period("total revenue") is None
+    assert extract_top_n("top ten services") == 10
+    assert extract_top_n("best services") == 5
+
+
+def production_columns() -> dict:
+    """Table -> {column: type} from the production schema dumps kept next to the code."""
+    columns = {"billing_transactions": {}}
+    with open(os.path.join(HERE, "schema_check.txt")) as f:   # DESCRIBE billing_transactions
+        for line in f:
+            m = re.match(r"\('(\w+)', '([^']+)'", line)
+            if m:
+                columns["billing_transactions"][m.group(1)] = m.group(2)
+    table = None
+    with open(os.path.join(HERE, "schema_debug.txt")) as f:
+        for line in f:
+            heading = re.match(r"--- (\w+) ---", line)
+            column = re.match(r"(\w+) \((.+)\)$", line.strip())
+            if heading:
+                table = heading.group(1)
+                columns[table] = {}
+            elif column and table:
+                columns[table][column.group(1)] = column.group(2)
+    return columns
+
+
+def column_references(sql: str):
+    """(table or None, column) for each column the SQL names; SELECT aliases are skipped."""
+    parsed = parse_sql(sql)
+    tokens = parsed.tokens
+    declared = {tokens[i + 1].text for i, t in enumerate(tokens[:-1]) if t.kind == "word" and t.text.lower() == "as"}
+    for i, token in enumerate(tokens):
+        # Keywords and functions are written in upper case in the templates
+        if token.kind != "word" or token.text != token.text.lower() or token.text in ("as",):
+            continue
+        if token.text in parsed.tables or token.text in parsed.aliases or token.text in declared:
+            continue
+        if i > 0 and tokens[i - 1].text == ".":
+            yield parsed.aliases.get(tokens[i - 2].text, tokens[i - 2].text), token.text
+        else:
+            yield None, token.text
+
+
+def test_template_sql_uses_production_columns():
+    known = production_columns()
+    checked = 0
+    for question, name, _ in cases:
+        sql = match_template(question).sql
+        tables = parse_sql(sql).tables
+        if not all(t in known for t in tables):
+            continue    # no production dump for this table
+        checked += 1
+        for table, column in column_references(sql):
+            candidates = [table] if table else tables
+            assert any(column in known[t] for t in candidates), (name, column, sql)
+    assert checked >= 10
+
+
+def test_names_cannot_break_out_of_literal():
+    match = match_template("How much did Bob'); DROP TABLE x; -- spend?")
+    assert match is None or "DROP" not in match.sql
+
+
+if __name__ == "__main__":
+    print("Testing SQL templates...")
+    for question, name, fragment in cases:
+        match = match_template(question)
+        print(f"  {question!r} -> {match.name if match else None}")
+    test_templates_match()
+    test_unmatched_questions_fall_through()
+    test_slots()
+    test_template_sql_uses_production_columns()
+    test_names_cannot_break_out_of_literal()
+    print("All template checks passed.")
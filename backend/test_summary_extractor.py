@@ -0,0 +1,39 @@
+from analysis_service import _SummaryExtractor
+
+
+def feed_all(chunks):
+    extractor = _SummaryExtractor()
+    return [extractor.feed(chunk) for chunk in chunks], extractor
+
+
+def test_key_split_across_chunks():
+    parts, extractor = feed_all(['{"sum', 'mary"', ' :  "Revenue ', 'rose 12%."}'])
+    assert parts == ["", "", "Revenue ", "rose 12%."]
+    assert extractor.finished
+
+
+def test_escapes_split_across_chunks():
+    parts, _ = feed_all(['{"summary": "Top is \\', '"Hair Spa\\"', ', then\\nFacial \\\\ Cleanup"}'])
+    assert "".join(parts) == 'Top is "Hair Spa", then Facial \\ Cleanup'
+    # The backslash alone produces nothing until the escaped character arrives
+    assert parts[0] == "Top is "
+
+
+def test_text_after_the_closing_quote_is_ignored():
+    parts, extractor = feed_all(['{"summary": "Done.", "extra": "x"}', ' more'])
+    assert parts == ["Done.", ""]
+    assert extractor.finished
+
+
+def test_reply_without_summary_yields_nothing():
+    parts, extractor = feed_all(["Sure! ", "Here you go."])
+    assert parts == ["", ""]
+    assert not extractor.started
+
+
+if __name__ == "__main__":
+    test_key_split_across_chunks()
+    test_escapes_split_across_chunks()
+    test_text_after_the_closing_quote_is_ignored()
+    test_reply_without_summary_yields_nothing()
+    print("All summary extractor checks passed.")
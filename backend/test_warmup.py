@@ -0,0 +1,99 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import main
+import warmup
+
+
+class FakeClient:
+    """Stands in for the Ollama async client; records every chat request."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def chat(self, **request):
+        self.requests.append(request)
+        return {"message": {"content": ""}, "done": True}
+
+
+def with_fake_client(coroutine_function):
+    client = FakeClient()
+    saved = (warmup.get_async_client, warmup.sql_generation_request)
+    warmup.get_async_client = lambda: client
+    warmup.sql_generation_request = lambda question: {
+        "model": "fake", "messages": [{"role": "user", "content": question}], "options": {"temperature": 0},
+    }
+    try:
+        return asyncio.run(coroutine_function()), client
+    finally:
+        warmup.get_async_client, warmup.sql_generation_request = saved
+
+
+def test_prime_prompts_sends_sql_and_analysis_requests():
+    _, client = with_fake_client(warmup._prime_prompts)
+    assert len(client.requests) == 2
+    sql_request, analysis = client.requests
+    assert sql_request["options"] == {"temperature": 0, "num_predict": 1}
+    assert analysis["options"]["num_predict"] == 1
+    assert "Aggregated Results" in analysis["messages"][-1]["content"]
+
+
+def test_llm_turns_warm_with_prompt_priming():
+    saved = (warmup.readiness, warmup.WARMUP_PROMPTS)
+    warmup.readiness = warmup.Readiness()
+    warmup.readiness.mark("db", True)
+    warmup.readiness.mark("schema", True)
+    warmup.WARMUP_PROMPTS = True
+    try:
+        ready, client = with_fake_client(warmup.warm_up)
+        assert ready and warmup.readiness.is_ready()
+        assert warmup.readiness.snapshot()["components"]["llm"]["error"] is None
+    finally:
+        warmup.readiness, warmup.WARMUP_PROMPTS = saved
+    # Model load plus the two primed prompts
+    assert len(client.requests) == 3
+    assert client.requests[0]["messages"] == []
+
+
+def test_readiness_transitions():
+    readiness = warmup.Readiness()
+    assert not readiness.is_ready()
+    readiness.mark("db", True)
+    readiness.mark("schema", True)
+    since = readiness.snapshot()["components"]["schema"]["since"]
+    assert since is not None and not readiness.is_ready()
+    readiness.mark("llm", True)
+    assert readiness.is_ready() and readiness.is_warm("llm")
+    # Marking an already-warm component again does not reset its timestamp
+    readiness.mark("schema", True)
+    assert readiness.snapshot()["components"]["schema"]["since"] == since
+    readiness.mark("llm", False, "connection refused")
+    snapshot = readiness.snapshot()
+    assert not snapshot["ready"]
+    assert snapshot["components"]["llm"] == {
+        "ready": False, "error": "connection refused", "since": snapshot["components"]["llm"]["since"]
+    }
+
+
+def test_ready_endpoint_reports_503_until_warm():
+    saved = main.readiness
+    main.readiness = warmup.Readiness()
+    try:
+        client = TestClient(main.app)
+        response = client.get("/ready")
+        assert response.status_code == 503 and response.json()["ready"] is False
+        for name in warmup.Readiness.COMPONENTS:
+            main.readiness.mark(name, True)
+        response = client.get("/ready")
+        assert response.status_code == 200 and response.json()["ready"] is True
+    finally:
+        main.readiness = saved
+
+
+if __name__ == "__main__":
+    test_prime_prompts_sends_sql_and_analysis_requests()
+    test_llm_turns_warm_with_prompt_priming()
+    test_readiness_transitions()
+    test_ready_endpoint_reports_503_until_warm()
+    print("All warm-up checks passed.")
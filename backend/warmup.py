@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+
+from database import get_pool
+from llm_client import get_async_client, OLLAMA_KEEP_ALIVE
+from nl_sql import MODEL_NAME, schema_loaded, sql_generation_request
+from schema_registry import schema_registry
+from analysis_service import analysis_request
+from logging_config import get_logger
+
+log = get_logger("warmup")
+
+# Configuration
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))            # seconds between failed warm-up attempts
+OLLAMA_KEEPALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEPALIVE_INTERVAL", "240"))  # seconds between keep-alive pings (0 = off)
+WARMUP_PROMPTS = os.getenv("WARMUP_PROMPTS", "1") == "1"                         # also prime the SQL/analysis prompt prefixes
+
+
+class Readiness:
+    """Tracks which dependencies of a worker are warm. /ready reports 200 only when all are."""
+
+    COMPONENTS = ("db", "schema", "llm")
+
+    def __init__(self):
+        self._state = {name: {"ready": False, "error": None, "since": None} for name in self.COMPONENTS}
+
+    def mark(self, name: str, ready: bool, error: str = None):
+        state = self._state[name]
+        if state["ready"] != ready:
+            state["since"] = time.time()
+        state["ready"] = ready
+        state["error"] = error
+
+    def is_warm(self, name: str) -> bool:
+        return self._state[name]["ready"]
+
+    def is_ready(self) -> bool:
+        return all(state["ready"] for state in self._state.values())
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "model": MODEL_NAME,
+            "components": {name: dict(state) for name, state in self._state.items()},
+        }
+
+
+readiness = Readiness()
+
+
+def _check_db():
+    pool = get_pool()
+    pool.warm_up()
+    # A checkout pings the connection, so this fails if MySQL is unreachable
+    conn = pool.acquire(timeout=WARMUP_RETRY_INTERVAL)
+    conn.close()
+
+
+def _check_schema():
+    if not schema_loaded():
+        schema_registry.refresh()
+    if not schema_loaded():
+        raise RuntimeError(schema_registry.stats()["last_error"] or "schema cache is empty")
+
+
+async def _load_model():
+    # An empty chat loads the model without generating anything and resets its keep-alive timer
+    await get_async_client().chat(model=MODEL_NAME, messages=[], keep_alive=OLLAMA_KEEP_ALIVE)
+
+
+async def _prime_prompts():
+    """Runs the SQL and analysis prompts once so Ollama has their static prefix evaluated."""
+    sql_request = await asyncio.to_thread(sql_generation_request, "total revenue")
+    # Built directly: a result as simple as this would be answered by the summarizer without a request
+    analysis = analysis_request("total revenue", "columns: revenue\n0")
+    for request in (sql_request, analysis):
+        request["options"] = {**request["options"], "num_predict": 1}
+        await get_async_client().chat(**request)
+
+
+async def _check_llm():
+    started = time.perf_counter()
+    await _load_model()
+    if WARMUP_PROMPTS:
+        await _prime_prompts()
+    log.info("Model %s loaded in %.1fs", MODEL_NAME, time.perf_counter() - started)
+
+
+async def warm_up() -> bool:
+    """One pass over db → schema → llm, stopping at the first failure. Returns readiness."""
+    steps = (
+        ("db", lambda: asyncio.to_thread(_check_db)),
+        ("schema", lambda: asyncio.to_thread(_check_schema)),
+        ("llm", _check_llm),
+    )
+    for name, step in steps:
+        if readiness.is_warm(name):
+            continue
+        try:
+            await step()
+            readiness.mark(name, True)
+        except Exception as e:
+            readiness.mark(name, False, str(e))
+            log.warning("Warm-up of %s failed: %s", name, e)
+            return False
+    return True
+
+
+async def run_warmup():
+    """
+    Background task started at startup: retries warm-up until the worker is ready,
+    then pings Ollama periodically so the model stays resident between questions.
+    A failed ping marks the LLM cold again and warm-up resumes.
+    """
+    while True:
+        if not await warm_up():
+            await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+            continue
+        log.info("Worker ready")
+        if OLLAMA_KEEPALIVE_INTERVAL <= 0:
+            return
+        while readiness.is_ready():
+            await asyncio.sleep(OLLAMA_KEEPALIVE_INTERVAL)
+            try:
+                await _load_model()
+            except Exception as e:
+                readiness.mark("llm", False, str(e))
+                log.warning("Ollama keep-alive failed: %s", e)